@@ -0,0 +1,188 @@
+# pylint: disable = global-statement
+
+"""
+Filename: BatchRunner.py
+Description: Runs many MATLAB scripts on a pool of worker processes,
+             writing the output of each script to its own file
+Author:    Juan Trejo
+Github:    https://github.com/jtrejo13
+"""
+
+# -------
+# imports
+# -------
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+from io import StringIO
+from timeit import default_timer
+from typing import Dict, List
+from Cache import ScriptCache
+from Interpreter import interp_eval, interp_read, interp_print
+
+
+"""
+Worker State
+
+Every worker process runs many scripts, and keeps its settings and its
+ScriptCache between them. A script that is run again by the same worker
+is not scanned or parsed again, and with a cache directory no worker
+parses a script another worker has already parsed
+"""
+_worker = None
+
+
+def find_scripts(path: str):
+    """
+    Lists the scripts of a batch
+
+    Args:
+        path(str): A directory, whose '.m' files are the scripts, or a
+        manifest: a text file naming one script per line, relative to the
+        directory of the manifest. Blank lines and lines starting with '#'
+        are skipped
+
+    Returns:
+        list of str: The paths of the scripts
+    """
+    if os.path.isdir(path):
+        return [os.path.join(path, name) for name in sorted(os.listdir(path)) if name.endswith('.m')]
+    base = os.path.dirname(path)
+    with open(path) as manifest:
+        lines = [line.strip() for line in manifest]
+    return [os.path.join(base, line) for line in lines if line and not line.startswith('#')]
+
+
+def output_path(script: str, root: str, out_dir: str):
+    """
+    Returns:
+        str: The file the output of a script is written to: its path
+        relative to root, under out_dir, with the extension '.out'
+    """
+    relative = os.path.relpath(script, root)
+    if relative.startswith(os.pardir):
+        relative = os.path.basename(script)
+    return os.path.join(out_dir, os.path.splitext(relative)[0] + '.out')
+
+
+def output_paths(scripts: List[str], root: str, out_dir: str):
+    """
+    Returns:
+        list of str: The output file of each script (see output_path). A
+        script listed more than once writes the same file every time
+
+    Raises:
+        ValueError: If two different scripts would write the same file,
+        like scripts of the same name outside of root
+    """
+    paths = [output_path(script, root, out_dir) for script in scripts]
+    writers = {}  # type: Dict[str, str]
+    for script, path in zip(scripts, paths):
+        writer = writers.setdefault(os.path.normcase(os.path.abspath(path)), script)
+        if os.path.normcase(os.path.abspath(writer)) != os.path.normcase(os.path.abspath(script)):
+            raise ValueError('{} and {} would both write {}'.format(writer, script, path))
+    return paths
+
+
+def start_worker(engine: str, optimize: bool, cache_dir: str = None):
+    """Initializes a worker process"""
+    global _worker
+    _worker = (engine, optimize, ScriptCache(directory=cache_dir))
+
+
+def run_script(script: str, out_path: str):
+    """
+    Runs a script in a worker process, and writes its variables to
+    out_path as interp_print does
+
+    Returns:
+        tuple: The script, the error it raised as a str (or None), whether
+        it was found in the worker's cache, and the seconds it took
+    """
+    engine, optimize, cache = _worker
+    start = default_timer()
+    hits = cache.hits + cache.disk_hits
+    try:
+        with open(script) as script_file:
+            text = script_file.read()
+        workspace = interp_eval(interp_read(text, cache), engine, optimize)
+        output = StringIO()
+        interp_print(output, workspace)
+        os.makedirs(os.path.dirname(out_path) or os.curdir, exist_ok=True)
+        # a script listed twice may be run by two workers at once
+        temp_path = '{}.{}.tmp'.format(out_path, os.getpid())
+        with open(temp_path, 'w') as out_file:
+            out_file.write(output.getvalue())
+        os.replace(temp_path, out_path)
+        error = None
+    except Exception as exception:  # pylint: disable = broad-except
+        error = '{}: {}'.format(type(exception).__name__, exception)
+    cached = cache.hits + cache.disk_hits > hits
+    return script, error, cached, default_timer() - start
+
+
+def run_batch(path: str, out_dir: str, workers: int = None, engine: str = 'tree', optimize: bool = False,
+              cache_dir: str = None):
+    """
+    Runs the scripts of a batch on a pool of worker processes
+
+    Args:
+        path(str): A directory or a manifest of scripts (see find_scripts)
+        out_dir(str): The directory the output files are written to
+        workers(int): The number of worker processes (default: one per CPU)
+        engine(str): The engine scripts are evaluated with (see Interpreter)
+        optimize(bool): Whether to optimize the scripts first
+        cache_dir(str): A directory the workers share parsed scripts in
+
+    Returns:
+        BatchReport: The results of the scripts
+
+    Raises:
+        ValueError: If two scripts would write the same output file,
+        before any script is run
+    """
+    scripts = find_scripts(path)
+    root = path if os.path.isdir(path) else os.path.dirname(path)
+    out_paths = output_paths(scripts, root, out_dir)
+    workers = workers or os.cpu_count() or 1
+
+    start = default_timer()
+    with ProcessPoolExecutor(workers, initializer=start_worker,
+                             initargs=(engine, optimize, cache_dir)) as executor:
+        chunksize = max(1, len(scripts) // (4 * workers))
+        results = list(executor.map(run_script, scripts, out_paths, chunksize=chunksize))
+    return BatchReport(results, default_timer() - start)
+
+
+class BatchReport(object):
+    """
+    The results of running a batch of scripts
+
+    Args:
+        results(list of tuple): What run_script returned for each script
+        seconds(float): The time the whole batch took
+
+    Attributes:
+        results(list of tuple): What run_script returned for each script
+        seconds(float): The time the whole batch took
+        failures(list of tuple): The script and error of every script
+        that raised
+    """
+
+    def __init__(self, results, seconds):
+        self.results = results
+        self.seconds = seconds
+        self.failures = [(script, error) for script, error, _, _ in results if error is not None]
+
+    def summary(self):
+        """
+        Returns:
+            str: A line per failed script, and the throughput of the batch
+        """
+        lines = ['FAILED {}: {}\n'.format(script, error) for script, error in self.failures]  # type: List[str]
+        count = len(self.results)
+        cached = sum(1 for result in self.results if result[2])
+        rate = count / self.seconds if self.seconds > 0 else 0.0
+        lines.append('ran {} scripts ({} failed, {} cached) in {:.3f}s: {:.1f} scripts/s\n'.format(
+            count, len(self.failures), cached, self.seconds, rate))
+        return ''.join(lines)
@@ -0,0 +1,439 @@
+# pylint: disable = unused-wildcard-import
+# pylint: disable = wildcard-import
+
+"""
+Filename: BenchInterpreter.py
+Description: Benchmarks of the MATLAB interpreter
+Author:    Juan Trejo
+Github:    https://github.com/jtrejo13
+"""
+
+# -------
+# imports
+# -------
+
+import json
+import platform
+import tracemalloc
+from argparse import ArgumentParser
+from timeit import default_timer
+from typing import Dict
+import numpy
+from Scanner import Scanner
+from Parser import Parser
+from Interpreter import Interpreter, interp_eval_batch
+from Compiler import Compiler
+from Bytecode import BytecodeCompiler
+from Operators import columns
+from Optimizer import count_nodes
+
+# ----------------
+# variables_script
+# ----------------
+
+
+def variables_script(count: int):
+    """
+    Returns:
+        str: A script of 'count' assignments, each reading the two
+        variables assigned before it and three constants
+    """
+    lines = ['x = 1; y = 2; z = 2; v0 = 1; v1 = 2;']
+    for index in range(2, count):
+        lines.append('v{} = v{} - v{} + x * y - z;'.format(index, index - 1, index - 2))
+    return '\n'.join(lines)
+
+# -----------
+# bench_rerun
+# -----------
+
+
+def bench_rerun(script: str, runs: int):
+    """
+    Times running an already parsed script 'runs' times with the
+    tree-walking interpreter, the compiled closures and the bytecode VM
+
+    Returns:
+        dict: seconds taken by each engine, compilation included
+    """
+    tree = Parser(Scanner(script)).parse()
+
+    walker = Interpreter(None)
+    walker.GLOBAL_SCOPE = {}
+    start = default_timer()
+    for _ in range(runs):
+        walker.visit(tree)
+    tree_time = default_timer() - start
+
+    scope = {}
+    start = default_timer()
+    code = Compiler().compile(tree)
+    for _ in range(runs):
+        code(scope)
+    closure_time = default_timer() - start
+
+    vm_scope = {}
+    start = default_timer()
+    code = BytecodeCompiler().compile(tree)
+    for _ in range(runs):
+        code.run(vm_scope)
+    vm_time = default_timer() - start
+
+    assert scope == walker.GLOBAL_SCOPE == vm_scope
+    return {'tree': tree_time, 'closure': closure_time, 'vm': vm_time}
+
+# ----------
+# bench_loop
+# ----------
+
+
+def loop_script(iterations: int):
+    """
+    Returns:
+        str: A script running a loop of 'iterations' iterations, whose
+        body reads the loop variable and updates two variables
+    """
+    return ('total = 0; last = 0;\n'
+            'for i = 1:{}\n'
+            '    total = total + i * 2 - last;\n'
+            '    last = i;\n'
+            'end').format(iterations)
+
+
+def bench_loop(iterations: int):
+    """
+    Times a loop-heavy script with each engine, and with a naive loop that
+    walks the body of the loop again on every iteration
+
+    Returns:
+        dict: microseconds per iteration of each engine
+    """
+    tree = Parser(Scanner(loop_script(iterations))).parse()
+    times = {}
+
+    walker = Interpreter(None)
+    walker.GLOBAL_SCOPE = scope = {}
+    start = default_timer()
+    for statement in tree.statements[:-1]:
+        walker.visit(statement)
+    loop = tree.statements[-1]
+    var_name = loop.left.token.value
+    for value in columns(walker.visit(loop.right)):
+        scope[var_name] = value
+        walker.visit(loop.body)
+    times['naive'] = default_timer() - start
+    results = [scope]
+
+    for engine in Interpreter.ENGINES:
+        interp = Interpreter(None, engine)
+        interp.GLOBAL_SCOPE = {}
+        start = default_timer()
+        interp.execute(tree)
+        times[engine] = default_timer() - start
+        results.append(interp.GLOBAL_SCOPE)
+
+    assert all(result == scope for result in results)
+    return {engine: seconds * 1e6 / iterations for engine, seconds in times.items()}
+
+# ---------------
+# bench_vectorize
+# ---------------
+
+
+def vector_script(count: int):
+    """
+    Returns:
+        str: A script computing an element-wise function of a vector of
+        'count' elements with a for loop
+    """
+    return ('n = {}; a = 2; b = 1; x = 1:n;\n'
+            'for i = 1:n\n'
+            '    y(i) = a * x(i) + b;\n'
+            'end').format(count)
+
+
+def bench_vectorize(count: int):
+    """
+    Times an element-wise loop over 'count' elements with each engine,
+    as written and vectorized by the Optimizer
+
+    Returns:
+        dict: seconds taken by each engine, as a (loop, vectorized) tuple
+    """
+    times = {}
+    for engine in Interpreter.ENGINES:
+        results = []
+        for optimize in (False, True):
+            interp = Interpreter(Parser(Scanner(vector_script(count))), engine, optimize)
+            interp.GLOBAL_SCOPE = {}
+            start = default_timer()
+            interp.interpret()
+            results.append(default_timer() - start)
+            assert interp.GLOBAL_SCOPE['y'][0, -1] == 2 * count + 1
+        times[engine] = tuple(results)
+    return times
+
+# -----------
+# bench_batch
+# -----------
+
+
+def bench_batch(script: str, count: int):
+    """
+    Times evaluating a script for 'count' sets of values of r, s and h,
+    once per set and in a single batch
+
+    Returns:
+        dict: seconds taken each way
+    """
+    columns = {name: numpy.linspace(1, 10, count) for name in ('r', 's', 'h')}
+    tree = Parser(Scanner(script)).parse()
+
+    start = default_timer()
+    for values in zip(*columns.values()):
+        interp = Interpreter(None)
+        interp.GLOBAL_SCOPE = dict(zip(columns, values))
+        interp.execute(tree)
+    loop_time = default_timer() - start
+
+    start = default_timer()
+    interp_eval_batch(script, columns)
+    return {'per set': loop_time, 'batch': default_timer() - start}
+
+# ------------
+# bench_memory
+# ------------
+
+
+def bench_memory(script: str):
+    """
+    Measures the memory held by the tokens and by the AST of a script.
+    The AST figure includes the tokens the nodes refer to
+
+    Returns:
+        dict: bytes per token and bytes per node
+    """
+    tracemalloc.start()
+    try:
+        start = tracemalloc.get_traced_memory()[0]
+        tokens = Scanner(script).tokenize_all()
+        token_bytes = tracemalloc.get_traced_memory()[0] - start
+        token_count = len(tokens)
+        del tokens
+
+        start = tracemalloc.get_traced_memory()[0]
+        tree = Parser(Scanner(script)).parse()
+        node_bytes = tracemalloc.get_traced_memory()[0] - start
+    finally:
+        tracemalloc.stop()
+
+    return {'bytes per token': token_bytes / token_count,
+            'bytes per node': node_bytes / count_nodes(tree)}
+
+# -------------
+# bench_scaling
+# -------------
+
+
+def statements_script(count: int):
+    """
+    Returns:
+        str: A script of 'count' short independent assignments
+    """
+    return '\n'.join('s{0} = {0} * 2 + 1;'.format(index) for index in range(count))
+
+
+def parentheses_script(depth: int):
+    """
+    Returns:
+        str: A script of one assignment, whose expression is 'depth'
+        parentheses deep
+    """
+    return 'a = 1;\nx = {}a{};'.format('(' * depth, ' + 1)' * depth)
+
+
+def chain_script(terms: int):
+    """
+    Returns:
+        str: A script of one assignment, whose expression is a chain of
+        'terms' additions and subtractions of two variables
+    """
+    operands = ' + '.join('a - b' for _ in range(max(1, terms // 2)))
+    return 'a = 2; b = 1;\nx = {};'.format(operands)
+
+
+"""
+Script Shapes
+
+The synthetic scripts of the scaling benchmarks, by name. Each generator
+takes the size of the script: its number of statements, nesting depth,
+terms or variables
+"""
+SHAPES = {
+    'statements': statements_script,
+    'parentheses': parentheses_script,
+    'chain': chain_script,
+    'variables': variables_script,
+}
+
+
+def measure(function, repeat: int):
+    """
+    Runs function 'repeat' times to time it, and once more under
+    tracemalloc, so that tracing does not slow the timed runs down
+
+    Returns:
+        tuple: The result of function, the seconds of its fastest run and
+        the peak of memory allocated during the traced run, in bytes
+    """
+    seconds = float('inf')
+    for _ in range(repeat):
+        start = default_timer()
+        result = function()
+        seconds = min(seconds, default_timer() - start)
+    tracemalloc.start()
+    try:
+        function()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return result, seconds, peak
+
+
+def stage(count: int, unit: str, seconds: float, peak: int):
+    """
+    Returns:
+        dict: The measures of a stage, with its throughput in units per second
+    """
+    return {unit: count, 'seconds': seconds, unit + '_per_s': count / seconds if seconds else None,
+            'peak_bytes': peak}
+
+
+def bench_scaling(shape: str, size: int, engines=Interpreter.ENGINES, repeat: int = 3):
+    """
+    Measures scanning, parsing and evaluating a synthetic script of a
+    shape and size separately. Parsing includes the scanning the parser
+    pulls tokens from, and evaluating with the 'closure' and 'vm' engines
+    includes compiling. A stage that exceeds the recursion limit is
+    recorded as an error, and the stages depending on it are skipped
+
+    Returns:
+        dict: The throughput, time and peak memory of the scanner (tokens),
+        the parser (nodes) and each engine (statements)
+    """
+    script = SHAPES[shape](size)
+    record = {'shape': shape, 'size': size, 'bytes': len(script)}
+
+    tokens, seconds, peak = measure(lambda: Scanner(script).tokenize_all(), repeat)
+    record['scanner'] = stage(len(tokens), 'tokens', seconds, peak)
+    try:
+        tree, seconds, peak = measure(lambda: Parser(Scanner(script)).parse(), repeat)
+    except RecursionError:
+        record['parser'] = {'error': 'RecursionError'}
+        return record
+    record['parser'] = stage(count_nodes(tree), 'nodes', seconds, peak)
+
+    evaluators = {}  # type: Dict[str, Dict]
+    for engine in engines:
+        def evaluate(engine=engine):
+            interp = Interpreter(None, engine)
+            interp.execute(tree)
+            return interp.workspace
+        try:
+            _, seconds, peak = measure(evaluate, repeat)
+        except RecursionError:
+            evaluators[engine] = {'error': 'RecursionError'}
+            continue
+        evaluators[engine] = stage(len(tree.statements), 'statements', seconds, peak)
+    record['interpreter'] = evaluators
+    return record
+
+
+def scaling_suite(shapes, sizes, engines=Interpreter.ENGINES, repeat: int = 3):
+    """
+    Runs bench_scaling for every shape and size
+
+    Returns:
+        dict: The Python version the suite ran on, and a record per
+        shape and size
+    """
+    return {'python': platform.python_version(),
+            'engines': list(engines),
+            'records': [bench_scaling(shape, size, engines, repeat) for shape in shapes for size in sizes]}
+
+# ----
+# main
+# ----
+
+
+if __name__ == '__main__':  # pragma: no cover
+    arg_parser = ArgumentParser(description='Benchmarks the MATLAB interpreter')
+    arg_parser.add_argument('script', nargs='?', default='RunInterpreter.in',
+                            help='MATLAB script to run (default: RunInterpreter.in)')
+    arg_parser.add_argument('--runs', type=int, default=10000,
+                            help='number of times the parsed script is run')
+    arg_parser.add_argument('--copies', type=int, default=1000,
+                            help='number of copies of the script whose memory is measured')
+    arg_parser.add_argument('--iterations', type=int, default=100000,
+                            help='number of iterations of the loop benchmark')
+    arg_parser.add_argument('--elements', type=int, default=100000,
+                            help='number of elements of the vectorization benchmark')
+    arg_parser.add_argument('--sets', type=int, default=10000,
+                            help='number of sets of inputs of the batch benchmark')
+    arg_parser.add_argument('--suite', action='store_true',
+                            help='run the scaling suite on synthetic scripts instead, '
+                            'and print its results as JSON')
+    arg_parser.add_argument('--shapes', default=','.join(SHAPES),
+                            help='comma-separated shapes of the scaling suite '
+                            '(default: {})'.format(','.join(SHAPES)))
+    arg_parser.add_argument('--sizes', default='100,1000,10000',
+                            help='comma-separated sizes of the scaling suite (default: 100,1000,10000)')
+    arg_parser.add_argument('--engines', default=','.join(Interpreter.ENGINES),
+                            help='comma-separated engines of the scaling suite')
+    arg_parser.add_argument('--repeat', type=int, default=3,
+                            help='timed runs of each stage of the scaling suite, the fastest is kept')
+    arg_parser.add_argument('--json', metavar='FILE',
+                            help='write the results of the scaling suite to FILE instead of stdout')
+    args = arg_parser.parse_args()
+
+    if args.suite:
+        results = scaling_suite(args.shapes.split(','), [int(size) for size in args.sizes.split(',')],
+                                args.engines.split(','), args.repeat)
+        if args.json:
+            with open(args.json, 'w') as json_file:
+                json.dump(results, json_file, indent=2)
+        else:
+            print(json.dumps(results, indent=2))
+        raise SystemExit
+
+    with open(args.script) as script_file:
+        source = script_file.read()
+
+    for name, script, runs in ((args.script, source, args.runs),
+                               ('300 variables', variables_script(300), args.runs // 10)):
+        times = bench_rerun(script, runs)
+        print('{} runs of {}'.format(runs, name))
+        for engine, seconds in times.items():
+            print('{:>8}: {:.3f}s ({:.1f}x)'.format(engine, seconds, times['tree'] / seconds))
+
+    per_iteration = bench_loop(args.iterations)
+    print('loop of {} iterations'.format(args.iterations))
+    for engine, microseconds in per_iteration.items():
+        print('{:>8}: {:.2f}us per iteration ({:.1f}x)'.format(
+            engine, microseconds, per_iteration['naive'] / microseconds))
+
+    vectorized = bench_vectorize(args.elements)
+    print('element-wise loop over {} elements'.format(args.elements))
+    for engine, (loop_time, vector_time) in vectorized.items():
+        print('{:>8}: {:.3f}s as a loop, {:.3f}s vectorized ({:.1f}x)'.format(
+            engine, loop_time, vector_time, loop_time / vector_time))
+
+    batch = bench_batch(source, args.sets)
+    print('{} sets of inputs of {}'.format(args.sets, args.script))
+    for way, seconds in batch.items():
+        print('{:>8}: {:.3f}s ({:.1f}x)'.format(way, seconds, batch['per set'] / seconds))
+
+    memory = bench_memory(source * args.copies)
+    print('memory of {} copies of {}'.format(args.copies, args.script))
+    for measure, size in memory.items():
+        print('{:>16}: {:.1f}'.format(measure, size))
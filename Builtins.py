@@ -0,0 +1,190 @@
+# pylint: disable = too-few-public-methods
+# pylint: disable = invalid-name
+
+"""
+Filename: Builtins.py
+Description: Built-in functions of the MATLAB language. The element-wise
+             functions are built on NumPy ufuncs, so they take numbers and
+             whole matrices alike
+Author:    Juan Trejo
+Github:    https://github.com/jtrejo13
+"""
+
+# -------
+# imports
+# -------
+
+import math
+import operator
+from typing import Callable, Dict
+import numpy
+from numpy import ndarray
+from Operators import Range
+
+
+class Builtin(object):
+    """
+    A built-in function
+
+    Args:
+        function(callable): The implementation of the function
+        nargs(int): The number of arguments the function takes
+        max_nargs(int): The largest number of arguments the function
+        takes, if it takes more than nargs
+        is_elementwise(bool): Whether the function applies to every element
+        of its arguments on its own, like cos does, and unlike sum
+
+    Attributes:
+        function(callable): The implementation of the function
+        nargs(int): The smallest number of arguments the function takes
+        max_nargs(int): The largest number of arguments the function takes
+        is_elementwise(bool): Whether the function is element-wise
+    """
+
+    __slots__ = ('function', 'nargs', 'max_nargs', 'is_elementwise')
+
+    def __init__(self, function, nargs, max_nargs=None, is_elementwise=False):
+        self.function = function
+        self.nargs = nargs
+        self.max_nargs = nargs if max_nargs is None else max_nargs
+        self.is_elementwise = is_elementwise
+
+
+def elementwise(ufunc: Callable, nargs: int = 1, integral: bool = False):
+    """
+    Wraps a NumPy ufunc into an element-wise built-in function. Called on
+    numbers, the function returns a Python number rather than a NumPy scalar
+
+    Args:
+        ufunc(callable): The ufunc applied to the arguments
+        nargs(int): The number of arguments the ufunc takes
+        integral(bool): Whether finite results on numbers are whole, and
+        returned as int (e.g. floor(2.5) is 2)
+
+    Returns:
+        Builtin: The built-in function
+    """
+    def function(*args):
+        result = ufunc(*args)
+        if isinstance(result, numpy.generic) or isinstance(result, ndarray) and result.ndim == 0:
+            result = result.item()
+            if integral and math.isfinite(result):
+                result = int(result)
+        return result
+    function.__name__ = ufunc.__name__
+    return Builtin(function, nargs, is_elementwise=True)
+
+
+def mod(x, y):
+    """Remainder after division, with the sign of y. mod(x, 0) is x"""
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        return numpy.where(numpy.equal(y, 0), x, numpy.mod(x, y))
+
+
+def round_half_away(x):
+    """Rounds to the nearest integer, and halves away from zero"""
+    return numpy.sign(x) * numpy.floor(numpy.absolute(x) + 0.5)
+
+
+def length(x):
+    """Number of elements along the longest dimension (0 if empty)"""
+    if isinstance(x, Range):
+        return len(x)
+    shape = numpy.shape(x)
+    if not shape:
+        return 1
+    return 0 if 0 in shape else max(shape)
+
+
+def numel(x):
+    """Number of elements"""
+    if isinstance(x, Range):
+        return len(x)
+    return int(numpy.size(x))
+
+
+def reduce(x, method):
+    """
+    Reduces a value like the MATLAB reductions do: a vector to a number,
+    and every column of a matrix to a number. Ranges are reduced with
+    their own method, without creating their elements
+
+    Args:
+        x: The value to reduce
+        method(str): The name of the Range and numpy.ndarray method
+        computing the reduction
+    """
+    if isinstance(x, Range):
+        return getattr(x, method)()
+    if not isinstance(x, ndarray):
+        return x
+    if x.shape[0] == 1 or x.shape[1] == 1:
+        return getattr(x, method)().item()
+    return getattr(x, method)(axis=0, keepdims=True)
+
+
+def total(x):
+    """Sum of the elements of a vector, or of each column of a matrix"""
+    if numel(x) == 0:
+        return 0
+    return reduce(x, 'sum')
+
+
+def minimum(x):
+    """Smallest element of a vector, or of each column of a matrix"""
+    if numel(x) == 0:
+        return numpy.zeros((0, 0))
+    return reduce(x, 'min')
+
+
+def maximum(x):
+    """Largest element of a vector, or of each column of a matrix"""
+    if numel(x) == 0:
+        return numpy.zeros((0, 0))
+    return reduce(x, 'max')
+
+
+def filled(value):
+    """
+    Returns:
+        callable: A built-in function creating a matrix of the given size
+        (n-by-n, or m-by-n) with every element set to value
+    """
+    def function(rows, cols=None):
+        if cols is None:
+            cols = rows
+        return numpy.full((max(int(rows), 0), max(int(cols), 0)), float(value))
+    function.__name__ = 'filled_{}'.format(value)
+    return function
+
+
+"""
+Built-in Function Registry
+
+Maps the name of every built-in function to its Builtin. The parser
+resolves each call to its function once, when the script is parsed
+"""
+BUILTINS = {
+    'abs': elementwise(numpy.absolute),
+    'cos': elementwise(numpy.cos),
+    'exp': elementwise(numpy.exp),
+    'floor': elementwise(numpy.floor, integral=True),
+    'length': Builtin(length, 1),
+    'log': elementwise(numpy.log),
+    'max': Builtin(maximum, 1),
+    'min': Builtin(minimum, 1),
+    'mod': elementwise(mod, 2),
+    'numel': Builtin(numel, 1),
+    'ones': Builtin(filled(1), 1, 2),
+    'power': elementwise(operator.pow, 2),  # like .^
+    'round': elementwise(round_half_away, integral=True),
+    'sin': elementwise(numpy.sin),
+    'sqrt': elementwise(numpy.sqrt),
+    'sum': Builtin(total, 1),
+    'tan': elementwise(numpy.tan),
+    'zeros': Builtin(filled(0), 1, 2),
+}  # type: Dict[str, Builtin]
+
+BUILTIN_NAMES = {
+    builtin.function: name for name, builtin in BUILTINS.items()
+}  # type: Dict[Callable, str]
@@ -0,0 +1,570 @@
+# pylint: disable = unused-wildcard-import
+# pylint: disable = too-few-public-methods
+# pylint: disable = invalid-name
+
+"""
+Filename: Bytecode.py
+Description: Compiles an Abstract Syntax Tree into a compact stack-based
+             bytecode, runs it in a virtual machine and stores it in
+             '.mc' files, so that a script can be run again without
+             scanning or parsing its source
+Author:    Juan Trejo
+Github:    https://github.com/jtrejo13
+"""
+
+# -------
+# imports
+# -------
+
+import hashlib
+import struct
+import sys
+from array import array
+from typing import IO, Dict, List
+from numpy import ndarray
+from Scanner import *
+from Parser import NodeVisitor, Parser, BinaryOp, Call, Colon, Index, Matrix, UnaryOp, is_alias
+from Operators import BINARY_OPERATORS, divide, divide_elements, make_matrix, make_range, matrix_power, multiply, \
+    columns, is_true, get_index, set_index
+from Builtins import BUILTINS, BUILTIN_NAMES
+from Compiler import UNBOUND, load_slots, store_slots
+from Optimizer import Optimizer
+
+# ----------------------------------------------------
+# Opcodes
+#
+# Every instruction is two words in the code array: the
+# opcode and its argument. LOAD_CONST takes an index in
+# the constant pool, LOAD_NAME, LOAD_FAST and STORE_NAME
+# an index in the name table, which is also the slot of
+# the variable (see Compiler.py); the other opcodes
+# ignore it. LOAD_FAST reads a variable that is certain
+# to have been assigned, so it skips the UNBOUND check.
+# BUILD_ROW pops its argument's number of values into a
+# list, and BUILD_MATRIX pops its argument's number of
+# those rows into a matrix. CALL_FUNCTION pops its
+# argument's number of values and calls the built-in
+# function below them (loaded from the constant pool).
+# BUILD_RANGE pops the bounds of a colon expression:
+# start and stop if its argument is 2, and start, step
+# and stop if it is 3. COMPARE_OP applies the relational
+# operator COMPARISONS[argument].
+#
+# Loops jump to the code index in their argument. JUMP
+# always does, and POP_JUMP_IF_FALSE if the condition it
+# pops is not true. GET_ITER replaces the value on top
+# of the stack with an iterator over the values a for
+# loop takes, and FOR_ITER pushes the next one, or pops
+# the finished iterator and jumps.
+#
+# Indexing builds the indices into a row with BUILD_ROW.
+# BINARY_INDEX pops the row and indexes the value below
+# it. STORE_INDEX pops the row and the value assigned,
+# and assigns the indexed elements of the variable in
+# its argument's slot. COPY_VALUE copies the matrix on
+# top of the stack (see Parser.is_alias)
+# ----------------------------------------------------
+(LOAD_CONST, LOAD_NAME, STORE_NAME, BINARY_ADD, BINARY_SUB, BINARY_MUL, BINARY_DIV, UNARY_NEG,
+ LOAD_FAST, BUILD_ROW, BUILD_MATRIX, BINARY_POW, BINARY_DOTMUL, BINARY_DOTDIV, BINARY_DOTPOW,
+ CALL_FUNCTION, BUILD_RANGE, COMPARE_OP, JUMP, POP_JUMP_IF_FALSE, GET_ITER, FOR_ITER,
+ BINARY_INDEX, STORE_INDEX, COPY_VALUE) = range(25)
+
+BINARY_OPCODES = {
+    PLUS: BINARY_ADD,
+    MINUS: BINARY_SUB,
+    MUL: BINARY_MUL,
+    DIV: BINARY_DIV,
+    POW: BINARY_POW,
+    DOTMUL: BINARY_DOTMUL,
+    DOTDIV: BINARY_DOTDIV,
+    DOTPOW: BINARY_DOTPOW,
+}  # type: Dict[str, int]
+
+COMPARISONS = (LT, LE, GT, GE, EQ, NE)
+
+# ----------------------------------------------------
+# '.mc' file format (all integers are little-endian)
+#
+# header:    MAGIC, version (uint16), SHA-256 of the source (32 bytes)
+# constants: count (uint32), then per constant a tag byte and
+#            b'f' + float64, or b'i' + size (uint16) + signed int bytes,
+#            or b'b' + size (uint16) + UTF-8 name of a built-in function
+# names:     count (uint32), then per name size (uint16) + UTF-8 bytes
+# code:      count (uint32), then that many int32 words
+# ----------------------------------------------------
+MAGIC = b'MATC'
+VERSION = 8
+
+
+def hash_source(text: str):
+    """
+    Returns:
+        bytes: The SHA-256 digest identifying a script's source text
+    """
+    return hashlib.sha256(text.encode('utf-8')).digest()
+
+
+class CodeObject(object):
+    """
+    A script compiled to bytecode
+
+    Attributes:
+        code(array of int): The instructions, two words each
+        constants(list of int or float): The constant pool
+        names(list of str): The name table
+        source_hash(bytes): SHA-256 of the source the code was compiled from
+    """
+
+    def __init__(self, code, constants, names, source_hash=b''):
+        self.code = code
+        self.constants = constants
+        self.names = names
+        self.source_hash = source_hash
+
+    def run(self, scope: Dict, temporaries: Dict = None):
+        """
+        Runs the bytecode in a name-keyed scope. The variables the script
+        uses are copied into slots before running it, and back into the
+        scope afterwards (also if the script raises)
+
+        Args:
+            scope(dict key:str value:float or int): Scope of variables
+            read and updated by the script
+            temporaries(dict key:str value:float or int): Temporaries
+            read and updated by the script (see Compiler.store_slots)
+
+        Raises:
+            NameError exception if a variable is read before it is assigned
+        """
+        slots = load_slots(self.names, scope, temporaries)
+        try:
+            self.run_slots(slots)
+        finally:
+            store_slots(self.names, slots, scope, temporaries)
+
+    def run_slots(self, slots: List):
+        """
+        Runs the bytecode on a list of variable slots, in name table order
+
+        Raises:
+            NameError exception if a variable is read before it is assigned
+        """
+        code = self.code
+        constants = self.constants
+        names = self.names
+        comparisons = [BINARY_OPERATORS[op_type] for op_type in COMPARISONS]
+        stack = []  # type: List
+        push = stack.append
+        pop = stack.pop
+        pc = 0
+        end = len(code)
+        while pc < end:
+            op = code[pc]
+            arg = code[pc + 1]
+            pc += 2
+            if op == LOAD_FAST:
+                push(slots[arg])
+            elif op == LOAD_CONST:
+                push(constants[arg])
+            elif op == BINARY_MUL:
+                right = pop()
+                stack[-1] = multiply(stack[-1], right)
+            elif op == BINARY_ADD:
+                right = pop()
+                stack[-1] = stack[-1] + right
+            elif op == STORE_NAME:
+                slots[arg] = pop()
+            elif op == FOR_ITER:
+                value = next(stack[-1], UNBOUND)
+                if value is UNBOUND:
+                    pop()
+                    pc = arg
+                else:
+                    push(value)
+            elif op == JUMP:
+                pc = arg
+            elif op == POP_JUMP_IF_FALSE:
+                if not is_true(pop()):
+                    pc = arg
+            elif op == COMPARE_OP:
+                right = pop()
+                stack[-1] = comparisons[arg](stack[-1], right)
+            elif op == BINARY_SUB:
+                right = pop()
+                stack[-1] = stack[-1] - right
+            elif op == BINARY_DIV:
+                right = pop()
+                stack[-1] = divide(stack[-1], right)
+            elif op == UNARY_NEG:
+                stack[-1] = -1 * stack[-1]
+            elif op == LOAD_NAME:
+                value = slots[arg]
+                if value is UNBOUND:
+                    raise NameError(repr(names[arg]))
+                push(value)
+            elif op == BINARY_DOTMUL:
+                right = pop()
+                stack[-1] = stack[-1] * right
+            elif op == BINARY_DOTDIV:
+                right = pop()
+                stack[-1] = divide_elements(stack[-1], right)
+            elif op == BINARY_DOTPOW:
+                right = pop()
+                stack[-1] = stack[-1] ** right
+            elif op == BINARY_POW:
+                right = pop()
+                stack[-1] = matrix_power(stack[-1], right)
+            elif op == CALL_FUNCTION:
+                args = stack[len(stack) - arg:]
+                del stack[len(stack) - arg:]
+                stack[-1] = stack[-1](*args)
+            elif op == GET_ITER:
+                stack[-1] = iter(columns(stack[-1]))
+            elif op == BUILD_RANGE:
+                stop = pop()
+                step = pop() if arg == 3 else 1
+                stack[-1] = make_range(stack[-1], step, stop)
+            elif op == BUILD_ROW:
+                row = stack[len(stack) - arg:]
+                del stack[len(stack) - arg:]
+                push(row)
+            elif op == BUILD_MATRIX:
+                rows = stack[len(stack) - arg:]
+                del stack[len(stack) - arg:]
+                push(make_matrix(rows))
+            elif op == BINARY_INDEX:
+                indices = pop()
+                stack[-1] = get_index(stack[-1], indices)
+            elif op == STORE_INDEX:
+                indices = pop()
+                value = slots[arg]
+                slots[arg] = set_index(None if value is UNBOUND else value, indices, pop())
+            elif op == COPY_VALUE:
+                if isinstance(stack[-1], ndarray):
+                    stack[-1] = stack[-1].copy()
+            else:
+                raise Exception('Invalid opcode {}'.format(op))
+
+    def dump(self, writer: IO[bytes]):
+        """Writes the code object to a binary file in the '.mc' format"""
+        writer.write(MAGIC + struct.pack('<H', VERSION) + self.source_hash.ljust(32, b'\0'))
+
+        writer.write(struct.pack('<I', len(self.constants)))
+        for constant in self.constants:
+            if isinstance(constant, float):
+                writer.write(b'f' + struct.pack('<d', constant))
+            elif constant in BUILTIN_NAMES:
+                encoded = BUILTIN_NAMES[constant].encode('utf-8')
+                writer.write(b'b' + struct.pack('<H', len(encoded)) + encoded)
+            else:
+                size = constant.bit_length() // 8 + 1
+                writer.write(b'i' + struct.pack('<H', size) + constant.to_bytes(size, 'little', signed=True))
+
+        writer.write(struct.pack('<I', len(self.names)))
+        for name in self.names:
+            encoded = name.encode('utf-8')
+            writer.write(struct.pack('<H', len(encoded)) + encoded)
+
+        code = array('i', self.code)
+        if sys.byteorder == 'big':
+            code.byteswap()
+        writer.write(struct.pack('<I', len(code)) + code.tobytes())
+
+
+def load(reader: IO[bytes], source: str = None):
+    """
+    Reads a code object from a binary file in the '.mc' format
+
+    Args:
+        reader: The binary file
+        source(str): If given, the source text the file must have been
+        compiled from
+
+    Returns:
+        CodeObject: The compiled script
+
+    Raises:
+        ValueError: If the file is not a '.mc' file of this version, or it
+        was not compiled from the given source
+    """
+    data = reader.read()
+    if data[:4] != MAGIC:
+        raise ValueError('Not a compiled MATLAB script')
+    version, = struct.unpack_from('<H', data, 4)
+    if version != VERSION:
+        raise ValueError('Unsupported compiled script version {}'.format(version))
+    digest = data[6:38]
+    if source is not None and digest != hash_source(source):
+        raise ValueError('Compiled script is out of date with its source')
+    pos = 38
+
+    count, = struct.unpack_from('<I', data, pos)
+    pos += 4
+    constants = []
+    for _ in range(count):
+        tag = data[pos:pos + 1]
+        if tag == b'f':
+            constants.append(struct.unpack_from('<d', data, pos + 1)[0])
+            pos += 9
+        elif tag == b'i':
+            size, = struct.unpack_from('<H', data, pos + 1)
+            pos += 3
+            constants.append(int.from_bytes(data[pos:pos + size], 'little', signed=True))
+            pos += size
+        elif tag == b'b':
+            size, = struct.unpack_from('<H', data, pos + 1)
+            pos += 3
+            builtin = BUILTINS.get(data[pos:pos + size].decode('utf-8'))
+            if builtin is None:
+                raise ValueError('Corrupt compiled script')
+            constants.append(builtin.function)
+            pos += size
+        else:
+            raise ValueError('Corrupt compiled script')
+
+    count, = struct.unpack_from('<I', data, pos)
+    pos += 4
+    names = []
+    for _ in range(count):
+        size, = struct.unpack_from('<H', data, pos)
+        pos += 2
+        names.append(data[pos:pos + size].decode('utf-8'))
+        pos += size
+
+    count, = struct.unpack_from('<I', data, pos)
+    pos += 4
+    code = array('i')
+    code.frombytes(data[pos:pos + 4 * count])
+    if len(code) != count:
+        raise ValueError('Corrupt compiled script')
+    if sys.byteorder == 'big':
+        code.byteswap()
+
+    return CodeObject(code, constants, names, digest)
+
+
+class BytecodeCompiler(NodeVisitor):
+    """
+    Compiler of an Abstract Syntax Tree representing a script in the
+    MATLAB language into a CodeObject. Supports the Compound, Assign,
+    For, While, BinaryOp, UnaryOp, Var, Index, Matrix, Colon, Call and Num
+    nodes. A Vectorized node is compiled as its original loop
+    """
+
+    def __init__(self):
+        self.code = array('i')
+        self.constants = []  # type: List
+        self.names = []  # type: List[str]
+        self._constant_index = {}  # type: Dict
+        self._name_index = {}  # type: Dict[str, int]
+        self._assigned = set()
+
+    def compile(self, tree, source=None):
+        """
+        Compiles an AST
+
+        Args:
+            tree(Node): The root of the AST, or a single statement
+            source(str): The source text of the AST, to record its hash
+
+        Returns:
+            CodeObject: The compiled script
+        """
+        self.visit(tree)
+        digest = hash_source(source) if source is not None else b''
+        return CodeObject(self.code, self.constants, self.names, digest)
+
+    def emit(self, op, arg=0):
+        """Appends an instruction to the code"""
+        self.code.append(op)
+        self.code.append(arg)
+
+    def visit_Compound(self, node):
+        """Custom visitor method for Compound Node"""
+        for statement in node.statements:
+            self.visit(statement)
+
+    def visit_Node(self, node):
+        """Custom visitor method for Node"""
+        pass
+
+    def visit_Assign(self, node):
+        """Custom visitor method for Assign Node"""
+        self.visit(node.right)
+        index = self._name(node.left.token.value)
+        if isinstance(node.left, Index):
+            self._indices(node.left)
+            self.emit(STORE_INDEX, index)
+        elif is_alias(node.right):
+            self.emit(COPY_VALUE)
+            self.emit(STORE_NAME, index)
+        else:
+            self.emit(STORE_NAME, index)
+        self._assigned.add(index)
+
+    def visit_For(self, node):
+        """
+        Custom visitor method for For Node. Variables assigned in the
+        body are not certain to be assigned after the loop, since it may
+        run zero times
+        """
+        self.visit(node.right)
+        self.emit(GET_ITER)
+        index = self._name(node.left.token.value)
+        loop = len(self.code)
+        self.emit(FOR_ITER)
+        self.emit(STORE_NAME, index)
+        assigned = set(self._assigned)
+        self._assigned.add(index)
+        self.visit(node.body)
+        self._assigned = assigned
+        self.emit(JUMP, loop)
+        self.code[loop + 1] = len(self.code)
+
+    def visit_Vectorized(self, node):
+        """Custom visitor method for Vectorized Node"""
+        self.visit(node.loop)
+
+    def visit_While(self, node):
+        """Custom visitor method for While Node"""
+        loop = len(self.code)
+        self.visit(node.left)
+        exit_jump = len(self.code)
+        self.emit(POP_JUMP_IF_FALSE)
+        assigned = set(self._assigned)
+        self.visit(node.body)
+        self._assigned = assigned
+        self.emit(JUMP, loop)
+        self.code[exit_jump + 1] = len(self.code)
+
+    def visit_BinaryOp(self, node):
+        """
+        Custom visitor method for BinaryOp Node
+
+        Raises:
+            Exception: If ill-conditioned AST
+        """
+        self.compile_operators(node)
+
+    def visit_UnaryOp(self, node):
+        """
+        Custom visitor method for UnaryOp Node. Unary plus emits no code
+
+        Raises:
+            Exception: If ill-conditioned AST
+        """
+        self.compile_operators(node)
+
+    def compile_operators(self, root):
+        """
+        Emits the code of the expression under root in post-order, with an
+        explicit stack instead of a recursive visit per node, so that
+        arbitrarily deep expressions (like a chain of thousands of
+        additions, or of nested calls) compile without exhausting Python's
+        recursion limit. The stack holds the nodes still to compile and the
+        instructions to emit once their operands are compiled. Every node
+        that is not an operator, call, indexing expression, matrix literal
+        or range is visited
+
+        Raises:
+            Exception: If ill-conditioned AST
+        """
+        stack = [root]
+        while stack:
+            node = stack.pop()
+            if isinstance(node, tuple):
+                self.emit(*node)
+            elif isinstance(node, BinaryOp):
+                op_type = node.token.type
+                if op_type in COMPARISONS:
+                    stack.append((COMPARE_OP, COMPARISONS.index(op_type)))
+                else:
+                    opcode = BINARY_OPCODES.get(op_type)
+                    if opcode is None:
+                        self.raise_error()
+                    stack.append((opcode,))
+                stack.append(node.right)
+                stack.append(node.left)
+            elif isinstance(node, UnaryOp):
+                if node.token.type == MINUS:
+                    stack.append((UNARY_NEG,))
+                elif node.token.type != PLUS:
+                    self.raise_error()
+                stack.append(node.right)
+            elif isinstance(node, Call):
+                self.emit(LOAD_CONST, self._constant(node.function))
+                stack.append((CALL_FUNCTION, len(node.args)))
+                stack.extend(reversed(node.args))
+            elif isinstance(node, Index):
+                self.visit_Var(node)
+                stack.append((BINARY_INDEX,))
+                stack.append((BUILD_ROW, len(node.args)))
+                stack.extend(reversed(node.args))
+            elif isinstance(node, Matrix):
+                stack.append((BUILD_MATRIX, len(node.rows)))
+                for row in reversed(node.rows):
+                    stack.append((BUILD_ROW, len(row)))
+                    stack.extend(reversed(row))
+            elif isinstance(node, Colon):
+                stack.append((BUILD_RANGE, 2 if node.step is None else 3))
+                stack.extend(bound for bound in (node.stop, node.step, node.start) if bound is not None)
+            else:
+                self.visit(node)
+
+    def visit_Var(self, node):
+        """Custom visitor method for Var Node"""
+        index = self._name(node.token.value)
+        self.emit(LOAD_FAST if index in self._assigned else LOAD_NAME, index)
+
+    visit_Temporary = visit_Var
+
+    def visit_Index(self, node):
+        """Custom visitor method for Index, Matrix, Colon and Call Nodes"""
+        self.compile_operators(node)
+
+    visit_Matrix = visit_Colon = visit_Call = visit_Index
+
+    def visit_Num(self, node):
+        """Custom visitor method for Num Node"""
+        self.emit(LOAD_CONST, self._constant(node.token.value))
+
+    def _indices(self, node):
+        for arg in node.args:
+            self.visit(arg)
+        self.emit(BUILD_ROW, len(node.args))
+
+    def _constant(self, value):
+        key = (type(value), value)
+        index = self._constant_index.get(key)
+        if index is None:
+            index = self._constant_index[key] = len(self.constants)
+            self.constants.append(value)
+        return index
+
+    def _name(self, name):
+        index = self._name_index.get(name)
+        if index is None:
+            index = self._name_index[name] = len(self.names)
+            self.names.append(name)
+        return index
+
+    def raise_error(self):
+        """
+        Raises:
+            Exception: Error compiling input
+        """
+        raise Exception('Error compiling input')
+
+
+def compile_source(text: str, optimize: bool = False):
+    """
+    Scans, parses and compiles a script, optimizing its AST first if
+    optimize is set
+
+    Returns:
+        CodeObject: The compiled script, recording the hash of text
+    """
+    tree = Parser(Scanner(text)).parse()
+    if optimize:
+        tree = Optimizer().optimize(tree)
+    return BytecodeCompiler().compile(tree, text)
@@ -0,0 +1,343 @@
+# pylint: disable = unused-wildcard-import
+# pylint: disable = too-few-public-methods
+
+"""
+Filename: Cache.py
+Description: Content-addressed cache of parsed and compiled scripts
+Author:    Juan Trejo
+Github:    https://github.com/jtrejo13
+"""
+
+# -------
+# imports
+# -------
+
+import hashlib
+import os
+import pickle
+from collections import Counter, OrderedDict
+from concurrent.futures import Future
+from threading import Lock, RLock, get_ident
+from typing import Callable, Dict, FrozenSet, Iterable, List
+from Scanner import *
+from Parser import Parser, Compound, Node
+from Builtins import BUILTINS
+from Optimizer import Optimizer, children
+
+
+"""
+Disk Format
+
+The on-disk tier pickles ASTs, which only load back with the node classes
+they were pickled with. FORMAT_VERSION is part of the name of every file
+of the tier, and changes whenever the node classes or their encoding (see
+flatten) do, so that files left by other versions are never read
+"""
+FORMAT_VERSION = 2
+
+
+def flatten(tree):
+    """
+    Lists the nodes of an AST so that every node comes after its
+    children, and the root last. Pickling the list pickles each node once
+    its children are already in the pickle memo, so that the pickler does
+    not recurse once per level of an arbitrarily deep AST
+
+    Returns:
+        list of Node: The nodes of tree in post-order
+    """
+    nodes = []
+    stack = [(tree, False)]
+    while stack:
+        node, children_listed = stack.pop()
+        if children_listed:
+            nodes.append(node)
+        else:
+            stack.append((node, True))
+            stack.extend((child, False) for child in children(node))
+    return nodes
+
+
+class CachedScript(object):
+    """
+    The parsed and compiled forms of one script. Each form is only
+    created the first time it is asked for, and then kept. Threads sharing
+    the script wait for a form another thread is creating
+
+    Args:
+        text(str): The source text of the script
+        tree(Compound): The AST of text, if already parsed
+        variables(iterable of str): The variables assigned before the
+        script runs (see ScriptCache.lookup)
+
+    Attributes:
+        text(str): The source text of the script
+        variables(frozenset of str): The variables assigned before the
+        script runs
+    """
+
+    def __init__(self, text, tree=None, variables=()):
+        self.text = text
+        self.variables = frozenset(variables)
+        self._trees = {}  # type: Dict[object, tuple]
+        self._compiled = {}  # type: Dict[tuple, object]
+        self._lock = RLock()
+        if tree is not None:
+            self._trees[False] = (tree, Counter(), [])
+
+    def tree(self, optimize=False, outputs=None):
+        """
+        Args:
+            optimize(bool): Whether the AST is optimized
+            outputs(frozenset of str): The variables the optimized AST
+            must compute (see Optimizer), or None for all of them
+
+        Returns:
+            Compound: The AST of the script, optimized if optimize is set.
+            It is shared by every user of the cache, so it must not be modified
+        """
+        return self.optimized(optimize, outputs)[0]
+
+    def optimized(self, optimize=False, outputs=None):
+        """
+        Args:
+            optimize(bool): Whether the AST is optimized
+            outputs(frozenset of str): The variables the optimized AST
+            must compute, or None for all of them
+
+        Returns:
+            tuple: The AST of the script (see tree), the report of the
+            optimizer (Counter) and the loops it reported on (list of str),
+            both empty if optimize is not set
+        """
+        key = (optimize, outputs) if optimize else False
+        with self._lock:
+            entry = self._trees.get(key)
+            if entry is None:
+                parser = Parser(Scanner(self.text))
+                parser.variables.update(self.variables)
+                tree = parser.parse()
+                report, loops = Counter(), []  # type: Counter, List[str]
+                if optimize:
+                    optimizer = Optimizer(outputs)
+                    tree = optimizer.optimize(tree)
+                    report, loops = optimizer.report, optimizer.loops
+                entry = self._trees[key] = (tree, report, loops)
+            return entry
+
+    def compiled(self, engine: str, optimize: bool, compiler: Callable, outputs: FrozenSet[str] = None,
+                 statements: bool = False):
+        """
+        Args:
+            engine(str): The engine the script is compiled for
+            optimize(bool): Whether the AST is optimized first
+            compiler(callable): Compiles an AST for engine, if the script
+            has not been compiled for it yet (see Interpreter.compile)
+            outputs(frozenset of str): The variables the optimized AST
+            must compute, or None for all of them
+            statements(bool): Whether each statement is compiled on its
+            own, so that they can be run one at a time
+
+        Returns:
+            The compiled script, or a list of (statement, compiled
+            statement) pairs if statements is set
+        """
+        key = (engine, optimize, outputs if optimize else None, statements)
+        with self._lock:
+            compiled = self._compiled.get(key)
+            if compiled is None:
+                tree = self.tree(optimize, outputs)
+                if statements:
+                    compiled = [(statement, compiler(statement)) for statement in tree.statements
+                                if type(statement) is not Node]
+                else:
+                    compiled = compiler(tree)
+                self._compiled[key] = compiled
+            return compiled
+
+
+class CachedParser(Parser):
+    """
+    A Parser for a script in a ScriptCache. It does no scanning or parsing
+    of its own, and the Interpreter runs the script's cached compiled forms
+
+    Args:
+        script(CachedScript): The cached script
+
+    Attributes:
+        script(CachedScript): The cached script
+    """
+
+    def __init__(self, script):
+        self.scanner = None
+        self.current_token = EOF_TOKEN
+        self.script = script
+
+    def parse(self):
+        """
+        Returns:
+            Compound: The cached AST of the script
+        """
+        return self.script.tree()
+
+    def parse_statements(self):
+        """
+        Yields:
+            Node: The statements of the cached AST of the script
+        """
+        for statement in self.parse().statements:
+            yield statement
+
+
+class ScriptCache(object):
+    """
+    A least recently used cache of parsed and compiled scripts, keyed by
+    the SHA-256 digest of their source text. It can be shared by threads:
+    only the map of scripts is locked, and concurrent misses of a script
+    wait for a single thread to read or parse it
+
+    Args:
+        size(int): The maximum number of scripts kept in memory
+        directory(str): If given, the parsed AST of every script is also
+        stored in this directory, and read back when a script is not in
+        memory. The ASTs are pickled as lists of their nodes (see flatten),
+        so only use a directory that no one else can write to
+
+    Attributes:
+        size(int): The maximum number of scripts kept in memory
+        directory(str): The directory of the on-disk tier, or None
+        hits(int): Lookups of scripts that were in memory
+        misses(int): Lookups of scripts that were not
+        evictions(int): Scripts dropped from memory to make room
+        disk_hits(int): Misses that were served from the directory
+    """
+
+    def __init__(self, size=128, directory=None):
+        if size < 1:
+            raise ValueError('Cache size must be at least 1')
+        self.size = size
+        self.directory = directory
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.disk_hits = 0
+        self._scripts = OrderedDict()  # type: OrderedDict
+        self._pending = {}  # type: Dict[str, Future]
+        self._lock = Lock()
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+
+    def __len__(self):
+        return len(self._scripts)
+
+    def lookup(self, text: str, variables: Iterable[str] = ()):
+        """
+        Args:
+            variables(iterable of str): The variables assigned before the
+            script runs, like the ones of a persistent workspace. Those
+            naming built-in functions are indexed rather than called by
+            the script (see Parser.call_or_index), so they are part of its key
+
+        Returns:
+            CachedScript: The cached script with source text, which is
+            scanned and parsed if it is not in the cache
+
+        Raises:
+            Exception: If text has invalid syntax
+        """
+        digest = hashlib.sha256(text.encode('utf-8')).hexdigest()
+        shadowed = sorted(name for name in variables if name in BUILTINS)
+        if shadowed:
+            digest += '-' + hashlib.sha256(' '.join(shadowed).encode('utf-8')).hexdigest()
+        with self._lock:
+            script = self._scripts.get(digest)
+            if script is not None:
+                self.hits += 1
+                self._scripts.move_to_end(digest)
+                return script
+            pending = self._pending.get(digest)
+            if pending is not None:
+                # another thread is already reading or parsing the script
+                self.hits += 1
+            else:
+                self.misses += 1
+                future = self._pending[digest] = Future()
+        if pending is not None:
+            return pending.result()
+
+        # the lock is not held while reading the directory or parsing, so
+        # that lookups of other scripts are not kept waiting
+        try:
+            tree = self._load(digest)
+            from_disk = tree is not None
+            if tree is None:
+                parser = Parser(Scanner(text))
+                parser.variables.update(shadowed)
+                tree = parser.parse()
+                if self.directory is not None:
+                    self._store(digest, tree)
+            script = CachedScript(text, tree, shadowed)
+        except BaseException as error:
+            with self._lock:
+                del self._pending[digest]
+            future.set_exception(error)
+            raise
+        with self._lock:
+            del self._pending[digest]
+            self.disk_hits += from_disk
+            self._scripts[digest] = script
+            if len(self._scripts) > self.size:
+                self._scripts.popitem(last=False)
+                self.evictions += 1
+        future.set_result(script)
+        return script
+
+    def parser(self, text: str, variables: Iterable[str] = ()):
+        """
+        Returns:
+            CachedParser: A parser for the cached script with source text,
+            run after variables are assigned (see lookup)
+        """
+        return CachedParser(self.lookup(text, variables))
+
+    def stats(self):
+        """
+        Returns:
+            dict: The counters of the cache, and the number of scripts in memory
+        """
+        return {'size': len(self._scripts), 'hits': self.hits, 'misses': self.misses,
+                'evictions': self.evictions, 'disk_hits': self.disk_hits}
+
+    def _path(self, digest):
+        return os.path.join(self.directory, '{}.v{}.ast'.format(digest, FORMAT_VERSION))
+
+    def _load(self, digest):
+        if self.directory is None:
+            return None
+        path = self._path(digest)
+        try:
+            with open(path, 'rb') as tree_file:
+                nodes = pickle.load(tree_file)
+            tree = nodes[-1]
+            if not isinstance(tree, Compound):
+                raise TypeError('Not an AST')
+        except OSError:
+            return None
+        except (AttributeError, EOFError, ImportError, IndexError, KeyError, TypeError, pickle.UnpicklingError):
+            # truncated, or pickled with other node classes: the file is
+            # stale, and the script is parsed and stored again
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            return None
+        return tree
+
+    def _store(self, digest, tree):
+        path = self._path(digest)
+        if os.path.exists(path):
+            return
+        temp_path = '{}.{}.{}.tmp'.format(path, os.getpid(), get_ident())
+        with open(temp_path, 'wb') as tree_file:
+            pickle.dump(flatten(tree), tree_file, pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_path, path)
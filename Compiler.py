@@ -0,0 +1,564 @@
+# pylint: disable = unused-wildcard-import
+# pylint: disable = no-self-use
+# pylint: disable = invalid-name
+
+"""
+Filename: Compiler.py
+Description: Compiles an Abstract Syntax Tree into a tree of Python
+             closures, so that a parsed script can be run any number
+             of times without dispatching on node or token types
+Author:    Juan Trejo
+Github:    https://github.com/jtrejo13
+"""
+
+# -------
+# imports
+# -------
+
+from collections.abc import Mapping
+from threading import local
+from typing import Dict, List
+import numpy
+from numpy import ndarray
+from Scanner import *
+from Parser import NodeVisitor, Node, BinaryOp, UnaryOp, Call, Colon, Index, Matrix, Num, EXPRESSIONS, TEMPORARY, \
+    is_alias, operands_of
+from Operators import BINARY_OPERATORS, UNARY_OPERATORS, identity, make_matrix, make_range, columns, is_true, \
+    get_index, set_index
+
+
+"""
+Variable Slots
+
+Compiled code does not look variables up by name. Each variable in a
+script is given a fixed index when the script is compiled, and the
+compiled code reads and writes a flat list of values (the slots) at
+that index. UNBOUND marks the slot of a variable without a value
+"""
+UNBOUND = object()
+
+
+def load_slots(names: List[str], scope: Dict, temporaries: Dict = None):
+    """
+    Returns:
+        list: The slots of the variables in names, holding their
+        values in scope, or for temporaries in temporaries (or UNBOUND)
+    """
+    get = scope.get
+    slots = [get(name, UNBOUND) for name in names]
+    if temporaries:
+        for index, name in enumerate(names):
+            if name in temporaries:
+                slots[index] = temporaries[name]
+    return slots
+
+
+def store_slots(names: List[str], slots: List, scope: Dict, temporaries: Dict = None):
+    """
+    Copies the value of every bound slot back into scope. Temporaries
+    are never copied into scope, but into temporaries, if given, so that
+    the statements of a script compiled one at a time share them
+    """
+    for name, value in zip(names, slots):
+        if value is not UNBOUND:
+            if not name.startswith(TEMPORARY):
+                scope[name] = value
+            elif temporaries is not None:
+                temporaries[name] = value
+
+
+"""
+Nested Expressions
+
+Every operator, call, indexing expression, matrix literal and range
+compiles into a closure calling the closures of its operands, so running
+an expression recurses once per level of nesting. An expression nested
+deeper than NESTED_EXPRESSIONS is compiled into a single closure instead
+(see Compiler.compile_operators)
+"""
+NESTED_EXPRESSIONS = 100
+
+
+def is_deep(node, limit: int = NESTED_EXPRESSIONS):
+    """
+    Returns:
+        bool: Whether the expression under node is nested deeper than limit
+    """
+    stack = [(node, 1)]
+    while stack:
+        node, depth = stack.pop()
+        if depth > limit:
+            return True
+        stack.extend((operand, depth + 1) for operand in operands_of(node))
+    return False
+
+
+class SlotView(Mapping):
+    """
+    Read-only, name-keyed view of variable slots, listing the bound
+    variables in slot order
+
+    Args:
+        names(list of str): The variable of each slot
+        slots(list): The values of the variables
+    """
+
+    def __init__(self, names, slots):
+        self._index = {name: index for index, name in enumerate(names)}
+        self._names = names
+        self._slots = slots
+
+    def __getitem__(self, name):
+        value = self._slots[self._index[name]]
+        if value is UNBOUND:
+            raise KeyError(name)
+        return value
+
+    def __iter__(self):
+        for name, value in zip(self._names, self._slots):
+            if value is not UNBOUND:
+                yield name
+
+    def __len__(self):
+        return sum(1 for value in self._slots if value is not UNBOUND)
+
+
+class CompiledScript(object):
+    """
+    A script compiled into closures
+
+    Args:
+        body(callable): Runs the script on a list of slots
+        names(list of str): The variable of each slot
+
+    Attributes:
+        body(callable): Runs the script on a list of slots
+        names(list of str): The variable of each slot
+    """
+
+    def __init__(self, body, names):
+        self.body = body
+        self.names = names
+
+    def __call__(self, scope: Dict, temporaries: Dict = None):
+        """
+        Runs the script in a name-keyed scope. The variables the script
+        uses are copied into slots before running it, and back into the
+        scope afterwards (also if the script raises)
+
+        Args:
+            scope(dict key:str value:float or int): Scope of variables
+            read and updated by the script
+            temporaries(dict key:str value:float or int): Temporaries
+            read and updated by the script (see store_slots)
+        """
+        slots = load_slots(self.names, scope, temporaries)
+        try:
+            self.body(slots)
+        finally:
+            store_slots(self.names, slots, scope, temporaries)
+
+    def workspace(self, slots: List):
+        """
+        Returns:
+            SlotView: A name-keyed view of slots
+        """
+        return SlotView(self.names, slots)
+
+
+class Compiler(NodeVisitor):
+    """
+    Compiler of an Abstract Syntax Tree representing a script in the
+    MATLAB language. Each node is visited exactly once and turned into
+    a closure with its operator, children, constants and variable slots
+    already bound.
+
+    Every closure takes the list of slots as its only argument.
+    Statements update the slots and expressions return their value.
+    A variable that is certain to have been assigned by an earlier
+    statement is read without checking that its slot is bound. The
+    body of a loop may run zero times, so the variables it assigns are
+    not certain to be assigned after the loop
+
+    Attributes:
+        names(list of str): The variable of each slot, in order of first
+        appearance in the script
+    """
+
+    def __init__(self):
+        self.names = []  # type: List[str]
+        self._slots = {}  # type: Dict[str, int]
+        self._assigned = set()
+        self._loop_range = None
+
+    def compile(self, tree):
+        """
+        Compiles an AST
+
+        Args:
+            tree(Node): The root of the AST, or a single statement
+
+        Returns:
+            CompiledScript: The compiled script
+        """
+        return CompiledScript(self.visit(tree), self.names)
+
+    def slot(self, var_name):
+        """
+        Returns:
+            int: The slot index of a variable, assigning a new one to
+            variables not seen before
+        """
+        index = self._slots.get(var_name)
+        if index is None:
+            index = self._slots[var_name] = len(self.names)
+            self.names.append(var_name)
+        return index
+
+    def visit_Compound(self, node):
+        """Custom visitor method for Compound Node"""
+        statements = tuple(self.visit(statement) for statement in node.statements
+                           if type(statement) is not Node)
+
+        def compound(slots):
+            for statement in statements:
+                statement(slots)
+        return compound
+
+    def visit_Assign(self, node):
+        """
+        Custom visitor method for Assign Node. A matrix assigned from
+        another variable is copied (see Parser.is_alias)
+        """
+        value = self.visit(node.right)
+        index = self.slot(node.left.token.value)
+        if isinstance(node.left, Index):
+            return self.assign_index(node.left, value, index)
+        self._assigned.add(index)
+
+        if is_alias(node.right):
+            def assign_copy(slots):
+                result = value(slots)
+                slots[index] = result.copy() if isinstance(result, ndarray) else result
+            return assign_copy
+
+        def assign(slots):
+            slots[index] = value(slots)
+        return assign
+
+    def assign_index(self, target, value, index):
+        """
+        Compiles an indexed assignment, like x(i) = v
+
+        Args:
+            target(Index): The elements assigned
+            value(callable): The compiled value assigned
+            index(int): The slot of the variable
+        """
+        indices = tuple(self.visit(arg) for arg in target.args)
+        self._assigned.add(index)
+
+        def assign_index(slots):
+            element = value(slots)
+            current = slots[index]
+            slots[index] = set_index(None if current is UNBOUND else current,
+                                     [arg(slots) for arg in indices], element)
+        return assign_index
+
+    def visit_For(self, node):
+        """
+        Custom visitor method for For Node. The body is compiled once,
+        and the loop stores each value straight into the slot of the
+        loop variable before calling it
+        """
+        values = self.visit(node.right)
+        index = self.slot(node.left.token.value)
+        assigned = set(self._assigned)
+        self._assigned.add(index)
+        body = self.visit(node.body)
+        self._assigned = assigned
+
+        def loop(slots):
+            for value in columns(values(slots)):
+                slots[index] = value
+                body(slots)
+        return loop
+
+    def visit_Vectorized(self, node):
+        """
+        Custom visitor method for Vectorized Node. The values of the loop
+        variable are computed once, and the array expressions run with
+        NumPy raising on division by zero, overflow and invalid results.
+        The values are kept per thread, since a compiled script may run in
+        several threads at once.
+        The original loop runs instead if an operand that must be a number
+        is a matrix, or if the array expressions raise; it then raises
+        itself, or overwrites every element the array expressions assigned
+        """
+        loop = self.visit(node.loop)
+        scalars = tuple(self.visit(scalar) for scalar in node.scalars)
+        values = self.visit(node.right)
+        index = self.slot(node.left.token.value)
+        assigned = set(self._assigned)
+        outer_range = self._loop_range
+        self._loop_range = loop_range = local()
+        body = self.visit(node.body)
+        self._loop_range = outer_range
+        self._assigned = assigned
+
+        def vectorized(slots):
+            loop_range.elements = elements = values(slots)
+            if not len(elements):
+                return
+            try:
+                if any(numpy.size(scalar(slots)) != 1 for scalar in scalars):
+                    loop(slots)
+                    return
+                with numpy.errstate(divide='raise', over='raise', invalid='raise'):
+                    body(slots)
+            except (ArithmeticError, IndexError, NameError, TypeError, ValueError):
+                loop(slots)
+                return
+            slots[index] = elements[-1]
+        return vectorized
+
+    def visit_LoopRange(self, node):
+        """Custom visitor method for LoopRange Node"""
+        loop_range = self._loop_range
+        return lambda slots: loop_range.elements
+
+    def visit_While(self, node):
+        """Custom visitor method for While Node"""
+        condition = self.visit(node.left)
+        assigned = set(self._assigned)
+        body = self.visit(node.body)
+        self._assigned = assigned
+
+        def loop(slots):
+            while is_true(condition(slots)):
+                body(slots)
+        return loop
+
+    def visit_Node(self, node):
+        """Custom visitor method for Node"""
+        def empty(slots):
+            pass
+        return empty
+
+    def visit_BinaryOp(self, node):
+        """
+        Custom visitor method for BinaryOp Node. Addition and subtraction
+        are inlined, and bind a Num operand on the right directly instead
+        of calling a closure for it. So is multiplication by a Num; other
+        products may be matrix products, so they go through multiply
+
+        Raises:
+            Exception: If ill-conditioned AST
+        """
+        if is_deep(node):
+            return self.compile_operators(node)
+        op_type = node.token.type
+        operator = BINARY_OPERATORS.get(op_type)
+        if operator is None:
+            self.raise_error()
+        left = self.visit(node.left)
+
+        if isinstance(node.right, Num):
+            constant = node.right.token.value
+            if op_type == PLUS:
+                return lambda slots: left(slots) + constant
+            if op_type == MINUS:
+                return lambda slots: left(slots) - constant
+            if op_type == MUL:
+                return lambda slots: left(slots) * constant
+            return lambda slots: operator(left(slots), constant)
+
+        right = self.visit(node.right)
+        if op_type == PLUS:
+            return lambda slots: left(slots) + right(slots)
+        if op_type == MINUS:
+            return lambda slots: left(slots) - right(slots)
+        return lambda slots: operator(left(slots), right(slots))
+
+    def visit_UnaryOp(self, node):
+        """
+        Custom visitor method for UnaryOp Node. Unary plus compiles to
+        its operand
+
+        Raises:
+            Exception: If ill-conditioned AST
+        """
+        if is_deep(node):
+            return self.compile_operators(node)
+        operator = UNARY_OPERATORS.get(node.token.type)
+        if operator is None:
+            self.raise_error()
+        operand = self.visit(node.right)
+        if operator is identity:
+            return operand
+        return lambda slots: operator(operand(slots))
+
+    def compile_operators(self, root):
+        """
+        Compiles the expression under root into a single closure, which
+        applies its operators, calls, indexing, matrix literals and ranges
+        in post-order to a stack of values. The expression is walked with
+        an explicit stack, so that arbitrarily deep expressions (like a
+        chain of thousands of additions, or of nested calls) neither compile
+        nor run into Python's recursion limit. Every other node is visited
+
+        Raises:
+            Exception: If ill-conditioned AST
+        """
+        program = []
+        stack = [(root, False)]
+        while stack:
+            node, operands_compiled = stack.pop()
+            if not isinstance(node, EXPRESSIONS):
+                program.append((0, self.visit(node), 0))
+                continue
+            if not operands_compiled:
+                stack.append((node, True))
+                if isinstance(node, Index):
+                    program.append((0, self.visit_Var(node), 0))
+                stack.extend((operand, False) for operand in reversed(operands_of(node)))
+            elif isinstance(node, BinaryOp):
+                operator = BINARY_OPERATORS.get(node.token.type)
+                if operator is None:
+                    self.raise_error()
+                program.append((2, operator, 2))
+            elif isinstance(node, UnaryOp):
+                operator = UNARY_OPERATORS.get(node.token.type)
+                if operator is None:
+                    self.raise_error()
+                if operator is not identity:
+                    program.append((1, operator, 1))
+            else:
+                program.append((3,) + self.combine(node))
+        program = tuple(program)
+
+        def evaluate(slots):
+            values = []
+            for kind, function, count in program:
+                if kind == 2:
+                    right = values.pop()
+                    values[-1] = function(values[-1], right)
+                elif kind == 1:
+                    values[-1] = function(values[-1])
+                elif kind == 0:
+                    values.append(function(slots))
+                else:
+                    first = len(values) - count
+                    operands = values[first:]
+                    del values[first:]
+                    values.append(function(operands))
+            return values[0]
+        return evaluate
+
+    @staticmethod
+    def combine(node):
+        """
+        Returns:
+            tuple: The function that computes the value of a Call, Index,
+            Matrix or Colon node from the list of the values of its
+            operands (after the value of the variable, for an Index), and
+            the number of values it takes
+        """
+        if isinstance(node, Call):
+            function = node.function
+            return (lambda args: function(*args)), len(node.args)
+        if isinstance(node, Index):
+            return (lambda values: get_index(values[0], values[1:])), len(node.args) + 1
+        if isinstance(node, Matrix):
+            lengths = [len(row) for row in node.rows]
+
+            def matrix(elements):
+                rows = []
+                for length in lengths:
+                    rows.append(elements[:length])
+                    elements = elements[length:]
+                return make_matrix(rows)
+            return matrix, sum(lengths)
+        if node.step is None:
+            return (lambda bounds: make_range(bounds[0], 1, bounds[1])), 2
+        return (lambda bounds: make_range(*bounds)), 3
+
+    def visit_Var(self, node):
+        """
+        Custom visitor method for Var Node
+
+        Raises (when run):
+            NameError exception if identifier has not been
+            declared earlier in the script
+        """
+        var_name = node.token.value
+        index = self.slot(var_name)
+        if index in self._assigned:
+            return lambda slots: slots[index]
+
+        def var(slots):
+            value = slots[index]
+            if value is UNBOUND:
+                raise NameError(repr(var_name))
+            return value
+        return var
+
+    visit_Temporary = visit_Var
+
+    def visit_Index(self, node):
+        """Custom visitor method for Index Node"""
+        if is_deep(node):
+            return self.compile_operators(node)
+        var = self.visit_Var(node)
+        indices = tuple(self.visit(arg) for arg in node.args)
+        if len(indices) == 1:
+            arg, = indices
+            return lambda slots: get_index(var(slots), [arg(slots)])
+        return lambda slots: get_index(var(slots), [arg(slots) for arg in indices])
+
+    def visit_Matrix(self, node):
+        """Custom visitor method for Matrix Node"""
+        if is_deep(node):
+            return self.compile_operators(node)
+        rows = tuple(tuple(self.visit(element) for element in row) for row in node.rows)
+        return lambda slots: make_matrix([[element(slots) for element in row] for row in rows])
+
+    def visit_Colon(self, node):
+        """Custom visitor method for Colon Node"""
+        if is_deep(node):
+            return self.compile_operators(node)
+        start = self.visit(node.start)
+        stop = self.visit(node.stop)
+        if node.step is None:
+            return lambda slots: make_range(start(slots), 1, stop(slots))
+        step = self.visit(node.step)
+        return lambda slots: make_range(start(slots), step(slots), stop(slots))
+
+    def visit_Call(self, node):
+        """
+        Custom visitor method for Call Node. Calls with one or two
+        arguments pass them without building a list
+        """
+        if is_deep(node):
+            return self.compile_operators(node)
+        function = node.function
+        args = tuple(self.visit(arg) for arg in node.args)
+        if len(args) == 1:
+            arg, = args
+            return lambda slots: function(arg(slots))
+        if len(args) == 2:
+            first, second = args
+            return lambda slots: function(first(slots), second(slots))
+        return lambda slots: function(*[arg(slots) for arg in args])
+
+    def visit_Num(self, node):
+        """Custom visitor method for Num Node"""
+        value = node.token.value
+        return lambda slots: value
+
+    def raise_error(self):
+        """
+        Raises:
+            Exception: Error compiling input
+        """
+        raise Exception('Error compiling input')
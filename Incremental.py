@@ -0,0 +1,285 @@
+"""
+Filename: Incremental.py
+Description: Re-evaluates a script incrementally: when an input variable
+             or a statement changes, only the statements downstream of
+             the change run again
+Author:    Juan Trejo
+Github:    https://github.com/jtrejo13
+"""
+
+# -------
+# imports
+# -------
+
+from typing import Dict, List
+from numpy import ndarray, array_equal
+from Scanner import Scanner
+from Parser import Parser, Assign, Index, Node
+from Interpreter import Interpreter, Workspace
+from Optimizer import variables_read, variables_written
+
+
+def same_value(value, other):
+    """
+    Returns:
+        bool: Whether two values of a variable are the same
+    """
+    if type(value) is not type(other):
+        return False
+    if isinstance(value, ndarray):
+        return value.shape == other.shape and array_equal(value, other)
+    return value == other
+
+
+class IncrementalScript(object):
+    """
+    A script whose top-level statements are linked by a dependency graph:
+    each statement depends on the statements whose assignments reach the
+    variables it reads. Loops are single statements, which read and write
+    every variable their body does.
+
+    After a first run, the value each statement assigned is kept. When
+    input variables (variables the script reads before assigning them) or
+    a statement change, only the statements reading a variable whose value
+    changed run again, each with the values that reach it, and the changes
+    propagate downstream. A statement that assigns the same value as before
+    stops the propagation
+
+    Args:
+        text(str): The source text of the script
+        inputs(dict key:str value:float or int): The values of the input
+        variables
+        engine(str): The engine the statements are evaluated with (see
+        Interpreter)
+
+    Attributes:
+        statements(list of Node): The top-level statements of the script
+        reads(list of set of str): The variables each statement reads
+        writes(list of set of str): The variables each statement may assign
+        inputs(dict key:str value:float or int): The values of the input
+        variables
+        recomputed(list of int): The statements run by the last run or update
+    """
+
+    def __init__(self, text, inputs=None, engine='tree'):
+        tree = Parser(Scanner(text)).parse()
+        self.statements = [statement for statement in tree.statements if type(statement) is not Node]
+        self.reads = [variables_read(statement) for statement in self.statements]
+        self.writes = [variables_written(statement) for statement in self.statements]
+        self.inputs = dict(inputs or {})
+        self.recomputed = []  # type: List[int]
+        self._interp = Interpreter(None, engine)
+        self._compiled = [None] * len(self.statements)  # type: List
+        self._assigned = []  # type: List[Dict]
+
+    def dependencies(self):
+        """
+        Returns:
+            list of set of int: The statements each statement depends on
+        """
+        graph = []
+        last_writer = {}  # type: Dict[str, int]
+        for index, reads in enumerate(self.reads):
+            graph.append({last_writer[name] for name in reads if name in last_writer})
+            last_writer.update((name, index) for name in self.writes[index])
+        return graph
+
+    def run(self):
+        """
+        Runs every statement
+
+        Returns:
+            Workspace: The variables of the script
+        """
+        self._assigned = self._evaluate(set(range(len(self.statements))), set(), list(self._assigned))
+        return self.workspace()
+
+    def update_inputs(self, inputs):
+        """
+        Changes the values of input variables, and runs the statements
+        depending on them again. If a statement raises, the script is left
+        as it was
+
+        Returns:
+            list of str: The variables whose values changed
+        """
+        changed = {name for name, value in inputs.items()
+                   if name not in self.inputs or not same_value(value, self.inputs[name])}
+        before = self.workspace()
+        old = dict(self.inputs)
+        self.inputs.update(inputs)
+        try:
+            self._assigned = self._evaluate(set(), changed, list(self._assigned))
+        except Exception:
+            self.inputs = old
+            raise
+        return self._changes(before)
+
+    def update_statement(self, index, text):
+        """
+        Replaces a statement with the single statement in text, and runs it
+        and the statements depending on it again
+
+        Returns:
+            list of str: The variables whose values changed
+
+        Raises:
+            Exception: If text is not a single statement, or if it, or a
+            statement depending on it, raises. The script is then left as
+            it was
+        """
+        statements = self._parse(text, index)
+        if len(statements) != 1:
+            raise Exception('Expected a single statement, got {}'.format(repr(text)))
+
+        before = self.workspace()
+        old = self.statements[index], self.reads[index], self.writes[index], self._compiled[index]
+        self.statements[index] = statements[0]
+        self.reads[index] = variables_read(statements[0])
+        self.writes[index] = variables_written(statements[0])
+        self._compiled[index] = None
+        try:
+            # the variables the old statement assigned, and no longer does,
+            # now reach the statements after it from before it
+            self._assigned = self._evaluate({index}, old[2] - self.writes[index], list(self._assigned))
+        except Exception:
+            # the script is left as it was
+            self.statements[index], self.reads[index], self.writes[index], self._compiled[index] = old
+            raise
+        return self._changes(before)
+
+    def append(self, text):
+        """
+        Appends the statements in text to the script, and runs them
+
+        Returns:
+            list of str: The variables whose values changed
+
+        Raises:
+            Exception: If text has invalid syntax, or one of its statements
+            raises. The script is then left as it was
+        """
+        statements = self._parse(text, len(self.statements))
+        before = self.workspace()
+        count = len(self.statements)
+        self.statements.extend(statements)
+        self.reads.extend(variables_read(statement) for statement in statements)
+        self.writes.extend(variables_written(statement) for statement in statements)
+        self._compiled.extend(None for _ in statements)
+        try:
+            self._assigned = self._evaluate(set(range(count, len(self.statements))), set(), list(self._assigned))
+        except Exception:
+            for column in (self.statements, self.reads, self.writes, self._compiled):
+                del column[count:]
+            raise
+        return self._changes(before)
+
+    def enter(self, text):
+        """
+        Runs a command of an interactive session, whose commands make up
+        the script. A single assignment to a whole variable, that does not
+        read the variable, replaces the last statement assigning it if that
+        statement is such an assignment too: x = 4 after x = 3 runs again
+        only the statements depending on x (see update_statement). Any
+        other command is appended to the script (see append)
+
+        Returns:
+            list of str: The variables whose values changed
+
+        Raises:
+            Exception: If text has invalid syntax, or a statement raises.
+            The script is then left as it was
+        """
+        statements = self._parse(text, len(self.statements))
+        if len(statements) == 1 and isinstance(statements[0], Assign) and not isinstance(statements[0].left, Index):
+            name = statements[0].left.token.value
+            for index in range(len(self.statements) - 1, -1, -1):
+                if name in self.writes[index]:
+                    statement = self.statements[index]
+                    if isinstance(statement, Assign) and not isinstance(statement.left, Index) and \
+                            name not in variables_read(statements[0]):
+                        return self.update_statement(index, text)
+                    break
+        return self.append(text)
+
+    def workspace(self):
+        """
+        Returns:
+            Workspace: The inputs, updated by the values the statements
+            assigned, in order
+        """
+        workspace = Workspace(self.inputs)
+        for assigned in self._assigned:
+            workspace.update(assigned)
+        return workspace
+
+    def _parse(self, text, index):
+        """
+        Returns:
+            list of Node: The statements in text, parsed as if they were
+            at index in the script
+        """
+        parser = Parser(Scanner(text))
+        parser.variables.update(self.inputs)
+        for writes in self.writes[:index]:
+            parser.variables.update(writes)
+        return [statement for statement in parser.parse().statements if type(statement) is not Node]
+
+    def _evaluate(self, dirty, stale, assigned):
+        """
+        Runs the statements in dirty and the ones downstream of the
+        variables in stale, in order
+
+        Args:
+            dirty(set of int): The statements that must run
+            stale(set of str): The variables whose reaching values changed
+            assigned(list of dict): The values each statement assigned,
+            updated with the statements that run
+
+        Returns:
+            list of dict: assigned
+        """
+        self.recomputed = []
+        assigned.extend({} for _ in range(len(self.statements) - len(assigned)))
+        for index, statement in enumerate(self.statements):
+            if index not in dirty and not stale & self.reads[index]:
+                stale.difference_update(assigned[index])
+                continue
+            self.recomputed.append(index)
+            workspace = Workspace(self._reaching(index, assigned))
+            if self._compiled[index] is None:
+                self._compiled[index] = self._interp.compile(statement)
+            Interpreter(None, self._interp.engine, workspace=workspace).run(self._compiled[index])
+            values = {name: workspace[name] for name in self.writes[index] if name in workspace}
+            for name in assigned[index].keys() | values.keys():
+                old = assigned[index].get(name)
+                if name not in values or name not in assigned[index] or not same_value(values[name], old):
+                    stale.add(name)
+                else:
+                    stale.discard(name)
+            assigned[index] = values
+        return assigned
+
+    def _reaching(self, index, assigned):
+        """
+        Returns:
+            dict: The values of the variables a statement reads or assigns
+            that reach it. Arrays it may update in place are copied
+        """
+        scope = {}
+        for name in self.reads[index] | self.writes[index]:
+            for previous in range(index - 1, -1, -1):
+                if name in assigned[previous]:
+                    scope[name] = assigned[previous][name]
+                    break
+            else:
+                if name in self.inputs:
+                    scope[name] = self.inputs[name]
+            if name in self.writes[index] and isinstance(scope.get(name), ndarray):
+                scope[name] = scope[name].copy()
+        return scope
+
+    def _changes(self, before):
+        after = self.workspace()
+        return [name for name in after if name not in before or not same_value(after[name], before[name])] + \
+            [name for name in before if name not in after]
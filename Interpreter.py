@@ -14,32 +14,33 @@ Github:    https://github.com/jtrejo13
 # imports
 # -------
 
-from typing import IO, Dict
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import IO, Dict, Iterable, Sequence, Union
+import numpy
+from numpy import ndarray
 from Scanner import *
-from Parser import Parser
-
-
-class NodeVisitor(object):
+from Parser import Parser, Assign, BinaryOp, Compound, Index, Node, NodeVisitor, Temporary, UnaryOp, EXPRESSIONS, \
+    is_alias, operands_of
+from Operators import BINARY_OPERATORS, ELEMENTWISE_OPERATORS, UNARY_OPERATORS, get_index, make_matrix, \
+    make_range, set_index
+from Builtins import BUILTINS
+from Compiler import Compiler
+from Bytecode import BytecodeCompiler
+from Optimizer import Optimizer, variables_written
+from Cache import CachedParser, ScriptCache
+from Profiler import Profiler
+
+
+class Workspace(dict):
     """
-    Generic NodeVisitor class to redirect a specific Node
-    type in the Abstract Syntax Tree to its custom 'visit' method
+    The variables of a script, variable_name : value. Every Interpreter
+    evaluates in a workspace of its own, so interpreters running in
+    different threads never see each other's variables. Passing the same
+    workspace to several interpreters, one after the other, shares their
+    variables like a session
     """
 
-    def visit(self, node):
-        """
-        Generic NodeVisitor class to apply a 'visit' method based
-        on the Node type observed in the Abstract Syntax Tree
-        """
-        method_name = 'visit_' + type(node).__name__
-        visit_method = getattr(self, method_name, self.generic_visit)
-        return visit_method(node)
-
-    def generic_visit(self, node):
-        """
-        Falback method if node passed to visit does not have a custom visit method
-        """
-        raise Exception('No visit_{} method'.format(type(node).__name__))
-
 
 class Interpreter(NodeVisitor):
     """
@@ -50,25 +51,176 @@ class Interpreter(NodeVisitor):
     Args:
         parser(Parser): The parser constructed with the
         input to be interpreted
+        engine(str): 'tree' walks the AST with the visit methods below,
+        'closure' first compiles it into closures (see Compiler.py) and
+        'vm' into bytecode (see Bytecode.py). Compiling only pays off
+        when a script is run more than once
+        optimize(bool): Whether to rewrite the AST with the Optimizer
+        before evaluating it
+        workspace(Workspace): The variables the script reads and
+        updates (default: a new, empty one). The script indexes, rather
+        than calls, the ones named like built-in functions
+        profile(bool): Whether to record where the time goes (see
+        Profiler.py). Every statement is then compiled and run on its
+        own. Without it, the interpreter runs no profiling code at all
+        outputs(iterable of str): The only variables the caller needs.
+        The script is then optimized, and the assignments no output
+        depends on are skipped (see Optimizer.py)
 
     Attributes:
         parser(Parser): The parser constructed with the
         input to be interpreted
-        GLOBAL_SCOPE(dict key:str value:float or int) Scope of
-        variables in script
+        engine(str): The evaluation engine
+        optimizer(Optimizer): The optimizer applied to the AST, or None.
+        Its report accumulates over every statement interpreted
+        workspace(Workspace): The variables of the script
+        GLOBAL_SCOPE(Workspace): Another name of workspace
+        profiler(Profiler): The profile of every statement interpreted,
+        or None
+        temporaries(dict key:str value:float or int): The values of the
+        temporaries (see Optimizer.py), kept apart from the workspace
     """
 
-    GLOBAL_SCOPE = {}   # variable_name : value
+    ENGINES = ('tree', 'closure', 'vm')
 
-    def __init__(self, parser):
+    BINARY_OPERATORS = BINARY_OPERATORS
+    UNARY_OPERATORS = UNARY_OPERATORS
+
+    def __init__(self, parser, engine='tree', optimize=False, workspace=None, profile=False, outputs=None):
+        if engine not in self.ENGINES:
+            raise ValueError('Unknown engine {}'.format(repr(engine)))
         self.parser = parser
+        self.engine = engine
+        self.optimizer = Optimizer(outputs) if optimize or outputs is not None else None
+        self.workspace = workspace if workspace is not None else Workspace()
+        if workspace is not None and parser is not None and not isinstance(parser, CachedParser):
+            parser.variables.update(workspace)
+        self.profiler = Profiler() if profile else None
+        self.temporaries = {}  # type: Dict
+        if profile and engine == 'tree':
+            self.visit = self.profiler.profile_visit(self.visit)
+
+    @property
+    def GLOBAL_SCOPE(self):
+        """The workspace of the interpreter"""
+        return self.workspace
+
+    @GLOBAL_SCOPE.setter
+    def GLOBAL_SCOPE(self, scope):
+        self.workspace = scope
 
     def interpret(self):
         """Interprets the passed AST"""
+        if isinstance(self.parser, CachedParser):
+            optimize = self.optimizer is not None
+            outputs = self.optimizer.outputs if optimize else None
+            script = self.parser.script
+            self.check_outputs(script.tree())
+            tree, report, loops = script.optimized(optimize, outputs)
+            if self.profiler is None:
+                self.run(script.compiled(self.engine, optimize, self.compile, outputs))
+            else:
+                self.run_profiled(tree)
+            if optimize:
+                self.optimizer.report.update(report)
+                self.optimizer.loops.extend(loops)
+            return
         tree = self.parser.parse()
         if tree is None:
             return ''
-        self.visit(tree)
+        self.check_outputs(tree)
+        self.execute(tree)
+
+    def check_outputs(self, tree):
+        """
+        Checks the outputs before any of the script runs
+
+        Raises:
+            NameError: If an output is neither in the workspace nor
+            assigned by the script
+        """
+        outputs = self.optimizer.outputs if self.optimizer is not None else None
+        if outputs is None:
+            return
+        unknown = outputs.difference(self.workspace, *map(variables_written, tree.statements))
+        if unknown:
+            raise NameError('Outputs not assigned by the script: {}'.format(
+                ', '.join(repr(name) for name in sorted(unknown))))
+
+    def execute(self, node):
+        """Executes an AST (or a single statement) with the selected engine"""
+        if self.optimizer is not None:
+            node = self.optimizer.optimize(node)
+        if self.profiler is not None:
+            self.run_profiled(node)
+        else:
+            self.run(self.compile(node))
+
+    def compile(self, node):
+        """
+        Compiles an AST (or a single statement) for the selected engine
+
+        Returns:
+            The AST itself for the 'tree' engine, a CompiledScript for the
+            'closure' engine and a CodeObject for the 'vm' engine
+        """
+        if self.engine == 'closure':
+            return Compiler().compile(node)
+        if self.engine == 'vm':
+            return BytecodeCompiler().compile(node)
+        return node
+
+    def run(self, compiled):
+        """
+        Runs the output of compile in the workspace. Every engine keeps
+        the temporaries in temporaries, so that the statements compiled
+        and run one at a time by run_profiled share them
+        """
+        if self.engine == 'closure':
+            compiled(self.workspace, self.temporaries)
+        elif self.engine == 'vm':
+            compiled.run(self.workspace, self.temporaries)
+        else:
+            self.visit(compiled)
+
+    def run_profiled(self, node):
+        """Compiles and runs every statement of an AST on its own, timing each"""
+        statements = node.statements if isinstance(node, Compound) else [node]
+        for statement in statements:
+            if type(statement) is not Node:
+                compiled = self.compile(statement)
+                self.profiler.run_statement(statement, lambda: self.run(compiled))
+
+    def interpret_stream(self):
+        """
+        Interprets the input one statement at a time, executing each
+        statement as soon as the parser produces it
+
+        The statements of a CachedParser's script are compiled one at a
+        time, once, and kept in the cache like the whole script
+
+        Yields:
+            Node: Each statement right after it has been executed
+        """
+        if isinstance(self.parser, CachedParser):
+            optimize = self.optimizer is not None
+            outputs = self.optimizer.outputs if optimize else None
+            script = self.parser.script
+            self.check_outputs(script.tree())
+            _, report, loops = script.optimized(optimize, outputs)
+            if optimize:
+                self.optimizer.report.update(report)
+                self.optimizer.loops.extend(loops)
+            for statement, compiled in script.compiled(self.engine, optimize, self.compile, outputs, True):
+                if self.profiler is None:
+                    self.run(compiled)
+                else:
+                    self.profiler.run_statement(statement, lambda: self.run(compiled))
+                yield statement
+            return
+        for statement in self.parser.parse_statements():
+            self.execute(statement)
+            yield statement
 
     def visit_Compound(self, node):
         """Custom visitor method for Compound Node"""
@@ -78,10 +230,30 @@ class Interpreter(NodeVisitor):
     def visit_Assign(self, node):
         """
         Custom visitor method for Assign Node. Defines or updates an
-        identifier in GLOBAL_SCOPE when assignment node is encountered
+        identifier in the workspace when assignment node is encountered
         """
         var_name = node.left.token.value
-        self.GLOBAL_SCOPE[var_name] = self.visit(node.right)
+        value = self.visit(node.right)
+        if isinstance(node.left, Temporary):
+            self.temporaries[var_name] = value
+            return
+        if isinstance(node.left, Index):
+            indices = [self.visit(arg) for arg in node.left.args]
+            value = set_index(self.workspace.get(var_name), indices, value)
+        elif isinstance(value, ndarray) and is_alias(node.right):
+            value = value.copy()
+        self.workspace[var_name] = value
+
+    def visit_For(self, node):
+        """
+        Custom visitor method for For, While and Vectorized Nodes. Rather
+        than walking the body of the loop again on every iteration, the
+        loop is compiled into closures once (see Compiler.py) and run in
+        the workspace
+        """
+        Compiler().compile(node)(self.workspace)
+
+    visit_While = visit_Vectorized = visit_For
 
     def visit_Node(self, node):
         """Custom visitor method for Node"""
@@ -97,19 +269,7 @@ class Interpreter(NodeVisitor):
         Raises:
             Exception: If ill-conditioned AST
         """
-        token = node.token
-        if token.type == PLUS:
-            return self.visit(node.left) + self.visit(node.right)
-        if token.type == MINUS:
-            return self.visit(node.left) - self.visit(node.right)
-        if token.type == MUL:
-            return self.visit(node.left) * self.visit(node.right)
-        if token.type == DIV:
-            result = self.visit(node.left) / self.visit(node.right)
-            if result.is_integer():
-                return int(result)
-            return result
-        self.raise_error()
+        return self.evaluate_operators(node)
 
     def visit_UnaryOp(self, node):
         """
@@ -121,12 +281,112 @@ class Interpreter(NodeVisitor):
         Raises:
             Exception: If ill-conditioned AST
         """
-        token = node.token
-        if token.type == PLUS:
-            return self.visit(node.right)
-        if token.type == MINUS:
-            return -1 * self.visit(node.right)
-        self.raise_error()
+        return self.evaluate_operators(node)
+
+    def visit_Matrix(self, node):
+        """
+        Custom visitor method for Matrix, Colon, Call and Index Nodes
+
+        Returns:
+            The value of the expression
+        """
+        return self.evaluate_operators(node)
+
+    visit_Colon = visit_Call = visit_Index = visit_Matrix
+
+    def evaluate_operators(self, root):
+        """
+        Evaluates the expression under root in post-order, with an explicit
+        stack instead of a recursive visit per node, so that arbitrarily
+        deep expressions (like a chain of thousands of additions, or of
+        nested calls) do not exhaust Python's recursion limit. Operators
+        are applied here, and the other expression nodes by their apply
+        method once their operands are evaluated. Every other node, like a
+        Var or a Num, is visited
+
+        Returns:
+            The value of the expression
+
+        Raises:
+            Exception: If ill-conditioned AST
+        """
+        binary_operators = self.BINARY_OPERATORS
+        unary_operators = self.UNARY_OPERATORS
+        values = []
+        stack = [(root, None)]
+        while stack:
+            node, pending = stack.pop()
+            if pending is None:
+                if isinstance(node, BinaryOp):
+                    operator = binary_operators.get(node.token.type)
+                    if operator is None:
+                        self.raise_error()
+                    stack.append((node, operator))
+                    stack.append((node.right, None))
+                    stack.append((node.left, None))
+                elif isinstance(node, UnaryOp):
+                    operator = unary_operators.get(node.token.type)
+                    if operator is None:
+                        self.raise_error()
+                    stack.append((node, operator))
+                    stack.append((node.right, None))
+                elif isinstance(node, EXPRESSIONS):
+                    operands = operands_of(node)
+                    stack.append((node, len(operands)))
+                    stack.extend((operand, None) for operand in reversed(operands))
+                else:
+                    values.append(self.visit(node))
+            elif isinstance(node, BinaryOp):
+                right = values.pop()
+                values[-1] = pending(values[-1], right)
+            elif isinstance(node, UnaryOp):
+                values[-1] = pending(values[-1])
+            else:
+                first = len(values) - pending
+                operands = values[first:]
+                del values[first:]
+                values.append(getattr(self, 'apply_' + type(node).__name__)(node, operands))
+        return values[0]
+
+    def apply_Matrix(self, node, elements):
+        """
+        Returns:
+            numpy.ndarray: The value of a matrix literal, from the values of
+            its elements, row after row
+        """
+        rows = []
+        for row in node.rows:
+            rows.append(elements[:len(row)])
+            elements = elements[len(row):]
+        return make_matrix(rows)
+
+    def apply_Colon(self, node, bounds):
+        """
+        Returns:
+            Range: The value of a colon expression, from the values of its
+            bounds
+        """
+        if node.step is None:
+            return make_range(bounds[0], 1, bounds[1])
+        return make_range(*bounds)
+
+    def apply_Call(self, node, args):
+        """
+        Returns:
+            The result of the built-in function, called with the values of
+            the arguments
+        """
+        return node.function(*args)
+
+    def apply_Index(self, node, indices):
+        """
+        Returns:
+            The indexed elements of the variable
+
+        Raises:
+            NameError exception if the variable has not been declared
+        """
+        return get_index(self.visit_Var(node), indices)
 
     def visit_Var(self, node):
         """
@@ -138,15 +398,24 @@ class Interpreter(NodeVisitor):
         Raises:
             NameError exception if identifier reached has
             not been declared earlier in the tree (i.e is
-            not in GLOBAL_SCOPE)
+            not in the workspace)
         """
         var_name = node.token.value
-        value = self.GLOBAL_SCOPE.get(var_name)
+        value = self.workspace.get(var_name)
         if value is None:
             raise NameError(repr(var_name))
         else:
             return value
 
+    def visit_Temporary(self, node):
+        """
+        Custom visitor method for Temporary Node
+
+        Returns:
+            The value of the temporary
+        """
+        return self.temporaries[node.token.value]
+
     def visit_Num(self, node):
         """
         Custom visitor method for Num Node
@@ -166,27 +435,179 @@ class Interpreter(NodeVisitor):
         raise Exception('Error interpreting input')
 
 
+class BatchInterpreter(Interpreter):
+    """
+    Interpreter evaluating a script for many sets of inputs in a single
+    walk of its AST. Every input variable holds a column (a 1-D NumPy
+    array) of its values, one per set, and every operator and built-in
+    function is applied element-wise, so that each expression computes
+    its value for all the sets at once.
+
+    The script's own assignments to the input variables are the defaults
+    the columns override, and are skipped. Scripts with matrices, ranges,
+    indexing or loops cannot be evaluated this way. Sets of inputs for
+    which the script would raise, like dividing by zero, give inf or nan
+
+    Args:
+        parser(Parser): The parser constructed with the
+        input to be interpreted
+        columns(dict key:str value:numpy.ndarray): The column of values
+        of each input variable, all of the same length
+        optimize(bool): Whether to rewrite the AST with the Optimizer
+        before evaluating it
+
+    Attributes:
+        inputs(set of str): The input variables
+    """
+
+    BINARY_OPERATORS = ELEMENTWISE_OPERATORS  # *, / and ^ are the element-wise operators
+
+    def __init__(self, parser, columns, optimize=False):
+        super().__init__(parser, 'tree', optimize, Workspace(columns))
+        self.inputs = set(columns)
+
+    def execute(self, node):
+        """Executes an AST with every operator applied element-wise"""
+        with numpy.errstate(all='ignore'):
+            super().execute(node)
+
+    def visit_Assign(self, node):
+        """
+        Custom visitor method for Assign Node. Assignments to the input
+        variables are skipped
+        """
+        if isinstance(node.left, Index):
+            self.raise_unsupported('indexing')
+        if node.left.token.value not in self.inputs:
+            super().visit_Assign(node)
+
+    def apply_Call(self, node, args):
+        """
+        Returns:
+            The result of the built-in function
+
+        Raises:
+            Exception: If a function that is not element-wise, like sum,
+            is called on an input
+        """
+        if not BUILTINS[node.token.value].is_elementwise and any(isinstance(arg, ndarray) for arg in args):
+            self.raise_unsupported('{}() of an input'.format(node.token.value))
+        return node.function(*args)
+
+    def apply_Matrix(self, node, elements):
+        """Matrix literals are not supported"""
+        self.raise_unsupported('matrices')
+
+    def apply_Colon(self, node, bounds):
+        """Ranges are not supported"""
+        self.raise_unsupported('ranges')
+
+    def apply_Index(self, node, indices):
+        """Indexing is not supported"""
+        self.raise_unsupported('indexing')
+
+    def visit_For(self, node):
+        """Loops are not supported"""
+        self.raise_unsupported('loops')
+
+    visit_While = visit_Vectorized = visit_For
+
+    def raise_unsupported(self, feature):
+        """
+        Raises:
+            Exception: feature is not supported in batch evaluation
+        """
+        raise Exception('Batch evaluation does not support {}'.format(feature))
+
+
 # ------------
 # interp_read
 # ------------
 
-def interp_read(text: str):
+def interp_read(text: Union[str, Iterable[str]], cache: ScriptCache = None, variables: Iterable[str] = ()):
     """
-    text to evaluate
+    text to evaluate, its bytes (e.g. a file mapped by Scanner.map_file),
+    or a reader yielding it one line at a time
+    cache of parsed and compiled scripts to look text up in (see Cache.py).
+    Only used when text is a str
+    variables assigned before text runs, like the ones of the workspace it
+    runs in. Only used with a cache: an Interpreter seeds any other parser
+    with the variables of its workspace
     """
+    if cache is not None and isinstance(text, str):
+        return cache.parser(text, variables)
     return Parser(Scanner(text))
 # ------------
 # interp_eval
 # ------------
 
 
-def interp_eval(parser: Parser):
+def interp_eval(parser: Parser, engine: str = 'tree', optimize: bool = False, workspace: Workspace = None,
+                outputs: Iterable[str] = None):
     """
     parser to evaluate input
+    engine to evaluate it with (see Interpreter)
+    optimize whether to optimize the AST first (see Interpreter)
+    workspace to evaluate it in, updated in place (default: a new one)
+    outputs the only variables needed, the others may be left out of the
+    workspace (see Interpreter)
+    Returns the workspace
+    """
+    interp = Interpreter(parser, engine, optimize, workspace, outputs=outputs)
+    interp.interpret()
+    return interp.workspace
+
+# ----------------
+# interp_eval_many
+# ----------------
+
+
+def interp_eval_many(scripts: Iterable[str], engine: str = 'tree', optimize: bool = False, workers: int = None,
+                     cache: ScriptCache = None):
     """
-    interp = Interpreter(parser)
+    scripts to evaluate, independently of each other
+    engine to evaluate them with (see Interpreter)
+    optimize whether to optimize the ASTs first (see Interpreter)
+    workers number of threads evaluating scripts at once (default: as
+    many as ThreadPoolExecutor picks)
+    cache of parsed and compiled scripts shared by the threads (see Cache.py)
+
+    Evaluates every script in a workspace of its own, on a pool of threads.
+    Returns the workspaces, in the order of scripts. Raises the exception
+    of the first script that raised
+    """
+    def evaluate(text):
+        return interp_eval(interp_read(text, cache), engine, optimize)
+
+    with ThreadPoolExecutor(workers) as executor:
+        return list(executor.map(evaluate, scripts))
+
+# -----------------
+# interp_eval_batch
+# -----------------
+
+
+def interp_eval_batch(script: str, columns: Dict[str, Sequence[float]], optimize: bool = False):
+    """
+    script to evaluate, parsed once
+    columns of values of the input variables, one value per set of inputs
+    optimize whether to optimize the AST first (see Interpreter)
+
+    Evaluates script for every set of inputs at once (see BatchInterpreter).
+    Returns a columnar table: the column of values of every variable, in
+    the order they were assigned, the inputs first
+    """
+    arrays = {name: numpy.asarray(column, dtype=float) for name, column in columns.items()}
+    if any(array.ndim != 1 for array in arrays.values()):
+        raise ValueError('Batch inputs must be one-dimensional columns')
+    lengths = {len(array) for array in arrays.values()}
+    if len(lengths) != 1:
+        raise ValueError('Batch inputs must all have the same length')
+    length, = lengths
+
+    interp = BatchInterpreter(Parser(Scanner(script)), arrays, optimize)
     interp.interpret()
-    return interp.GLOBAL_SCOPE
+    return {name: numpy.broadcast_to(value, (length,)).copy() for name, value in interp.workspace.items()}
 
 # ------------
 # interp_print
@@ -208,15 +629,71 @@ def interp_print(writer: IO[str], result: Dict):
 # ------------
 
 
-def interp_solve(reader: IO[str], writer: IO[str]):
+def interp_solve(reader: IO[str], writer: IO[str], engine: str = 'tree', optimize: bool = False,
+                 cache: ScriptCache = None, profile: bool = False, outputs: Sequence[str] = None):
+    """
+    reader with input, or its bytes (e.g. a file mapped by Scanner.map_file)
+    writer for output
+    engine to evaluate it with (see Interpreter)
+    optimize whether to optimize the AST first (see Interpreter)
+    cache of parsed and compiled scripts (see Cache.py)
+    profile whether to record where the time goes (see Interpreter)
+    outputs the only variables printed, in this order, and computed (see
+    Interpreter). Default: all of them
+
+    Without a cache or outputs, the reader is consumed one line at a time
+    (bytes are scanned where they are) and every statement is executed as
+    soon as it is parsed, so the script is never held in memory. With a
+    cache, the whole script is read first, to look it up by its source
+    text, and with outputs, to know which assignments the outputs depend on.
+    Returns the Interpreter that ran the script. Raises NameError, before
+    running the script, if it assigns none of some outputs
+    """
+    if cache is not None or outputs is not None:
+        text = str(reader, 'utf-8') if isinstance(reader, BUFFER_TYPES) else ''.join(reader)
+        interp = Interpreter(interp_read(text, cache), engine, optimize, profile=profile, outputs=outputs)
+        interp.interpret()
+    else:
+        interp = Interpreter(interp_read(reader), engine, optimize, profile=profile)
+        for _ in interp.interpret_stream():
+            pass
+    if outputs is not None:
+        for name in outputs:
+            if name not in interp.workspace:
+                # assigned by a statement that did not run, like the body of a loop
+                raise NameError(repr(name))
+        interp_print(writer, OrderedDict((name, interp.workspace[name]) for name in outputs))
+    else:
+        interp_print(writer, interp.workspace)
+    return interp
+
+# -------------
+# interp_stream
+# -------------
+
+
+def interp_stream(reader: IO[str], writer: IO[str], engine: str = 'tree', optimize: bool = False,
+                  profile: bool = False, cache: ScriptCache = None):
     """
-    reader with input
+    reader with input, or its bytes (e.g. a file mapped by Scanner.map_file)
     writer for output
+    engine to evaluate it with (see Interpreter)
+    optimize whether to optimize the AST first (see Interpreter)
+    profile whether to record where the time goes (see Interpreter)
+    cache of parsed and compiled scripts (see Cache.py)
+
+    Like interp_solve, but writes each assignment to the writer as soon as
+    it is executed instead of printing the variables at the end. With a
+    cache, the whole script is read first, and its statements are then
+    run one at a time from the cache (see Interpreter.interpret_stream).
+    Returns the Interpreter that ran the script
     """
-    statements = []
-    for line in reader:
-        statements.append(line)
-    script = ''.join(statements)
-    parser = interp_read(script)
-    result = interp_eval(parser)
-    interp_print(writer, result)
+    if cache is not None:
+        reader = str(reader, 'utf-8') if isinstance(reader, BUFFER_TYPES) else ''.join(reader)
+    interp = Interpreter(interp_read(reader, cache), engine, optimize, profile=profile)
+    for statement in interp.interpret_stream():
+        if isinstance(statement, Assign) and not isinstance(statement.left, Temporary):
+            var_name = statement.left.token.value
+            writer.write(str(var_name) + '=' + str(interp.workspace[var_name]) + '\n')
+            writer.flush()
+    return interp
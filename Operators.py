@@ -0,0 +1,520 @@
+# pylint: disable = unused-wildcard-import
+
+"""
+Filename: Operators.py
+Description: Semantics of the MATLAB operators, shared by every
+             evaluation engine of the interpreter
+Author:    Juan Trejo
+Github:    https://github.com/jtrejo13
+"""
+
+# -------
+# imports
+# -------
+
+import math
+import operator
+from typing import Callable, Dict, List
+import numpy
+from numpy import ndarray
+from Scanner import *
+
+
+class Range(object):
+    """
+    The value of a colon expression (start:step:stop), a row vector that
+    is never stored element by element. Its length, elements, iteration
+    and reductions are computed from start, step and stop; it is only
+    converted to a NumPy array when used in matrix arithmetic
+
+    Args:
+        start(int or float): The first element
+        step(int or float): The difference between consecutive elements
+        stop(int or float): The bound of the last element
+
+    Attributes:
+        start(int or float): The first element
+        step(int or float): The difference between consecutive elements
+        stop(int or float): The bound of the last element
+    """
+
+    __slots__ = ('start', 'step', 'stop', '_length')
+
+    def __init__(self, start, step, stop):
+        self.start = start
+        self.step = step
+        self.stop = stop
+        if step == 0 or (stop - start) / step < 0:
+            self._length = 0
+        elif isinstance(start, int) and isinstance(step, int) and isinstance(stop, int):
+            self._length = (stop - start) // step + 1
+        else:
+            # tolerate the rounding error of a stop reached by a float step
+            self._length = math.floor((stop - start) / step + 1e-10) + 1
+
+    def __len__(self):
+        return self._length
+
+    def __getitem__(self, index):
+        if not -self._length <= index < self._length:
+            raise IndexError('Index exceeds the number of array elements')
+        if index < 0:
+            index += self._length
+        return self.start + index * self.step
+
+    def __iter__(self):
+        start = self.start
+        step = self.step
+        for index in range(self._length):
+            yield start + index * step
+
+    def sum(self):
+        """
+        Returns:
+            int or float: The sum of the elements
+        """
+        count = self._length
+        if isinstance(self.start, int) and isinstance(self.step, int):
+            return count * self.start + self.step * (count * (count - 1) // 2)
+        return count * self.start + self.step * (count * (count - 1) / 2)
+
+    def min(self):
+        """
+        Returns:
+            int or float: The smallest element (the range must not be empty)
+        """
+        return self[0] if self.step > 0 else self[-1]
+
+    def max(self):
+        """
+        Returns:
+            int or float: The largest element (the range must not be empty)
+        """
+        return self[-1] if self.step > 0 else self[0]
+
+    def array(self):
+        """
+        Returns:
+            numpy.ndarray: The elements, as a 1-by-n matrix
+        """
+        return (self.start + self.step * numpy.arange(self._length, dtype=float)).reshape(1, -1)
+
+    def __array__(self, dtype=None, copy=None):
+        array = self.array()
+        return array if dtype is None else array.astype(dtype)
+
+    def __add__(self, other):
+        return self.array() + other
+
+    def __radd__(self, other):
+        return other + self.array()
+
+    def __sub__(self, other):
+        return self.array() - other
+
+    def __rsub__(self, other):
+        return other - self.array()
+
+    def __mul__(self, other):
+        return self.array() * other
+
+    def __rmul__(self, other):
+        return other * self.array()
+
+    def __truediv__(self, other):
+        return self.array() / other
+
+    def __rtruediv__(self, other):
+        return other / self.array()
+
+    def __pow__(self, other):
+        return self.array() ** other
+
+    def __rpow__(self, other):
+        return other ** self.array()
+
+    def __str__(self):
+        # formatted as NumPy formats the array, which is summarized past the
+        # print threshold: then only the elements shown are computed, and a
+        # placeholder stands for the ones left out
+        options = numpy.get_printoptions()
+        edges = options['edgeitems']
+        if self._length <= max(options['threshold'], 2 * edges):
+            return str(self.array())
+        indices = list(range(edges + 1)) + list(range(self._length - edges, self._length))
+        shown = numpy.array([[float(self[index]) for index in indices]])
+        return numpy.array2string(shown, threshold=2 * edges, edgeitems=edges)
+
+    def __repr__(self):
+        return 'Range({}, {}, {})'.format(self.start, self.step, self.stop)
+
+
+def make_range(start, step, stop):
+    """
+    Builds the value of a colon expression. Bounds that are 1-by-1
+    matrices are taken as numbers
+
+    Raises:
+        ValueError: If a bound is a matrix with more than one element
+    """
+    bounds = []
+    for bound in (start, step, stop):
+        bound = as_array(bound)
+        if isinstance(bound, ndarray):
+            if bound.size != 1:
+                raise ValueError('Colon operands must be scalars')
+            bound = bound.item()
+        bounds.append(bound)
+    return Range(*bounds)
+
+
+def as_array(value):
+    """
+    Returns:
+        The value, with a Range converted to a NumPy array
+    """
+    if isinstance(value, Range):
+        return value.array()
+    return value
+
+
+def make_matrix(rows: List[List]):
+    """
+    Builds the value of a matrix literal. Matrices are two-dimensional
+    arrays of float64, as in MATLAB, so that matrix products run in BLAS.
+    Elements that are matrices themselves are concatenated, as in [A, B]
+
+    Args:
+        rows(list of list): The values of the elements of each row
+
+    Raises:
+        ValueError: If the rows do not have matching dimensions
+    """
+    if not rows:
+        return numpy.zeros((0, 0))
+    try:
+        return numpy.array(numpy.block(rows), dtype=float, ndmin=2)
+    except ValueError:
+        raise ValueError('Dimensions of matrices being concatenated are not consistent')
+
+
+def multiply(left, right):
+    """
+    Multiplies two values. The product of two matrices is the matrix
+    product, and a product with a scalar (or a 1-by-1 matrix) is element-wise
+    """
+    if isinstance(left, (ndarray, Range)) and isinstance(right, (ndarray, Range)):
+        left = as_array(left)
+        right = as_array(right)
+        if left.size != 1 and right.size != 1:
+            return numpy.dot(left, right)
+    return left * right
+
+
+def divide(left, right):
+    """
+    Divides two values. Whole results of dividing numbers are normalized
+    to int, so that 6 / 2 evaluates to 3 rather than 3.0. Dividing by a
+    scalar is element-wise, and A / B of two matrices solves X * B = A
+    (by least squares if B is not square)
+    """
+    if isinstance(right, (ndarray, Range)):
+        left = as_array(left)
+        right = as_array(right)
+        if isinstance(left, ndarray) and right.size != 1:
+            if right.shape[0] == right.shape[1]:
+                return numpy.linalg.solve(right.T, left.T).T
+            return numpy.linalg.lstsq(right.T, left.T, rcond=None)[0].T
+        return left / right
+    result = left / right
+    if isinstance(result, ndarray) or not result.is_integer():
+        return result
+    return int(result)
+
+
+def divide_elements(left, right):
+    """
+    Divides two values element-wise. Numbers are divided like divide does
+    """
+    if isinstance(left, (ndarray, Range)) or isinstance(right, (ndarray, Range)):
+        return numpy.true_divide(left, right)
+    return divide(left, right)
+
+
+def matrix_power(left, right):
+    """
+    Raises a value to a power. A square matrix can be raised to an integer
+    power, which is the repeated matrix product; numbers and 1-by-1
+    matrices are raised like .^ does
+
+    Raises:
+        ValueError: If the matrix is not square, or the power is not
+        an integer
+    """
+    left = as_array(left)
+    right = as_array(right)
+    if isinstance(left, ndarray) and left.size != 1:
+        if isinstance(right, ndarray):
+            if right.size != 1:
+                raise ValueError('Matrix powers of a matrix are not supported')
+            right = right.item()
+        if int(right) != right:
+            raise ValueError('Matrix powers must be integers')
+        return numpy.linalg.matrix_power(left, int(right))
+    if isinstance(right, ndarray) and right.size != 1:
+        raise ValueError('Powers of a number to a matrix are not supported')
+    return left ** right
+
+
+def comparison(function: Callable):
+    """
+    Wraps a Python comparison into a relational operator. Comparing
+    numbers gives 1 or 0, and comparing matrices gives a matrix of them
+    """
+    def compare(left, right):
+        result = function(as_array(left), as_array(right))
+        if isinstance(result, ndarray):
+            return result.astype(float)
+        return int(result)
+    compare.__name__ = function.__name__
+    return compare
+
+
+def is_true(value):
+    """
+    Returns:
+        bool: Whether a value is true as a loop condition: a nonzero
+        number, or a nonempty matrix with no zero elements
+    """
+    if isinstance(value, (ndarray, Range)):
+        value = as_array(value)
+        return value.size > 0 and bool(value.all())
+    return value != 0
+
+
+def columns(value):
+    """
+    Returns:
+        iterable: The values a for loop takes when iterating over value.
+        A number is iterated once, a row vector (or Range) yields its
+        elements and a matrix yields its columns, as column vectors
+    """
+    if isinstance(value, Range):
+        return value
+    if isinstance(value, ndarray):
+        if value.shape[0] == 1:
+            return value[0].tolist()
+        return [value[:, [column]] for column in range(value.shape[1])]
+    return (value,)
+
+
+def positions(index):
+    """
+    Converts a MATLAB index, which counts from 1, into positions that
+    count from 0
+
+    Returns:
+        int or numpy.ndarray: The position of a number, or the positions
+        of the elements of a matrix (or Range)
+
+    Raises:
+        IndexError: If an element of the index is not a positive integer
+    """
+    if isinstance(index, (ndarray, Range)):
+        index = as_array(index).ravel()
+        if index.size and (index.min() < 1 or (index != numpy.floor(index)).any()):
+            raise IndexError('Array indices must be positive integers')
+        return index.astype(numpy.intp) - 1
+    if index < 1 or index != int(index):
+        raise IndexError('Array indices must be positive integers')
+    return int(index) - 1
+
+
+def get_index(value, indices: List):
+    """
+    Evaluates an indexing expression, like x(i) or A(i, j). One index
+    counts the elements in column order; two index the rows and columns.
+    A vector indexed by a vector keeps its orientation
+
+    Args:
+        value: The value of the indexed variable
+        indices(list): The values of the indices
+
+    Returns:
+        The element, as a number, or a matrix of the elements
+
+    Raises:
+        IndexError: If an index is not a positive integer, or is out of bounds
+    """
+    if not any(isinstance(index, (ndarray, Range)) for index in indices):
+        if isinstance(value, Range) and len(indices) == 1:
+            return value[positions(indices[0])]
+        if not isinstance(value, (ndarray, Range)) and all(positions(index) == 0 for index in indices):
+            return value
+    array = as_array(value)
+    if not isinstance(array, ndarray):
+        array = numpy.array([[array]], dtype=float)
+    rows = array.shape[0]
+
+    if len(indices) == 1:
+        index = positions(indices[0])
+        if isinstance(index, int):
+            if index >= array.size:
+                raise IndexError('Index exceeds the number of array elements')
+            return array[index % rows, index // rows].item()
+        if index.size and index.max() >= array.size:
+            raise IndexError('Index exceeds the number of array elements')
+        elements = array[index % rows, index // rows]
+        if rows == 1:
+            return elements.reshape(1, -1)
+        if array.shape[1] == 1:
+            return elements.reshape(-1, 1)
+        return elements.reshape(numpy.shape(as_array(indices[0])) or (1, -1))
+
+    if len(indices) == 2:
+        row, column = positions(indices[0]), positions(indices[1])
+        if numpy.max(row, initial=-1) >= rows or numpy.max(column, initial=-1) >= array.shape[1]:
+            raise IndexError('Index exceeds matrix dimensions')
+        if isinstance(row, int) and isinstance(column, int):
+            return array[row, column].item()
+        return array[numpy.ix_(numpy.atleast_1d(row), numpy.atleast_1d(column))]
+    raise IndexError('Only one or two indices are supported')
+
+
+def grow(array, size: int):
+    """
+    Grows a vector to size elements, padded with zeros. The vector grown
+    is a view of a larger array, with room for as many elements again, so
+    that assigning one element past the end of a vector in a loop takes
+    amortized constant time
+
+    Returns:
+        numpy.ndarray: A row vector, or a column vector if array is one
+
+    Raises:
+        IndexError: If array is a matrix
+    """
+    row = array.shape[0] <= 1
+    if not row and array.shape[1] != 1:
+        raise IndexError('Attempt to grow array along ambiguous dimension')
+    base = array.base
+    if (isinstance(base, ndarray) and base.ndim == 2 and base.size >= size
+            and base.shape[not row] == 1 and base.ctypes.data == array.ctypes.data):
+        return base[:, :size] if row else base[:size, :]
+    capacity = max(size, 2 * array.size)
+    grown = numpy.zeros((1, capacity) if row else (capacity, 1))
+    grown.ravel()[:array.size] = array.ravel()
+    return grown[:, :size] if row else grown[:size, :]
+
+
+def set_index(value, indices: List, element):
+    """
+    Evaluates an indexed assignment, like x(i) = v or A(i, j) = v. The
+    matrix grows (padded with zeros) to hold indices out of its bounds;
+    a number, a Range or a missing variable is first turned into a matrix.
+    A matrix is updated in place, so it must not be shared with another
+    variable
+
+    Args:
+        value: The value of the indexed variable, or None if it has none
+        indices(list): The values of the indices
+        element: The value assigned, a number or a matrix with one element
+        per position indexed
+
+    Returns:
+        numpy.ndarray: The updated matrix
+
+    Raises:
+        IndexError: If an index is not a positive integer, or a matrix
+        cannot grow to hold it
+        ValueError: If element does not have one value per position
+    """
+    if value is None:
+        array = numpy.zeros((0, 0))
+    elif isinstance(value, ndarray):
+        array = value
+    else:
+        array = numpy.array(as_array(value), dtype=float, ndmin=2)
+    element = as_array(element)
+
+    if len(indices) == 1:
+        index = positions(indices[0])
+        count = 1 if isinstance(index, int) else index.size
+        needed = numpy.max(index, initial=-1) + 1
+        if needed > array.size:
+            array = grow(array, needed)
+        rows = array.shape[0]
+        target = (index % rows, index // rows)
+    elif len(indices) == 2:
+        row, column = positions(indices[0]), positions(indices[1])
+        count = numpy.size(row) * numpy.size(column)
+        shape = (max(array.shape[0], numpy.max(row, initial=-1) + 1),
+                 max(array.shape[1], numpy.max(column, initial=-1) + 1))
+        if shape != array.shape:
+            grown = numpy.zeros(shape)
+            grown[:array.shape[0], :array.shape[1]] = array
+            array = grown
+        if isinstance(row, int) and isinstance(column, int):
+            target = (row, column)
+        else:
+            target = numpy.ix_(numpy.atleast_1d(row), numpy.atleast_1d(column))
+    else:
+        raise IndexError('Only one or two indices are supported')
+
+    if isinstance(element, ndarray):
+        if element.size == 1:
+            element = element.item()
+        elif element.size != count:
+            raise ValueError('Unable to perform assignment because the left and right sides '
+                             'have a different number of elements')
+        else:
+            element = element.ravel(order='F').reshape(numpy.shape(array[target]))
+    array[target] = element
+    return array
+
+
+def negate(operand):
+    """Unary minus"""
+    return -1 * operand
+
+
+def identity(operand):
+    """Unary plus"""
+    return operand
+
+
+"""
+Operator Tables
+
+Map the type of an operator token to the function implementing it.
+The element-wise operators use the Python operators on numbers, which
+call the NumPy ufuncs (with broadcasting) on matrices. In
+ELEMENTWISE_OPERATORS, *, / and ^ are element-wise too
+"""
+BINARY_OPERATORS = {
+    PLUS: operator.add,
+    MINUS: operator.sub,
+    MUL: multiply,
+    DIV: divide,
+    POW: matrix_power,
+    DOTMUL: operator.mul,
+    DOTDIV: divide_elements,
+    DOTPOW: operator.pow,
+    LT: comparison(operator.lt),
+    LE: comparison(operator.le),
+    GT: comparison(operator.gt),
+    GE: comparison(operator.ge),
+    EQ: comparison(operator.eq),
+    NE: comparison(operator.ne),
+}  # type: Dict[str, Callable]
+
+ELEMENTWISE_OPERATORS = dict(BINARY_OPERATORS, **{
+    MUL: operator.mul,
+    DIV: divide_elements,
+    POW: operator.pow,
+})  # type: Dict[str, Callable]
+
+UNARY_OPERATORS = {
+    PLUS: identity,
+    MINUS: negate,
+}  # type: Dict[str, Callable]
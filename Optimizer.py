@@ -0,0 +1,533 @@
+# pylint: disable = unused-wildcard-import
+# pylint: disable = invalid-name
+
+"""
+Filename: Optimizer.py
+Description: Rewrites an Abstract Syntax Tree into an equivalent one
+             that is cheaper to evaluate
+Author:    Juan Trejo
+Github:    https://github.com/jtrejo13
+"""
+
+# -------
+# imports
+# -------
+
+import math
+from collections import Counter
+from typing import AbstractSet, Dict, List, Set, Tuple
+import numpy
+from Scanner import *
+from Parser import NodeVisitor, Assign, BinaryOp, Call, Colon, Compound, For, Index, Matrix, Num, Temporary, UnaryOp, \
+    Var, EXPRESSIONS, TEMPORARY, get_expr, operands_of
+from Operators import BINARY_OPERATORS, UNARY_OPERATORS
+from Vectorizer import vectorize
+
+
+def count_nodes(tree):
+    """
+    Returns:
+        int: The number of nodes in an AST
+    """
+    count = 0
+    stack = [tree]
+    while stack:
+        node = stack.pop()
+        count += 1
+        stack.extend(children(node))
+    return count
+
+
+def children(node):
+    """
+    Returns:
+        list of Node: The child nodes of a node
+    """
+    nodes = list(getattr(node, 'statements', ()))
+    for row in getattr(node, 'rows', ()):
+        nodes.extend(row)
+    nodes.extend(getattr(node, 'args', ()))
+    if getattr(node, 'body', None) is not None:
+        nodes.append(node.body)
+    if isinstance(node, Colon):
+        nodes.extend(bound for bound in (node.start, node.step, node.stop) if bound is not None)
+    if node.left is not None:
+        nodes.append(node.left)
+    if node.right is not None:
+        nodes.append(node.right)
+    return nodes
+
+
+def variables_read(statement):
+    """
+    Returns:
+        set of str: The variables a statement reads. An indexed assignment,
+        like x(i) = 1, reads the array it updates, and a loop reads every
+        variable its range and its body read
+    """
+    names = set()  # type: Set[str]
+    stack = [statement]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, Assign):
+            if isinstance(node.left, Index):
+                names.add(node.left.token.value)
+                stack.extend(node.left.args)
+            stack.append(node.right)
+            continue
+        if isinstance(node, For):
+            stack.extend((node.right, node.body))
+            continue
+        if isinstance(node, (Var, Index)):
+            names.add(node.token.value)
+        stack.extend(children(node))
+    return names
+
+
+def variables_written(statement):
+    """
+    Returns:
+        set of str: The variables a statement may assign, including the
+        variables of loops
+    """
+    if isinstance(statement, Assign):
+        return {statement.left.token.value}
+    names = set()  # type: Set[str]
+    stack = [statement]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, (Assign, For)):
+            names.add(node.left.token.value)
+        stack.extend(children(node))
+    return names
+
+
+def live_statements(statements, outputs=None):
+    """
+    Liveness analysis of a list of statements, run backwards from the end
+    of the script, where the outputs are live. An assignment is dead when
+    the variable it assigns is not live after it: it is assigned again
+    before being read, and is not an output. So is a for loop that only
+    assigns dead variables. Loop bodies are not analyzed on their own; a
+    loop reads every variable its body reads and, since it may run no
+    iteration at all, does not kill any. While loops are always kept.
+
+    Without outputs, every variable the script assigns is needed, in the
+    order it was first assigned: the first statement assigning a variable
+    is always kept, so that the workspace lists the variables in the same
+    order as when no statement is eliminated
+
+    Args:
+        statements(list of Node): The top-level statements of a script
+        outputs(set of str): The variables needed after the script
+        (default: every variable it assigns)
+
+    Returns:
+        list of bool: Whether each statement is live
+    """
+    first = set()  # type: Set[int]
+    if outputs is None:
+        outputs = set()
+        for index, statement in enumerate(statements):
+            written = variables_written(statement)
+            if not written <= outputs:
+                first.add(index)
+                outputs |= written
+    live = set(outputs)
+    alive = [True] * len(statements)
+    for index in range(len(statements) - 1, -1, -1):
+        statement = statements[index]
+        if isinstance(statement, Assign):
+            name = statement.left.token.value
+            if name not in live and index not in first:
+                alive[index] = False
+                continue
+            if not isinstance(statement.left, Index):
+                live.discard(name)
+        elif isinstance(statement, For) and not variables_written(statement) & live and index not in first:
+            alive[index] = False
+            continue
+        live |= variables_read(statement)
+    return alive
+
+
+def expression_slots(node):
+    """
+    Returns:
+        list of tuple: The (parent, attribute name) or (list, index) of
+        every child of an expression node, from left to right
+    """
+    if isinstance(node, BinaryOp):
+        return [(node, 'left'), (node, 'right')]
+    if isinstance(node, UnaryOp):
+        return [(node, 'right')]
+    if isinstance(node, (Call, Index)):
+        return [(node.args, index) for index in range(len(node.args))]
+    if isinstance(node, Matrix):
+        return [(row, index) for row in node.rows for index in range(len(row))]
+    if isinstance(node, Colon):
+        return [(node, name) for name in ('start', 'step', 'stop') if getattr(node, name) is not None]
+    return []
+
+
+def get_slot(slot):
+    """
+    Returns:
+        Node: The node in a slot (see expression_slots)
+    """
+    parent, key = slot
+    return getattr(parent, key) if isinstance(key, str) else parent[key]
+
+
+def set_slot(slot, node):
+    """Puts a node in a slot (see expression_slots)"""
+    parent, key = slot
+    if isinstance(key, str):
+        setattr(parent, key, node)
+    else:
+        parent[key] = node
+
+
+def common_subexpressions(statements):
+    """
+    Common subexpression elimination over a list of statements. Every
+    subexpression of the right-hand side of an assignment is numbered by
+    its structure: the same operators and functions, applied to the same
+    constants and to the same variables, assigned by the same statement.
+    A variable assigned again, by an assignment or a loop, is a new
+    variable from then on, so a subexpression reading it is not the same
+    after it. The operators, calls and indexing that would be evaluated
+    more than once are evaluated once instead, into a Temporary assigned
+    right before the first statement using it. Occurrences inside
+    another common subexpression are evaluated by it, so they do not
+    count. Loops are left as they are
+
+    Args:
+        statements(list of Node): The top-level statements of a script
+
+    Returns:
+        tuple: The statements, with the assignments of the temporaries,
+        and the number of evaluations eliminated
+    """
+    numbers = {}  # type: Dict[Tuple, int]
+    node_numbers = {}  # type: Dict[int, int]
+    counts = Counter()
+    versions = Counter()
+    for statement in statements:
+        if isinstance(statement, Assign):
+            # the operands of every node are numbered before it
+            nodes = [statement.right]
+            for node in nodes:
+                nodes.extend(operands_of(node))
+            for node in reversed(nodes):
+                operands = tuple(node_numbers[id(operand)] for operand in operands_of(node))
+                if isinstance(node, Num):
+                    key = (Num, node.token.type, node.token.value)
+                elif isinstance(node, (Var, Index)):
+                    name = node.token.value
+                    key = (type(node), name, versions[name]) + operands
+                elif isinstance(node, Matrix):
+                    key = (Matrix, tuple(len(row) for row in node.rows)) + operands
+                elif isinstance(node, (BinaryOp, UnaryOp, Call)):
+                    key = (type(node), node.token.type, node.token.value) + operands
+                elif isinstance(node, Colon):
+                    key = (Colon, node.step is None) + operands
+                else:
+                    key = (node,)
+                number = node_numbers[id(node)] = numbers.setdefault(key, len(numbers))
+                if isinstance(node, (BinaryOp, UnaryOp, Call, Index)):
+                    counts[number] += 1
+        versions.update(variables_written(statement))
+
+    temporaries = {}  # type: Dict[int, str]
+    eliminated = 0
+    result = []  # type: List
+    for statement in statements:
+        if isinstance(statement, Assign):
+            definitions = []
+            stack = [(statement, 'right')]
+            while stack:
+                slot = stack.pop()
+                node = get_slot(slot)
+                number = node_numbers[id(node)]
+                if number in temporaries:
+                    set_slot(slot, Temporary(Token(ID, temporaries[number])))
+                    continue
+                repeats = counts[number] - 1
+                if repeats > 0:
+                    name = temporaries[number] = '{}{}'.format(TEMPORARY, len(temporaries) + 1)
+                    eliminated += repeats
+                    # the other occurrences are not evaluated, nor anything inside them
+                    inside = operands_of(node)
+                    for operand in inside:
+                        counts[node_numbers[id(operand)]] -= repeats
+                        inside.extend(operands_of(operand))
+                    definitions.append(Assign(Temporary(Token(ID, name)), Token(ASSIGN, '='), node))
+                    set_slot(slot, Temporary(Token(ID, name)))
+                stack.extend(reversed(expression_slots(node)))
+            # a temporary is used by the ones of the subexpressions containing it
+            result.extend(reversed(definitions))
+        result.append(statement)
+    return result, eliminated
+
+
+def make_num(value):
+    """
+    Returns:
+        Num: A Num node holding value
+    """
+    if isinstance(value, int):
+        return Num(Token(INTEGER, value))
+    return Num(Token(FLOAT, value))
+
+
+class Optimizer(NodeVisitor):
+    """
+    Optimizer of an Abstract Syntax Tree representing a script in the
+    MATLAB language. The following rewrites are applied bottom-up:
+
+        constant folding:  BinaryOp and UnaryOp nodes whose operands are
+                           all Num nodes are replaced by a Num node
+                           holding their value. 4/3 becomes 1.3333333333333333,
+                           6/2 becomes 3 (the same DIV normalization as
+                           the interpreter). Operations that raise, like
+                           1/0, or whose result is not a real number,
+                           like (-8)^(1/3), are left for the interpreter
+        constant calls:    Call nodes whose arguments are all Num nodes, like
+                           sqrt(2), are replaced by a Num node holding their
+                           value, when it is a finite real number
+        unary chains:      +x becomes x and -(-x) becomes x
+        identities:        x*1, 1*x, x+0, 0+x and x-0 become x. Only the
+                           integer constants are considered, since x+0.0
+                           would turn an int x into a float
+        vectorization:     for loops whose iterations are independent
+                           element-wise computations, like
+                           for i = 1:n; y(i) = a * x(i) + b; end, become
+                           Vectorized nodes (see Vectorizer.py)
+
+    Before the rewrites, the dead stores of a script are eliminated (see
+    live_statements): the assignments to a variable that is assigned again
+    before being read, like the second one of x = 1; x = 2; x = 3 (the
+    first one places x in the workspace), and with outputs,
+    the assignments whose values no output depends on. Their expressions
+    are not evaluated at all, so a dead assignment that would have raised,
+    like one reading an undefined variable, no longer does. Single
+    statements, like the ones of a script run as it is parsed, are never
+    eliminated, since the statements after them are not known yet.
+
+    After the rewrites, the subexpressions a script evaluates more than
+    once, like PI*r in a = PI*r + 1; b = PI*r * 2, are evaluated once into
+    temporaries (see common_subexpressions), which no engine leaves in the
+    workspace
+
+    Args:
+        outputs(iterable of str): The variables the caller needs after the
+        script (default: every variable it assigns). The variables no
+        output depends on are then left unassigned, or keep the values of
+        earlier assignments
+
+    Attributes:
+        outputs(frozenset of str): The variables needed after the script,
+        or None for all of them
+        report(Counter): How many times each rewrite was applied, and the
+        number of nodes eliminated in total
+        loops(list of str): One line per for loop optimized, saying whether
+        it was vectorized, or why not
+    """
+
+    def __init__(self, outputs=None):
+        self.outputs = frozenset(outputs) if outputs is not None else None  # type: AbstractSet[str]
+        self.report = Counter()
+        self.loops = []  # type: List[str]
+
+    def optimize(self, tree):
+        """
+        Optimizes an AST
+
+        Args:
+            tree(Node): The root of the AST, or a single statement
+
+        Returns:
+            Node: The optimized AST
+        """
+        before = count_nodes(tree)
+        if isinstance(tree, Compound):
+            alive = live_statements(tree.statements, self.outputs)
+            tree.statements = [statement for statement, live in zip(tree.statements, alive) if live]
+            self.report['dead stores eliminated'] += alive.count(False)
+        tree = self.visit(tree)
+        if isinstance(tree, Compound):
+            tree.statements, eliminated = common_subexpressions(tree.statements)
+            self.report['subexpression evaluations eliminated'] += eliminated
+        self.report['nodes eliminated'] += before - count_nodes(tree)
+        return tree
+
+    def generic_visit(self, node):
+        """Nodes without a custom visit method are left unchanged"""
+        return node
+
+    def visit_Compound(self, node):
+        """Custom visitor method for Compound Node"""
+        node.statements = [self.visit(statement) for statement in node.statements]
+        return node
+
+    def visit_For(self, node):
+        """Custom visitor method for For Node"""
+        node.right = self.visit(node.right)
+        node.body = self.visit(node.body)
+        vectorized, reason = vectorize(node)
+        header = 'for {}={}'.format(get_expr(node.left), get_expr(node.right))
+        if vectorized is None:
+            self.loops.append('{}: not vectorized, {}'.format(header, reason))
+            return node
+        self.report['loops vectorized'] += 1
+        self.loops.append('{}: vectorized'.format(header))
+        return vectorized
+
+    def visit_While(self, node):
+        """Custom visitor method for While Node"""
+        node.left = self.visit(node.left)
+        node.body = self.visit(node.body)
+        return node
+
+    def visit_Assign(self, node):
+        """Custom visitor method for Assign Node"""
+        node.right = self.visit(node.right)
+        if isinstance(node.left, Index):
+            node.left = self.visit(node.left)
+        return node
+
+    def visit_BinaryOp(self, node):
+        """
+        Custom visitor method for BinaryOp, UnaryOp, Call, Index, Matrix
+        and Colon Nodes. The expression under node is rewritten in
+        post-order, with an explicit stack instead of a recursive visit
+        per node, so that arbitrarily deep expressions do not exhaust
+        Python's recursion limit. Every other node is visited
+        """
+        results = []
+        stack = [(node, False)]
+        while stack:
+            node, operands_visited = stack.pop()
+            if not isinstance(node, EXPRESSIONS):
+                results.append(self.visit(node))
+                continue
+            slots = expression_slots(node)
+            if not operands_visited:
+                stack.append((node, True))
+                stack.extend((get_slot(slot), False) for slot in reversed(slots))
+                continue
+            first = len(results) - len(slots)
+            for slot, operand in zip(slots, results[first:]):
+                set_slot(slot, operand)
+            del results[first:]
+            results.append(self.fold(node))
+        return results[0]
+
+    visit_UnaryOp = visit_Call = visit_Index = visit_Matrix = visit_Colon = visit_BinaryOp
+
+    def fold(self, node):
+        """
+        Returns:
+            Node: An expression node whose operands are already rewritten,
+            folded into a constant or one of its operands if possible
+        """
+        if isinstance(node, BinaryOp):
+            return self.fold_binary(node)
+        if isinstance(node, UnaryOp):
+            return self.fold_unary(node)
+        if isinstance(node, Call):
+            return self.fold_call(node)
+        return node
+
+    def fold_call(self, node):
+        """
+        Returns:
+            Node: A Call whose arguments are already rewritten, folded into
+            a constant if they all are constants
+        """
+        args = node.args
+        if all(isinstance(arg, Num) for arg in args):
+            with numpy.errstate(all='ignore'):
+                value = node.function(*[arg.token.value for arg in args])
+            if isinstance(value, (int, float)) and math.isfinite(value):
+                self.report['constants folded'] += 1
+                return make_num(value)
+        return node
+
+    def fold_binary(self, node):
+        """
+        Returns:
+            Node: A BinaryOp whose operands are already rewritten, folded
+            into a constant or one of its operands if possible
+        """
+        left = node.left
+        right = node.right
+        op_type = node.token.type
+
+        if isinstance(left, Num) and isinstance(right, Num):
+            operator = BINARY_OPERATORS.get(op_type)
+            if operator is not None:
+                try:
+                    value = operator(left.token.value, right.token.value)
+                except ArithmeticError:
+                    return node
+                if not isinstance(value, (int, float)):
+                    return node
+                self.report['constants folded'] += 1
+                return make_num(value)
+
+        if op_type == MUL:
+            if self._is_integer(right, 1):
+                return self._identity(left)
+            if self._is_integer(left, 1):
+                return self._identity(right)
+        elif op_type == PLUS:
+            if self._is_integer(right, 0):
+                return self._identity(left)
+            if self._is_integer(left, 0):
+                return self._identity(right)
+        elif op_type == MINUS:
+            if self._is_integer(right, 0):
+                return self._identity(left)
+        return node
+
+    def fold_unary(self, node):
+        """
+        Returns:
+            Node: A UnaryOp whose operand is already rewritten, folded into
+            a constant or its operand if possible
+        """
+        operand = node.right
+        op_type = node.token.type
+
+        if op_type == PLUS:
+            self.report['unary operators removed'] += 1
+            return operand
+        if op_type == MINUS:
+            if isinstance(operand, Num):
+                self.report['constants folded'] += 1
+                return make_num(UNARY_OPERATORS[MINUS](operand.token.value))
+            if isinstance(operand, UnaryOp) and operand.token.type == MINUS:
+                self.report['unary operators removed'] += 2
+                return operand.right
+        return node
+
+    @staticmethod
+    def _is_integer(node, value):
+        return isinstance(node, Num) and node.token.type == INTEGER and node.token.value == value
+
+    def _identity(self, node):
+        self.report['identities applied'] += 1
+        return node
+
+
+def format_report(report, loops=()):
+    """
+    Returns:
+        str: One 'rewrite: count' line per entry of an optimizer report,
+        followed by the lines of the loops optimized
+    """
+    lines = ['{}: {}\n'.format(key, report[key]) for key in sorted(report)]
+    lines.extend(loop + '\n' for loop in loops)
+    return ''.join(lines)
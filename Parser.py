@@ -13,16 +13,23 @@ Github:    https://github.com/jtrejo13
 # imports
 # -------
 
+from typing import List
 from Scanner import *
+from Builtins import BUILTINS
 
 
 class Node(object):
-    """Base class representing a binary tree node"""
+    """
+    Base class representing a binary tree node. Nodes are built with
+    __slots__, so each sub-class only stores the attributes it declares;
+    the ones it does not declare read as None
+    """
 
-    def __init__(self):
-        self.left = None
-        self.token = None
-        self.right = None
+    __slots__ = ()
+
+    left = None
+    token = None
+    right = None
 
 
 class Compound(Node):
@@ -35,8 +42,9 @@ class Compound(Node):
         statements(list of Node): The statements included in the MATLAB script
     """
 
+    __slots__ = ('statements',)
+
     def __init__(self):
-        Node.__init__(self)
         self.statements = []
 
 
@@ -51,8 +59,9 @@ class BinaryOp(Node):
     token(Token): A binary operator token.
     """
 
+    __slots__ = ('left', 'token', 'right')
+
     def __init__(self, left, operator, right):
-        Node.__init__(self)
         self.left = left
         self.token = operator
         self.right = right
@@ -68,8 +77,9 @@ class UnaryOp(Node):
     token(Token): A unary operator token
     """
 
+    __slots__ = ('token', 'right')
+
     def __init__(self, operator, right):
-        Node.__init__(self)
         self.right = right
         self.token = operator
 
@@ -80,18 +90,56 @@ class Assign(Node):
     a MATLAB Abstract Syntax Tree. Examples: x = 2, myVar = 2 * 3 + 5
 
     Attributes:
-    left(Var): The child Var on the left
+    left(Var or Index): The assigned variable, or the indexed elements
+    of the variable assigned, as in x(i) = 2
     right(Node): The child Node on the right
     token(Token): An assignment token
     """
 
+    __slots__ = ('left', 'token', 'right')
+
     def __init__(self, left, op, right):
-        Node.__init__(self)
         self.left = left
         self.token = op
         self.right = right
 
 
+class For(Node):
+    """
+    Node sub-class to represent a 'for loop' in a MATLAB
+    Abstract Syntax Tree. Example: for i = 1:10; x = x + i; end
+
+    Attributes:
+    left(Var): The loop variable
+    right(Node): The expression whose columns the loop iterates over
+    body(Compound): The statements of the loop
+    """
+
+    __slots__ = ('left', 'right', 'body')
+
+    def __init__(self, left, right, body):
+        self.left = left
+        self.right = right
+        self.body = body
+
+
+class While(Node):
+    """
+    Node sub-class to represent a 'while loop' in a MATLAB
+    Abstract Syntax Tree. Example: while x > 1; x = x / 2; end
+
+    Attributes:
+    left(Node): The condition of the loop
+    body(Compound): The statements of the loop
+    """
+
+    __slots__ = ('left', 'body')
+
+    def __init__(self, left, body):
+        self.left = left
+        self.body = body
+
+
 class Var(Node):
     """
     Node sub-class to represent a 'variable' or 'identifier'
@@ -101,8 +149,9 @@ class Var(Node):
     token(Token): An ID token
     """
 
+    __slots__ = ('token',)
+
     def __init__(self, token):
-        Node.__init__(self)
         self.token = token
 
 
@@ -115,11 +164,266 @@ class Num(Node):
     token(Token): A FLOAT or INTEGER token
     """
 
+    __slots__ = ('token',)
+
     def __init__(self, token):
-        Node.__init__(self)
         self.token = token
 
 
+class Matrix(Node):
+    """
+    Node sub-class to represent a 'matrix literal' in a MATLAB
+    Abstract Syntax Tree. Examples: [1, 2, 3], [a, 2 * b; 3, 4]
+
+    Attributes:
+    rows(list of list of Node): The elements of each row of the matrix
+    """
+
+    __slots__ = ('rows',)
+
+    def __init__(self, rows):
+        self.rows = rows
+
+
+class Colon(Node):
+    """
+    Node sub-class to represent a 'colon expression' in a MATLAB
+    Abstract Syntax Tree. Examples: 1:10, 0:0.5:x
+
+    Attributes:
+    start(Node): The first element of the range
+    step(Node): The step of the range, or None for a step of 1
+    stop(Node): The bound of the last element of the range
+    """
+
+    __slots__ = ('start', 'step', 'stop')
+
+    def __init__(self, start, step, stop):
+        self.start = start
+        self.step = step
+        self.stop = stop
+
+
+class Call(Node):
+    """
+    Node sub-class to represent a 'function call' in a MATLAB
+    Abstract Syntax Tree. Examples: cos(x), mod(a, 2)
+
+    Attributes:
+    token(Token): The ID token naming the function
+    function(callable): The built-in function, resolved when the node
+    is created (see Builtins.py)
+    args(list of Node): The arguments of the call
+    """
+
+    __slots__ = ('token', 'function', 'args')
+
+    def __init__(self, token, args):
+        self.token = token
+        self.function = BUILTINS[token.value].function
+        self.args = args
+
+    def __reduce__(self):
+        # pickled by name, and resolved again when unpickled
+        return Call, (self.token, self.args)
+
+
+class Index(Node):
+    """
+    Node sub-class to represent an 'indexing expression' in a MATLAB
+    Abstract Syntax Tree, or the elements assigned by an indexed
+    assignment. Indices count from 1. Examples: x(i), A(2, j + 1)
+
+    Attributes:
+    token(Token): The ID token naming the indexed variable
+    args(list of Node): The indices
+    """
+
+    __slots__ = ('token', 'args')
+
+    def __init__(self, token, args):
+        self.token = token
+        self.args = args
+
+
+class Vectorized(Node):
+    """
+    Node sub-class to represent a for loop that the Optimizer rewrote
+    into array expressions (see Vectorizer.py). It is never produced by
+    the parser. Example: for i = 1:n; y(i) = 2 * x(i); end runs as
+    y(1:n) = 2 .* x(1:n)
+
+    Attributes:
+    left(Var): The loop variable
+    right(Colon): The values of the loop variable
+    body(Compound): Indexed assignments computing every iteration of
+    the loop at once, with LoopRange nodes for the values of the loop
+    variable
+    loop(For): The original loop, run instead when the array expressions
+    fail on the values they are given
+    scalars(list of Node): The operands of the array expressions that do
+    not depend on the loop variable. The array expressions only compute
+    what the loop does if they are numbers
+    """
+
+    __slots__ = ('left', 'right', 'body', 'loop', 'scalars')
+
+    def __init__(self, left, right, body, loop, scalars):
+        self.left = left
+        self.right = right
+        self.body = body
+        self.loop = loop
+        self.scalars = scalars
+
+
+class LoopRange(Node):
+    """
+    Node sub-class to represent all the values of the loop variable of
+    a Vectorized node, as a Range. They are computed once per run of the
+    node
+    """
+
+    __slots__ = ()
+
+
+"""
+Temporaries
+
+The Optimizer stores the value of a common subexpression in a temporary
+variable, whose name starts with TEMPORARY, so it never is the name of
+a variable of the script. Temporaries are not left in any workspace
+"""
+TEMPORARY = '$'
+
+
+class Temporary(Var):
+    """
+    Var sub-class to represent a temporary variable holding the value of
+    a common subexpression (see Optimizer.py). It is never produced by
+    the parser. Example: y = a*b + 1; z = a*b runs as
+    $1 = a*b; y = $1 + 1; z = $1
+    """
+
+    __slots__ = ()
+
+
+"""
+Expression Nodes
+
+The nodes of an expression that have operands, like a BinaryOp or a
+Call, as opposed to its leaves, like a Var or a Num. The passes over
+expressions walk them with an explicit stack, operands first, so that
+arbitrarily deep expressions do not exhaust Python's recursion limit
+"""
+EXPRESSIONS = (BinaryOp, UnaryOp, Call, Index, Matrix, Colon)
+
+
+def operands_of(node):
+    """
+    Returns:
+        list of Node: The children of an expression node, from left to right
+    """
+    if isinstance(node, BinaryOp):
+        return [node.left, node.right]
+    if isinstance(node, UnaryOp):
+        return [node.right]
+    if isinstance(node, (Call, Index)):
+        return list(node.args)
+    if isinstance(node, Matrix):
+        return [element for row in node.rows for element in row]
+    if isinstance(node, Colon):
+        return [bound for bound in (node.start, node.step, node.stop) if bound is not None]
+    return []
+
+
+def is_alias(node):
+    """
+    Returns:
+        bool: Whether an expression evaluates to the value of a variable
+        itself (x, or +x) rather than to a new value. Assigning a matrix
+        that way copies it, so that an indexed assignment to one variable
+        does not change the other
+    """
+    while isinstance(node, UnaryOp) and node.token.type == PLUS:
+        node = node.right
+    return isinstance(node, Var)
+
+
+class NodeVisitor(object):
+    """
+    Generic NodeVisitor class to redirect a specific Node
+    type in the Abstract Syntax Tree to its custom 'visit' method
+    """
+
+    def visit(self, node):
+        """
+        Generic NodeVisitor class to apply a 'visit' method based
+        on the Node type observed in the Abstract Syntax Tree
+        """
+        method_name = 'visit_' + type(node).__name__
+        visit_method = getattr(self, method_name, self.generic_visit)
+        return visit_method(node)
+
+    def generic_visit(self, node):
+        """
+        Falback method if node passed to visit does not have a custom visit method
+        """
+        raise Exception('No visit_{} method'.format(type(node).__name__))
+
+
+"""
+Operator Precedence
+
+How tightly each binary operator binds. The COLON of a range binds looser
+than any arithmetic operator, unary operators bind tighter than MUL and
+looser than POW, except in the exponent of a power (2^-3), where they
+only apply to the primary that follows them
+"""
+PRECEDENCE = {
+    LT: 1, LE: 1, GT: 1, GE: 1, EQ: 1, NE: 1,
+    PLUS: 3, MINUS: 3,
+    MUL: 4, DIV: 4, DOTMUL: 4, DOTDIV: 4,
+    POW: 6, DOTPOW: 6,
+}
+COLON_PRECEDENCE = 2
+UNARY_PRECEDENCE = 5
+POWER_UNARY_PRECEDENCE = 7
+
+ARGUMENTS = 'ARGUMENTS'
+
+
+class ExpressionFrame(object):
+    """
+    An open bracket of an expression being parsed by Parser.expr
+
+    Args:
+        kind(str): None for the expression itself, LPAREN for a
+        parenthesized expression, ARGUMENTS for the arguments of a call or
+        an index, LBRACKET for a matrix
+        token(Token): The ID of a call or an index
+
+    Attributes:
+        kind(str): The kind of bracket
+        token(Token): The ID of a call or an index
+        operators(list of tuple): The precedence, node type and token of
+        each operator of the frame not applied yet
+        items(list of Node): The arguments parsed so far
+        rows(list of list of Node): The rows of a matrix parsed so far
+        row(list of Node): The elements of the current row, or None
+        before its first element
+    """
+
+    __slots__ = ('kind', 'token', 'operators', 'items', 'rows', 'row')
+
+    def __init__(self, kind, token=None):
+        self.kind = kind
+        self.token = token
+        self.operators = []  # type: List[tuple]
+        self.items = []  # type: List[Node]
+        self.rows = []  # type: List[List[Node]]
+        self.row = None
+
+
 class Parser(object):
     """
     A class to parse a series of tokens representing the MATLAB language
@@ -130,11 +434,15 @@ class Parser(object):
     Attributes:
         scanner(Scanner): A scanner object constructed with the text input to be parsed
         current_token(Token): The current token being analyzed by the parser
+        variables(set of str): The variables assigned so far. An ID followed
+        by LPAREN is a function call if it names a built-in function that
+        is not one of them, and an indexing expression otherwise
     """
 
     def __init__(self, scanner):
         self.scanner = scanner
         self.current_token = scanner.next_token()
+        self.variables = set()
 
     def parse(self):
         """
@@ -152,6 +460,23 @@ class Parser(object):
 
         return node
 
+    def parse_statements(self):
+        """
+        Parses the text input passed via the scanner one statement at a
+        time. Each statement is yielded as soon as its terminating SEMI or
+        NEWLINE is seen, before any of the input after it is scanned
+
+        Yields:
+            Node: The AST of the next statement in the input
+
+        Raises:
+            Exception: If invalid syntax is encountered
+        """
+        for node in self.statements():
+            yield node
+        if self.current_token.type != EOF:
+            self.raise_error()
+
     def script(self):
         nodes = self.statement_list()
 
@@ -162,83 +487,260 @@ class Parser(object):
         return root
 
     def statement_list(self):
-        node = self.statement()
+        return list(self.statements())
 
-        statements = [node]
+    def statements(self):
+        """Lazily parses a statement_list, yielding one statement at a time"""
+        while self.current_token.type == NEWLINE:
+            self.eat(NEWLINE)
 
-        while self.current_token.type == SEMI:
-            self.eat(SEMI)
-            statements.append(self.statement())
+        yield self.statement()
 
-        if self.current_token.type == ID:
-            self.raise_error()
+        while self.current_token.type in (SEMI, COMMA, NEWLINE):
+            if self.current_token.type != NEWLINE:
+                self.eat(self.current_token.type)
+            while self.current_token.type == NEWLINE:
+                self.eat(NEWLINE)
+            yield self.statement()
 
-        return statements
+        if self.current_token.type in (ID, FOR, WHILE):
+            self.raise_error()
 
     def statement(self):
         if self.current_token.type == ID:
             node = self.assignment_statement()
+        elif self.current_token.type == FOR:
+            node = self.for_statement()
+        elif self.current_token.type == WHILE:
+            node = self.while_statement()
         else:
             node = Node()  # empty node
         return node
 
+    def for_statement(self):
+        """
+        for_statement : FOR variable ASSIGN expr statement_list END
+        """
+        self.eat(FOR)
+        variable = self.variable()
+        self.variables.add(variable.token.value)
+        self.eat(ASSIGN)
+        values = self.expr()
+        body = self.loop_body()
+        return For(variable, values, body)
+
+    def while_statement(self):
+        """
+        while_statement : WHILE expr statement_list END
+        """
+        self.eat(WHILE)
+        condition = self.expr()
+        body = self.loop_body()
+        return While(condition, body)
+
+    def loop_body(self):
+        body = self.script()
+        self.eat(END)
+        return body
+
     def assignment_statement(self):
+        """
+        assignment_statement : ID arguments? ASSIGN expr
+        """
         variable = self.variable()
+        if self.current_token.type == LPAREN:
+            variable = Index(variable.token, self.arguments())
         token = self.current_token
         self.eat(ASSIGN)
         expr = self.expr()
+        self.variables.add(variable.token.value)
         node = Assign(variable, token, expr)
         return node
 
     def expr(self):
-        node = self.term()
-
-        while self.current_token.type == PLUS or \
-                self.current_token.type == MINUS:
-            token = self.current_token
-            if token.type == PLUS:
-                self.eat(PLUS)
-            elif token.type == MINUS:
-                self.eat(MINUS)
-            node = BinaryOp(node, token, self.term())
-        return node
-
-    def term(self):
-        node = self.factor()
+        """
+        expr     : range_expr ((LT | LE | GT | GE | EQ | NE) range_expr)*
+        range_expr : additive (COLON additive (COLON additive)?)?
+        additive : term ((PLUS | MINUS) term)*
+        term     : factor ((MUL | DIV | DOTMUL | DOTDIV) factor)*
+        factor   : (PLUS | MINUS) factor | power
+        power    : primary ((POW | DOTPOW) power_operand)*
+        power_operand : (PLUS | MINUS) power_operand | primary
+        primary  : INTEGER | FLOAT | LPAREN expr RPAREN | ID arguments?
+                 | matrix
+
+        The colon binds looser than any arithmetic operator, so 1:n+1
+        is 1:(n+1). Powers bind tighter than unary operators (-2^2 is -4)
+        and are left-associative (2^3^2 is 64), as in MATLAB.
+
+        The grammar is parsed by operator precedence, with explicit stacks
+        of operands, pending operators and open brackets (see
+        ExpressionFrame) instead of a recursive call per rule, so that
+        arbitrarily deep parentheses and long chains of operators are
+        parsed in linear time without exhausting Python's recursion limit
+        """
+        operands = []  # type: List[Node]
+        frames = [ExpressionFrame(None)]
+        expect_operand = True
+        power_operand = False
 
-        while self.current_token.type == MUL or \
-                self.current_token.type == DIV:
+        while True:
+            frame = frames[-1]
             token = self.current_token
-            if self.current_token.type == MUL:
-                self.eat(MUL)
-            elif self.current_token.type == DIV:
-                self.eat(DIV)
-            node = BinaryOp(node, token, self.factor())
-        return node
+            token_type = token.type
+
+            if expect_operand:
+                if token_type in (INTEGER, FLOAT):
+                    self.eat(token_type)
+                    operands.append(Num(token))
+                    expect_operand = False
+                elif token_type == ID:
+                    node = self.variable()
+                    if self.current_token.type != LPAREN:
+                        operands.append(node)
+                        expect_operand = False
+                        continue
+                    self.eat(LPAREN)
+                    if self.current_token.type == RPAREN:
+                        self.eat(RPAREN)
+                        operands.append(self.call_or_index(token, []))
+                        expect_operand = False
+                    else:
+                        frames.append(ExpressionFrame(ARGUMENTS, token))
+                        power_operand = False
+                elif token_type == LPAREN:
+                    self.eat(LPAREN)
+                    frames.append(ExpressionFrame(LPAREN))
+                    power_operand = False
+                elif token_type == LBRACKET:
+                    self.eat(LBRACKET)
+                    frames.append(ExpressionFrame(LBRACKET))
+                    power_operand = False
+                elif token_type in (PLUS, MINUS):
+                    self.eat(token_type)
+                    precedence = POWER_UNARY_PRECEDENCE if power_operand else UNARY_PRECEDENCE
+                    frame.operators.append((precedence, UnaryOp, token))
+                elif frame.kind == LBRACKET and frame.row is None and not frame.operators and \
+                        token_type in (SEMI, NEWLINE):
+                    self.eat(token_type)
+                elif frame.kind == LBRACKET and frame.row is None and not frame.operators and \
+                        token_type == RBRACKET:
+                    self.eat(RBRACKET)
+                    frames.pop()
+                    operands.append(Matrix(frame.rows))
+                    expect_operand = False
+                else:
+                    self.raise_error()
+                continue
+
+            precedence = PRECEDENCE.get(token_type)
+            if precedence is not None:
+                self.reduce(frame, operands, precedence)
+                self.eat(token_type)
+                frame.operators.append((precedence, BinaryOp, token))
+                expect_operand = True
+                power_operand = token_type in (POW, DOTPOW)
+                continue
+            power_operand = False
+
+            if token_type == COLON:
+                self.reduce(frame, operands, COLON_PRECEDENCE + 1)
+                self.eat(COLON)
+                if frame.operators and frame.operators[-1][1] is Colon:
+                    if frame.operators[-1][2] == 3:
+                        self.raise_error()
+                    frame.operators[-1] = (COLON_PRECEDENCE, Colon, 3)
+                else:
+                    frame.operators.append((COLON_PRECEDENCE, Colon, 2))
+                expect_operand = True
+            elif frame.kind is None:
+                self.reduce(frame, operands, 0)
+                return operands.pop()
+            elif frame.kind == LPAREN and token_type == RPAREN:
+                self.reduce(frame, operands, 0)
+                self.eat(RPAREN)
+                frames.pop()
+            elif frame.kind == ARGUMENTS and token_type in (COMMA, RPAREN):
+                self.reduce(frame, operands, 0)
+                self.eat(token_type)
+                frame.items.append(operands.pop())
+                if token_type == RPAREN:
+                    frames.pop()
+                    operands.append(self.call_or_index(frame.token, frame.items))
+                else:
+                    expect_operand = True
+            elif frame.kind == LBRACKET and token_type in (COMMA, SEMI, NEWLINE, RBRACKET):
+                self.reduce(frame, operands, 0)
+                self.eat(token_type)
+                if frame.row is None:
+                    frame.row = []
+                frame.row.append(operands.pop())
+                if token_type == COMMA:
+                    expect_operand = True
+                    continue
+                frame.rows.append(frame.row)
+                frame.row = None
+                if token_type == RBRACKET:
+                    frames.pop()
+                    operands.append(Matrix(frame.rows))
+                else:
+                    expect_operand = True
+            else:
+                self.raise_error()
+
+    @staticmethod
+    def reduce(frame, operands, precedence):
+        """
+        Applies the pending operators of a frame that bind at least as
+        tightly as precedence to the operands on top of the operand stack.
+        All binary operators are left-associative
+        """
+        operators = frame.operators
+        while operators and operators[-1][0] >= precedence:
+            _, node_type, token = operators.pop()
+            if node_type is BinaryOp:
+                right = operands.pop()
+                operands[-1] = BinaryOp(operands[-1], token, right)
+            elif node_type is UnaryOp:
+                operands[-1] = UnaryOp(token, operands[-1])
+            elif token == 2:  # the token of a Colon is its number of operands
+                stop = operands.pop()
+                operands[-1] = Colon(operands[-1], None, stop)
+            else:
+                stop = operands.pop()
+                step = operands.pop()
+                operands[-1] = Colon(operands[-1], step, stop)
+
+    def call_or_index(self, token, args):
+        """
+        Returns:
+            Call or Index: A call of the built-in function token names,
+            unless it names a variable, and an indexing expression otherwise
 
-    def factor(self):
-        token = self.current_token
-        if token.type == PLUS:
-            self.eat(PLUS)
-            return UnaryOp(token, self.factor())
-        elif token.type == MINUS:
-            self.eat(MINUS)
-            return UnaryOp(token, self.factor())
-        elif token.type == INTEGER:
-            self.eat(INTEGER)
-            return Num(token)
-        elif token.type == FLOAT:
-            self.eat(FLOAT)
-            return Num(token)
-        elif token.type == LPAREN:
-            self.eat(LPAREN)
-            node = self.expr()
-            self.eat(RPAREN)
-            return node
-        elif token.type == ID:
-            node = self.variable()
-            return node
-        self.raise_error()
+        Raises:
+            Exception: If the built-in function does not take that number
+            of arguments
+        """
+        if token.value in BUILTINS and token.value not in self.variables:
+            builtin = BUILTINS[token.value]
+            if not builtin.nargs <= len(args) <= builtin.max_nargs:
+                self.raise_error()
+            return Call(token, args)
+        return Index(token, args)
+
+    def arguments(self):
+        """
+        arguments : LPAREN (expr (COMMA expr)*)? RPAREN
+        """
+        self.eat(LPAREN)
+        args = []
+        if self.current_token.type != RPAREN:
+            args.append(self.expr())
+            while self.current_token.type == COMMA:
+                self.eat(COMMA)
+                args.append(self.expr())
+        self.eat(RPAREN)
+        return args
 
     def variable(self):
         node = Var(self.current_token)
@@ -289,16 +791,72 @@ def get_expr(tree):
         expression == 'x=2+5'
     """
     elems = []
-    print_expr_recurs(tree, elems)
-    return ''.join(str(item) for item in elems)
+    stack = [tree]
+    while stack:
+        item = stack.pop()
+        if isinstance(item, str):
+            elems.append(item)
+        else:
+            stack.extend(reversed(expr_items(item)))
+    return ''.join(elems)
+
 
+def expr_items(tree):
+    """
+    Helper function for get_expr. The text of a node is built from an
+    explicit stack rather than recursively, so arbitrarily deep
+    expressions can be printed
 
-def print_expr_recurs(tree, output):
-    """Helper recursive function for print_expr"""
+    Returns:
+        list: The strings and child nodes the text of a node is made of,
+        in order
+    """
+    items = []
+    if isinstance(tree, Matrix):
+        items.append('[')
+        for i, row in enumerate(tree.rows):
+            if i:
+                items.append(';')
+            for j, element in enumerate(row):
+                if j:
+                    items.append(',')
+                items.append(element)
+        items.append(']')
+        return items
+    if isinstance(tree, Vectorized):
+        return [tree.loop]
+    if isinstance(tree, (Call, Index)):
+        items.append(tree.token.value + '(')
+        for i, arg in enumerate(tree.args):
+            if i:
+                items.append(',')
+            items.append(arg)
+        items.append(')')
+        return items
+    if isinstance(tree, (For, While)):
+        items.append('for ' if isinstance(tree, For) else 'while ')
+        items.append(tree.left)
+        if isinstance(tree, For):
+            items.append('=')
+            items.append(tree.right)
+        for statement in tree.body.statements:
+            if type(statement) is not Node:
+                items.append(';')
+                items.append(statement)
+        items.append(';end')
+        return items
+    if isinstance(tree, Colon):
+        for i, bound in enumerate((tree.start, tree.step, tree.stop)):
+            if bound is not None:
+                if i:
+                    items.append(':')
+                items.append(bound)
+        return items
     if tree.left:
-        print_expr_recurs(tree.left, output)
+        items.append(tree.left)
     if tree.right:
-        output.append(tree.token.value)
-        print_expr_recurs(tree.right, output)
+        items.append(str(tree.token.value))
+        items.append(tree.right)
     if not tree.left and not tree.right:
-        output.append(tree.token.value)
+        items.append(str(tree.token.value))
+    return items
@@ -0,0 +1,152 @@
+"""
+Filename: Profiler.py
+Description: Records where the time of a script goes: per node type,
+             per statement and per variable
+Author:    Juan Trejo
+Github:    https://github.com/jtrejo13
+"""
+
+# -------
+# imports
+# -------
+
+from collections import OrderedDict
+from timeit import default_timer
+from typing import Dict, List
+from Parser import Assign, Temporary, Var, get_expr
+
+
+class Profiler(object):
+    """
+    Profile of the scripts run by an Interpreter. Statements are timed
+    with every engine. Node types are only timed with the 'tree' engine,
+    the others run compiled code without visiting nodes; the loops the
+    'tree' engine compiles (see Interpreter.visit_For) count as a single
+    node, and so do the operators, calls, indexing, matrix literals and
+    ranges of an expression, which it evaluates together (see
+    Interpreter.evaluate_operators). Times are cumulative: the time of a
+    node includes the time of its children
+
+    Attributes:
+        nodes(dict key:str value:list): The calls and seconds of each node type
+        statements(list of list): The label, calls and seconds of each
+        statement, in the order they first ran
+        variables(dict key:str value:list): The reads, writes and seconds
+        of each variable. A variable is written by the assignments to it,
+        whose seconds it is charged. The temporaries of the optimizer are
+        not variables
+    """
+
+    def __init__(self):
+        self.nodes = {}  # type: Dict[str, List]
+        self.statements = []  # type: List[List]
+        self.variables = {}  # type: Dict[str, List]
+        self._statement_index = {}  # type: Dict[int, List]
+
+    def profile_visit(self, visit):
+        """
+        Returns:
+            callable: A visit method that records every node it visits,
+            wrapping the visit method of an Interpreter
+        """
+        nodes = self.nodes
+
+        def profiled_visit(node):
+            start = default_timer()
+            try:
+                return visit(node)
+            finally:
+                seconds = default_timer() - start
+                name = type(node).__name__
+                entry = nodes.get(name)
+                if entry is None:
+                    entry = nodes[name] = [0, 0.0]
+                entry[0] += 1
+                entry[1] += seconds
+                if isinstance(node, Var) and not isinstance(node, Temporary):
+                    self.variable(node.token.value)[0] += 1
+        return profiled_visit
+
+    def run_statement(self, statement, run):
+        """
+        Runs a statement, timing it
+
+        Args:
+            statement(Node): The statement, which labels its entry
+            run(callable): Runs the statement
+        """
+        entry = self._statement_index.get(id(statement))
+        if entry is None:
+            label = '#{} {}'.format(len(self.statements) + 1, get_expr(statement))
+            # the entry keeps the statement, so that its id is not reused
+            entry = self._statement_index[id(statement)] = [label, 0, 0.0, statement]
+            self.statements.append(entry)
+        start = default_timer()
+        try:
+            run()
+        finally:
+            seconds = default_timer() - start
+            entry[1] += 1
+            entry[2] += seconds
+            if isinstance(statement, Assign) and not isinstance(statement.left, Temporary):
+                variable = self.variable(statement.left.token.value)
+                variable[1] += 1
+                variable[2] += seconds
+
+    def variable(self, name):
+        """
+        Returns:
+            list: The reads, writes and seconds of a variable
+        """
+        entry = self.variables.get(name)
+        if entry is None:
+            entry = self.variables[name] = [0, 0, 0.0]
+        return entry
+
+    def to_json(self, limit=None):
+        """
+        Args:
+            limit(int): The number of entries kept of each table, the
+            hottest first (default: all)
+
+        Returns:
+            dict: The node types, statements and variables, each sorted by
+            seconds, the hottest first
+        """
+        nodes = sorted(self.nodes.items(), key=lambda item: -item[1][1])[:limit]
+        statements = sorted(self.statements, key=lambda entry: -entry[2])[:limit]
+        variables = sorted(self.variables.items(), key=lambda item: (-item[1][2], -item[1][0]))[:limit]
+        return OrderedDict((
+            ('nodes', [{'type': name, 'calls': calls, 'seconds': seconds} for name, (calls, seconds) in nodes]),
+            ('statements', [{'statement': label, 'calls': calls, 'seconds': seconds}
+                            for label, calls, seconds, _ in statements]),
+            ('variables', [{'variable': name, 'reads': reads, 'writes': writes, 'seconds': seconds}
+                           for name, (reads, writes, seconds) in variables]),
+        ))
+
+    def report(self, limit=10):
+        """
+        Returns:
+            str: A table of the hottest statements, node types and variables
+        """
+        profile = self.to_json(limit)
+        lines = ['{:>10} {:>8}  statement'.format('seconds', 'calls')]
+        lines.extend('{:>10.6f} {:>8}  {}'.format(entry['seconds'], entry['calls'], shorten(entry['statement']))
+                     for entry in profile['statements'])
+        if profile['nodes']:
+            lines.append('{:>10} {:>8}  node'.format('seconds', 'calls'))
+            lines.extend('{:>10.6f} {:>8}  {}'.format(entry['seconds'], entry['calls'], entry['type'])
+                         for entry in profile['nodes'])
+        lines.append('{:>10} {:>8} {:>8}  variable'.format('seconds', 'reads', 'writes'))
+        lines.extend('{:>10.6f} {:>8} {:>8}  {}'.format(entry['seconds'], entry['reads'], entry['writes'],
+                                                        entry['variable'])
+                     for entry in profile['variables'])
+        return ''.join(line + '\n' for line in lines)
+
+
+def shorten(text, width=60):
+    """
+    Returns:
+        str: text, cut to width characters
+    """
+    return text if len(text) <= width else text[:width - 3] + '...'
@@ -9,12 +9,108 @@ Github:    https://github.com/jtrejo13
 # imports
 # -------
 
-from sys import stdin, stdout
-from Interpreter import interp_solve
+import json
+from argparse import ArgumentParser
+from sys import stdin, stdout, stderr
+import Bytecode
+from BatchRunner import run_batch
+from Cache import ScriptCache
+from Scanner import map_file
+from Optimizer import format_report
+from Interpreter import Interpreter, interp_solve, interp_stream, interp_print
 
 # ----
 # main
 # ----
 
 if __name__ == "__main__":
-    interp_solve(stdin, stdout)
+    arg_parser = ArgumentParser(description='Evaluates a MATLAB script read from stdin, '
+                                'or a script compiled to a .mc file')
+    arg_parser.add_argument('compiled', nargs='?', metavar='SCRIPT.mc',
+                            help='run a compiled script instead of reading stdin')
+    arg_parser.add_argument('--compile', metavar='OUT.mc',
+                            help='compile the script to OUT.mc instead of running it')
+    arg_parser.add_argument('--script', metavar='PATH',
+                            help='read the script from the file PATH instead of stdin, '
+                            'scanning it in place through a memory map')
+    printed = arg_parser.add_mutually_exclusive_group()
+    printed.add_argument('--stream', action='store_true',
+                         help='print every assignment as soon as it is executed')
+    arg_parser.add_argument('--engine', choices=Interpreter.ENGINES, default='tree',
+                            help='evaluation engine (default: tree)')
+    arg_parser.add_argument('--optimize', action='store_true',
+                            help='optimize the script before running it, and '
+                            'print a report of the rewrites and of the loops '
+                            'vectorized to stderr')
+    printed.add_argument('--outputs', metavar='NAMES',
+                         help='comma-separated variables to print; the '
+                         'assignments none of them depends on are skipped')
+    arg_parser.add_argument('--cache', metavar='DIR',
+                            help='keep the parsed script in DIR, and reuse it when '
+                            'the same script is run again')
+    arg_parser.add_argument('--batch', metavar='PATH',
+                            help='run every .m script of the directory PATH, or '
+                            'listed in the manifest PATH, on a pool of worker '
+                            'processes, and print a summary to stderr')
+    arg_parser.add_argument('--out', metavar='DIR', default='.',
+                            help='with --batch, the directory the output of each '
+                            'script is written to (default: .)')
+    arg_parser.add_argument('--workers', type=int, metavar='N',
+                            help='with --batch, the number of worker processes '
+                            '(default: one per CPU)')
+    arg_parser.add_argument('--profile', action='store_true',
+                            help='print the hottest statements, node types and '
+                            'variables of the script to stderr')
+    arg_parser.add_argument('--profile-json', metavar='FILE',
+                            help='write the whole profile of the script to FILE as JSON')
+    args = arg_parser.parse_args()
+    # the options that batches, compiling and running compiled scripts do not use
+    unused = (('batch', ('compile', 'compiled', 'script', 'stream', 'outputs', 'profile', 'profile_json')),
+              ('compile', ('compiled', 'stream', 'outputs', 'cache', 'profile', 'profile_json')),
+              ('compiled', ('script', 'stream', 'outputs', 'cache', 'optimize', 'profile', 'profile_json')))
+    for mode, options in unused:
+        if getattr(args, mode):
+            for option in options:
+                if getattr(args, option):
+                    arg_parser.error('{} cannot be used with {}'.format(
+                        *('SCRIPT.mc' if name == 'compiled' else '--' + name.replace('_', '-')
+                          for name in (option, mode))))
+            break
+    profile = args.profile or args.profile_json is not None
+    outputs = args.outputs.split(',') if args.outputs else None
+
+    if args.batch:
+        try:
+            report = run_batch(args.batch, args.out, args.workers, args.engine, args.optimize, args.cache)
+        except ValueError as error:
+            arg_parser.error(str(error))
+        stderr.write(report.summary())
+    elif args.compile:
+        if args.script:
+            with open(args.script) as script_file:
+                text = script_file.read()
+        else:
+            text = stdin.read()
+        code = Bytecode.compile_source(text, args.optimize)
+        with open(args.compile, 'wb') as compiled_file:
+            code.dump(compiled_file)
+    elif args.compiled:
+        with open(args.compiled, 'rb') as compiled_file:
+            code = Bytecode.load(compiled_file)
+        scope = {}
+        code.run(scope)
+        interp_print(stdout, scope)
+    else:
+        source = map_file(args.script) if args.script else stdin
+        cache = ScriptCache(directory=args.cache) if args.cache else None
+        if args.stream:
+            interp = interp_stream(source, stdout, args.engine, args.optimize, profile, cache)
+        else:
+            interp = interp_solve(source, stdout, args.engine, args.optimize, cache, profile, outputs)
+        if interp.optimizer is not None:
+            stderr.write(format_report(interp.optimizer.report, interp.optimizer.loops))
+        if args.profile:
+            stderr.write(interp.profiler.report())
+        if args.profile_json:
+            with open(args.profile_json, 'w') as profile_file:
+                json.dump(interp.profiler.to_json(), profile_file, indent=2)
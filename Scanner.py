@@ -14,7 +14,10 @@ Github:    https://github.com/jtrejo13
 # imports
 # -------
 
-from typing import Dict
+import mmap
+import os
+import re
+from typing import Dict, List, Union
 
 # ----------------------------------------------------
 # Token Types
@@ -24,19 +27,35 @@ from typing import Dict
 #
 # EOF (end-of-file): token is used to indicate that
 # there is no more input left for lexical analysis
+#
+# NEWLINE: ends a statement just like SEMI. Blank
+# and comment-only lines that follow are folded into
+# the same token
+#
+# LBRACKET, RBRACKET, COMMA: delimit a matrix literal
+# and separate its elements. Inside the brackets, SEMI
+# and NEWLINE separate its rows, and whitespace between
+# two elements stands for a COMMA (see Scanner)
+#
+# POW (^) is the matrix power. DOTMUL (.*), DOTDIV (./)
+# and DOTPOW (.^) are the element-wise product,
+# division and power
+#
+# COLON: builds a range, as in 1:10 or 0:0.5:2
+#
+# LT, LE, GT, GE, EQ, NE: the relational operators
+# <, <=, >, >=, == and ~=
+#
+# FOR, WHILE, END: the keywords of loops
 # ----------------------------------------------------
-ID, INTEGER, FLOAT, ASSIGN, PLUS, MINUS, MUL, DIV, LPAREN, RPAREN, SEMI, EOF = (
-    'ID', 'INTEGER', 'FLOAT', 'ASSIGN', 'PLUS', 'MINUS', 'MUL', 'DIV', 'LPAREN', 'RPAREN', 'SEMI', 'EOF'
+ID, INTEGER, FLOAT, ASSIGN, PLUS, MINUS, MUL, DIV, LPAREN, RPAREN, SEMI, NEWLINE, EOF = (
+    'ID', 'INTEGER', 'FLOAT', 'ASSIGN', 'PLUS', 'MINUS', 'MUL', 'DIV', 'LPAREN', 'RPAREN', 'SEMI', 'NEWLINE', 'EOF'
 )
-
-
-"""
-Reserved Keywords
-
-Words that cannot be used as identifier, such as the name
-of a variable or function
-"""
-RESERVED_KEYWORDS = {}  # type: Dict[str, Token]
+LBRACKET, RBRACKET, COMMA = 'LBRACKET', 'RBRACKET', 'COMMA'
+POW, DOTMUL, DOTDIV, DOTPOW = 'POW', 'DOTMUL', 'DOTDIV', 'DOTPOW'
+COLON = 'COLON'
+LT, LE, GT, GE, EQ, NE = 'LT', 'LE', 'GT', 'GE', 'EQ', 'NE'
+FOR, WHILE, END = 'FOR', 'WHILE', 'END'
 
 
 class Token(object):
@@ -52,6 +71,8 @@ class Token(object):
         value (str_int_or_float): The value of the token
     """
 
+    __slots__ = ('type', 'value')
+
     def __init__(self, type, value):
         self.type = type
         self.value = value
@@ -77,24 +98,143 @@ class Token(object):
         return self.__str__()
 
 
+"""
+Reserved Keywords
+
+Words that cannot be used as identifier, such as the name
+of a variable or function
+"""
+RESERVED_KEYWORDS = {
+    'for': Token(FOR, 'for'),
+    'while': Token(WHILE, 'while'),
+    'end': Token(END, 'end'),
+}  # type: Dict[str, Token]
+
+
+# ----------------------------------------------------
+# Token Patterns
+#
+# The whole lexical grammar is compiled into a single
+# regular expression. Each match skips any leading
+# whitespace and comments and then captures exactly one
+# token in one of the named groups below; the name of
+# the group that matched selects how the token is built.
+# An empty match means the end of the input was reached
+# ----------------------------------------------------
+TOKEN_REGEX = re.compile(r"""
+    [^\S\n]*(?:%[^\n]*)?            # whitespace and comment
+    (?:
+        (?P<NEWLINE>\n\s*(?:%[^\n]*\s*)*)  # end of line and blank lines
+      | (?P<NUMBER>\d(?:\d|\.(?![*/^]))*(?:[eE][-+]?\d+)?)  # integer or real number
+      | (?P<ID>[^\W_]+)              # identifier or keyword
+      | (?P<OP>\.[*/^]|[=~<>]=|[-+*/^()=;:<>\[\],])  # operator
+      | (?P<ERROR>.)                 # anything else is invalid
+    )?
+""", re.VERBOSE | re.DOTALL)
+
+"""
+Byte Patterns
+
+The same lexical grammar, matched against the bytes of a script where
+they are, e.g. in a memory-mapped file (see map_file). Identifiers and
+numbers are ASCII, and only the text of their tokens is decoded; comments
+may hold any bytes
+"""
+TOKEN_BYTES_REGEX = re.compile(TOKEN_REGEX.pattern.encode('ascii'), re.VERBOSE | re.DOTALL)
+BUFFER_TYPES = (bytes, bytearray, memoryview, mmap.mmap)
+
+OPERATORS = {
+    '+': PLUS,
+    '-': MINUS,
+    '*': MUL,
+    '/': DIV,
+    '(': LPAREN,
+    ')': RPAREN,
+    '=': ASSIGN,
+    ';': SEMI,
+    '[': LBRACKET,
+    ']': RBRACKET,
+    ',': COMMA,
+    '^': POW,
+    '.*': DOTMUL,
+    './': DOTDIV,
+    '.^': DOTPOW,
+    ':': COLON,
+    '<': LT,
+    '<=': LE,
+    '>': GT,
+    '>=': GE,
+    '==': EQ,
+    '~=': NE,
+}  # type: Dict[str, str]
+
+# ----------------------------------------------------
+# Interned Tokens
+#
+# Tokens whose value is fixed by their type are only
+# created once and shared by every scanner (likewise,
+# a scanner creates one token per identifier), so
+# tokens must never be modified once created
+# ----------------------------------------------------
+OPERATOR_TOKENS = {
+    char: Token(token_type, char) for char, token_type in OPERATORS.items()
+}  # type: Dict[str, Token]
+OPERATOR_BYTES_TOKENS = {
+    char.encode('ascii'): token for char, token in OPERATOR_TOKENS.items()
+}  # type: Dict[bytes, Token]
+NEWLINE_TOKEN = Token(NEWLINE, '\n')
+COMMA_TOKEN = OPERATOR_TOKENS[',']
+EOF_TOKEN = Token(EOF, None)
+
+"""
+Matrix Elements
+
+Inside the brackets of a matrix literal, and outside any parentheses,
+whitespace after a token ending an operand and before a token starting
+one separates two elements, as in [1 2 x(3)]. A sign starts an operand
+only if no whitespace follows it, so [1 -2] has two elements and
+[1 - 2] one
+"""
+OPERAND_END_TYPES = frozenset((ID, INTEGER, FLOAT, RPAREN, RBRACKET))
+OPERAND_START_TYPES = frozenset((ID, INTEGER, FLOAT, LPAREN, LBRACKET))
+
+
 class Scanner(object):
     """
     Tokenizer of a MATLAB script
 
     Args:
-        text(str): The input text to be tokenized
+        text(str, bytes-like or iterable of str): The input text to be
+        tokenized, its bytes (e.g. a memory-mapped file, see map_file),
+        which are scanned without being copied or decoded, or a reader
+        (e.g. a file object) yielding it one line at a time
 
     Attributes:
-        text(str): The input text to be tokenized
+        text(str or bytes-like): The input text to be tokenized. When
+        reading from a reader, only the line currently being tokenized
+
+    Inside the brackets of a matrix literal, the scanner emits a COMMA
+    for the whitespace separating two elements (see Matrix Elements)
     """
 
     def __init__(self, text):
+        self._regex = TOKEN_REGEX
+        self._operators = OPERATOR_TOKENS
+        if isinstance(text, BUFFER_TYPES):
+            self._lines = None
+            self._regex = TOKEN_BYTES_REGEX
+            self._operators = OPERATOR_BYTES_TOKENS
+        elif isinstance(text, str):
+            self._lines = None
+        else:
+            self._lines = iter(text)
+            text = ''
         self.text = text
         self._pos = 0
-        try:
-            self.current_char = self.text[self._pos]
-        except IndexError:
-            self.current_char = None
+        self._names = {}  # type: Dict[Union[str, bytes], Token]
+        self._brackets = []  # type: List[str]
+        self._operand = False
+        self._held = None  # type: Token
 
     def next_token(self):
         """
@@ -105,120 +245,161 @@ class Scanner(object):
         Raises:
             Expection: If invalid charcter is provided
         """
-        while self.current_char is not None:
-
-            if self.current_char == '%':
-                self._skip_comment()
-                continue
-
-            if self.current_char.isspace():
-                self.skip_whitespace()
-                continue
-
-            if self.current_char.isdigit():
-                token = self.get_number()
-                return token
-
-            if self.current_char == '+':
-                self.advance()
-                return Token(PLUS, '+')
-
-            if self.current_char == '-':
-                self.advance()
-                return Token(MINUS, '-')
-
-            if self.current_char == '*':
-                self.advance()
-                return Token(MUL, '*')
-
-            if self.current_char == '/':
-                self.advance()
-                return Token(DIV, '/')
-
-            if self.current_char == '(':
-                self.advance()
-                return Token(LPAREN, '(')
-
-            if self.current_char == ')':
-                self.advance()
-                return Token(RPAREN, ')')
-
-            if self.current_char.isalnum():
-                return self._id()
-
-            if self.current_char == '=':
-                self.advance()
-                return Token(ASSIGN, '=')
-
-            if self.current_char == ';':
-                self.advance()
-                return Token(SEMI, ';')
-
+        if self._held is not None:
+            token, self._held = self._held, None
+            return token
+        match = self._regex.match(self.text, self._pos)
+        kind = match.lastgroup
+        while kind is None and self._next_line():
+            match = self._regex.match(self.text)
+            kind = match.lastgroup
+        if kind == 'ERROR':
             self.raise_error()  # if invalid character
+        self._pos = match.end()
+        if kind is None:
+            return EOF_TOKEN
+        token = self._make_token(kind, match.group(kind))
+        if (self._brackets or token.type == LBRACKET) and self._separates(match, token):
+            self._held = token
+            return COMMA_TOKEN
+        return token
+
+    def tokenize_all(self):
+        """
+        Scans the rest of the input text in a single pass
 
-        return Token(EOF, None)
+        Returns:
+            list of Token: Every remaining token in the input text,
+            terminated by the (EOF, None) token
+        Raises:
+            Expection: If invalid charcter is provided
+        """
+        tokens = []  # type: List[Token]
+        append = tokens.append
+        names = self._names
+        operators = self._operators
+        brackets = self._brackets
+        lbracket = OPERATOR_TOKENS['[']
+        if self._held is not None:
+            append(self._held)
+            self._held = None
+        while True:
+            for match in self._regex.finditer(self.text, self._pos):
+                kind = match.lastgroup
+                if kind == 'OP':
+                    token = operators[match.group(kind)]
+                    if (brackets or token is lbracket) and self._separates(match, token):
+                        append(COMMA_TOKEN)
+                    append(token)
+                elif kind == 'ID':
+                    value = match.group(kind)
+                    token = names.get(value)
+                    if token is None:
+                        token = self._make_token(kind, value)
+                    if brackets and self._separates(match, token):
+                        append(COMMA_TOKEN)
+                    append(token)
+                elif kind == 'NUMBER':
+                    value = match.group(kind)
+                    if not value.isdigit():
+                        token = self._make_token(kind, value)
+                    else:
+                        token = Token(INTEGER, int(value))
+                    if brackets and self._separates(match, token):
+                        append(COMMA_TOKEN)
+                    append(token)
+                elif kind == 'NEWLINE':
+                    if brackets:
+                        self._separates(match, NEWLINE_TOKEN)
+                    append(NEWLINE_TOKEN)
+                elif kind == 'ERROR':
+                    self._pos = match.start(kind)
+                    self.raise_error()  # if invalid character
+            self._pos = len(self.text)
+            if not self._next_line():
+                break
+        append(EOF_TOKEN)
+        return tokens
+
+    def _separates(self, match, token):
+        """
+        Tracks the brackets and parentheses token opens or closes
 
-    def get_number(self):
-        """Scans input for a real or integer number"""
-        start = self._pos
-        while self.current_char is not None \
-                and (self.current_char.isdigit() or self.current_char == '.'):
-            self.advance()
-        result = self.text[start:self._pos]
+        Returns:
+            bool: Whether the whitespace before token separates two
+            elements of a matrix (see Matrix Elements)
+        """
+        brackets = self._brackets
+        separates = False
+        if brackets and brackets[-1] == LBRACKET and self._operand and match.start(match.lastgroup) > match.start():
+            if token.type in OPERAND_START_TYPES:
+                separates = True
+            elif token.type in (PLUS, MINUS):
+                following = self.text[match.end():match.end() + 1]
+                separates = bool(following) and not following.isspace()
+        if token.type in (LBRACKET, LPAREN):
+            brackets.append(token.type)
+        elif token.type in (RBRACKET, RPAREN) and brackets:
+            brackets.pop()
+        self._operand = token.type in OPERAND_END_TYPES
+        return separates
+
+    def _next_line(self):
+        if self._lines is None:
+            return False
+        for line in self._lines:
+            self.text = line
+            self._pos = 0
+            return True
+        self._lines = None
+        return False
+
+    def _make_token(self, kind, value):
+        if kind == 'OP':
+            return self._operators[value]
+        if kind == 'ID':
+            # every occurrence of an identifier shares one token, and
+            # its bytes are only decoded the first time
+            token = self._names.get(value)
+            if token is None:
+                name = value if isinstance(value, str) else value.decode('ascii')
+                token = self._names[value] = RESERVED_KEYWORDS.get(name) or Token(ID, name)
+            return token
+        if kind == 'NEWLINE':
+            return NEWLINE_TOKEN
+        return self.get_number(value if isinstance(value, str) else value.decode('ascii'))
+
+    def get_number(self, result):
+        """
+        Builds a real or integer number token from its text. Numbers
+        with a period or an exponent (e.g. 1e6) are real
+        """
         period_count = result.count('.')
         if period_count > 1:
             self.raise_error()
-        elif period_count == 1:
+        elif period_count == 1 or not result.isdigit():
             return Token(FLOAT, float(result))
         else:
             return Token(INTEGER, int(result))
 
-    def _id(self):
-        start = self._pos
-        while self.current_char is not None \
-                and self.current_char.isalnum():
-            self.advance()
-
-        result = self.text[start:self._pos]
-        return RESERVED_KEYWORDS.get(result, Token(ID, result))
-
-    def advance(self):
-        """Advances internal pointer by one character"""
-        self._pos += 1
-        if self._pos > len(self.text) - 1:
-            self.current_char = None
-        else:
-            self.current_char = self.text[self._pos]
-
-    def peek(self):
-        """
-        Looks at one character past the current position
-        Returns:
-            character(str): The character next to the current position
-        """
-        peek_pos = self._pos + 1
-        if peek_pos > len(self.text) - 1:
-            return None
-        # else: still in bounds
-        return self.text[peek_pos]
-
-    def _skip_comment(self):
-        while self.current_char is not None \
-                and self.current_char != '\n':
-            self.advance()
-
-    def skip_whitespace(self):
-        """
-        Skips all whitespace in input up to the next
-        non-whitespace character or until the EOF is reached
-        """
-        while self.current_char is not None \
-                and self.current_char.isspace():
-            self.advance()
-
     def raise_error(self):
         """
         Raises:
             Exception: Invalid character exception
         """
         raise Exception('Invalid character')
+
+
+def map_file(path: str):
+    """
+    Maps a script file into memory, read-only, for a Scanner to tokenize
+    it where it is, without reading it into a str
+
+    Returns:
+        mmap or bytes: The bytes of the file (empty bytes for an empty file,
+        which cannot be mapped)
+    """
+    with open(path, 'rb') as script_file:
+        if not os.fstat(script_file.fileno()).st_size:
+            return b''
+        return mmap.mmap(script_file.fileno(), 0, access=mmap.ACCESS_READ)
@@ -0,0 +1,273 @@
+"""
+Filename: Server.py
+Description: Long-lived asyncio server evaluating MATLAB scripts sent
+             over TCP or a Unix socket, with a workspace per session
+Author:    Juan Trejo
+Github:    https://github.com/jtrejo13
+"""
+
+# -------
+# imports
+# -------
+
+import asyncio
+from argparse import ArgumentParser
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from timeit import default_timer
+from typing import Callable, Deque, List
+from Cache import ScriptCache
+from Interpreter import Interpreter, Workspace
+from Parser import Assign
+from Optimizer import variables_written
+
+
+"""
+Protocol
+
+A client sends a script as lines of text, followed by a line holding only
+END (the MATLAB section separator, so a file of sections can be piped
+as is). The server evaluates the script in the workspace of the
+connection, which keeps its variables between scripts. As soon as a
+statement of the script is executed, the server sends back a 'name=value'
+line for each variable it assigned (a loop or an if statement, once it
+ends, for each variable assigned in its body), and after the script a
+status line:
+
+    %% ok 0.412ms
+    %% error NameError: ...
+
+The line STATS instead of a script is answered with one 'name=value' line
+per metric of the server (see Metrics), followed by '%% ok'
+"""
+END = '%%'
+STATS = '%% stats'
+
+
+class Metrics(object):
+    """
+    Request latency metrics of a server
+
+    Args:
+        window(int): The number of most recent latencies kept for the
+        percentiles
+
+    Attributes:
+        requests(int): Scripts evaluated
+        errors(int): Scripts that raised
+        total(float): Seconds spent on all the scripts
+        latencies(deque of float): Seconds spent on the most recent scripts
+    """
+
+    def __init__(self, window=1000):
+        self.requests = 0
+        self.errors = 0
+        self.total = 0.0
+        self.latencies = deque(maxlen=window)  # type: Deque[float]
+
+    def record(self, seconds, error=False):
+        """Records the latency of a script"""
+        self.requests += 1
+        self.errors += error
+        self.total += seconds
+        self.latencies.append(seconds)
+
+    def summary(self):
+        """
+        Returns:
+            dict: The request and error counts, and the mean, median, 95th
+            percentile and maximum latencies in milliseconds
+        """
+        latencies = sorted(self.latencies)
+        summary = {'requests': self.requests, 'errors': self.errors}
+        if not latencies:
+            return summary
+        summary['mean_ms'] = 1000 * self.total / self.requests
+        summary['p50_ms'] = 1000 * latencies[len(latencies) // 2]
+        summary['p95_ms'] = 1000 * latencies[min(len(latencies) - 1, len(latencies) * 95 // 100)]
+        summary['max_ms'] = 1000 * latencies[-1]
+        return summary
+
+
+class Server(object):
+    """
+    Evaluation server. Scripts are looked up in a ScriptCache shared by
+    every session, so a script sent again, by any client, is neither
+    parsed nor compiled again. They run on a pool of threads, so that a
+    long script does not block the other sessions, and at most limit of
+    them run at once; the others wait for their turn
+
+    Args:
+        engine(str): The engine scripts are evaluated with (see Interpreter)
+        optimize(bool): Whether to optimize the scripts first
+        limit(int): The number of scripts evaluated at once
+        cache(ScriptCache): The cache of parsed and compiled scripts
+
+    Attributes:
+        engine(str): The engine scripts are evaluated with
+        optimize(bool): Whether to optimize the scripts first
+        cache(ScriptCache): The cache of parsed and compiled scripts
+        metrics(Metrics): The latencies of the scripts evaluated
+        sessions(int): The number of open connections
+    """
+
+    def __init__(self, engine='tree', optimize=False, limit=4, cache=None):
+        if engine not in Interpreter.ENGINES:
+            raise ValueError('Unknown engine {}'.format(repr(engine)))
+        self.engine = engine
+        self.optimize = optimize
+        self.cache = cache if cache is not None else ScriptCache()
+        self.metrics = Metrics()
+        self.sessions = 0
+        self._limit = asyncio.Semaphore(limit)
+        self._executor = ThreadPoolExecutor(limit)
+
+    async def serve(self, host='127.0.0.1', port=0, path=None):
+        """
+        Starts listening on a TCP port, or on the Unix socket path
+
+        Returns:
+            asyncio.AbstractServer: The listening server
+        """
+        if path is not None:
+            return await asyncio.start_unix_server(self.handle, path)
+        return await asyncio.start_server(self.handle, host, port)
+
+    def close(self):
+        """Shuts the evaluation threads down"""
+        self._executor.shutdown()
+
+    async def handle(self, reader, writer):
+        """Serves the scripts of one connection, in a workspace of its own"""
+        self.sessions += 1
+        workspace = Workspace()
+        try:
+            lines = []  # type: List[str]
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                line = line.decode('utf-8').rstrip('\r\n')
+                if line == STATS:
+                    await self.send(writer, self.stats() + ['%% ok'])
+                elif line.strip() == END:
+                    await self.evaluate('\n'.join(lines), workspace, writer)
+                    lines = []
+                else:
+                    lines.append(line)
+        except ConnectionError:
+            pass
+        finally:
+            self.sessions -= 1
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+    async def evaluate(self, text, workspace, writer):
+        """
+        Evaluates a script in a workspace, sending the variables each
+        statement assigns to writer while the script runs, and then the
+        status line
+        """
+        loop = asyncio.get_running_loop()
+        lines = asyncio.Queue()  # type: asyncio.Queue
+
+        def emit(line):
+            loop.call_soon_threadsafe(lines.put_nowait, line)
+
+        async with self._limit:
+            start = default_timer()
+            done = loop.run_in_executor(self._executor, self.run, text, workspace, emit)
+            # the lines emitted by the script are queued before it is done
+            done.add_done_callback(lambda _: lines.put_nowait(None))
+            try:
+                line = await lines.get()
+                while line is not None:
+                    await self.send(writer, [line])
+                    line = await lines.get()
+            finally:
+                try:
+                    await done
+                    error = None
+                except Exception as exception:  # pylint: disable = broad-except
+                    error = '{}: {}'.format(type(exception).__name__, exception)
+            seconds = default_timer() - start
+        self.metrics.record(seconds, error is not None)
+        if error is not None:
+            await self.send(writer, ['%% error {}'.format(error)])
+        else:
+            await self.send(writer, ['%% ok {:.3f}ms'.format(1000 * seconds)])
+
+    def run(self, text: str, workspace: Workspace, emit: Callable[[str], None]):
+        """
+        Runs a script in a workspace, on an evaluation thread, calling emit
+        with a 'name=value' line for each variable a statement assigns as
+        soon as the statement is executed. Looking the script up in the
+        cache, which scans and parses it on a miss, also happens there, so
+        that it never blocks the event loop
+        """
+        interp = Interpreter(self.cache.parser(text, workspace), self.engine, self.optimize, workspace)
+        for statement in interp.interpret_stream():
+            if isinstance(statement, Assign):
+                names = [statement.left.token.value]
+            else:
+                written = variables_written(statement)
+                names = [name for name in workspace if name in written]
+            for name in names:
+                if name in workspace:
+                    emit('{}={}'.format(name, workspace[name]))
+
+    def stats(self):
+        """
+        Returns:
+            list of str: A 'name=value' line per metric and cache counter
+        """
+        stats = self.metrics.summary()
+        stats['sessions'] = self.sessions
+        stats.update(('cache_' + name, value) for name, value in self.cache.stats().items())
+        return ['{}={}'.format(name, value) for name, value in stats.items()]
+
+    @staticmethod
+    async def send(writer, lines):
+        """Writes lines to a client, waiting while its buffer is full"""
+        for line in lines:
+            writer.write((line + '\n').encode('utf-8'))
+            await writer.drain()
+
+# ----
+# main
+# ----
+
+
+if __name__ == "__main__":
+    arg_parser = ArgumentParser(description='Evaluates the MATLAB scripts sent to a TCP port or a '
+                                'Unix socket, each line %% ending a script')
+    arg_parser.add_argument('--host', default='127.0.0.1',
+                            help='address to listen on (default: 127.0.0.1)')
+    arg_parser.add_argument('--port', type=int, default=8765,
+                            help='TCP port to listen on (default: 8765)')
+    arg_parser.add_argument('--unix', metavar='PATH',
+                            help='listen on the Unix socket PATH instead of a TCP port')
+    arg_parser.add_argument('--engine', choices=Interpreter.ENGINES, default='tree',
+                            help='evaluation engine (default: tree)')
+    arg_parser.add_argument('--optimize', action='store_true',
+                            help='optimize the scripts before running them')
+    arg_parser.add_argument('--limit', type=int, default=4,
+                            help='number of scripts evaluated at once (default: 4)')
+    arg_parser.add_argument('--cache', metavar='DIR',
+                            help='keep the parsed scripts in DIR, and reuse them across restarts')
+    args = arg_parser.parse_args()
+
+    event_loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(event_loop)
+    server = Server(args.engine, args.optimize, args.limit, ScriptCache(directory=args.cache))
+    listener = event_loop.run_until_complete(server.serve(args.host, args.port, args.unix))
+    try:
+        event_loop.run_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        listener.close()
+        server.close()
@@ -13,11 +13,39 @@ Github:    https://github.com/jtrejo13
 # imports
 # -------
 
+import asyncio
+import os
+import pickle
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from tempfile import TemporaryDirectory
+from threading import Event
 from unittest import main, TestCase
-from io import StringIO
-from Scanner import Token, Scanner, INTEGER, PLUS
+from io import StringIO, BytesIO
+import numpy
+from Scanner import Token, Scanner, INTEGER, PLUS, RESERVED_KEYWORDS, map_file
 from Parser import *
 from Interpreter import *
+from Compiler import Compiler, SlotView, UNBOUND
+import Bytecode
+from Optimizer import Optimizer, count_nodes
+import Cache
+from Cache import ScriptCache
+from Operators import Range, make_matrix, multiply
+from Builtins import BUILTINS
+from BatchRunner import find_scripts, run_batch
+from Server import Server
+from Incremental import IncrementalScript
+
+# -----------
+# run_engines
+# -----------
+
+
+def run_engines(script, optimizations=(False,)):
+    """Evaluates script with every engine, and returns their workspaces"""
+    return [interp_eval(Parser(Scanner(script)), engine, optimize)
+            for optimize in optimizations for engine in Interpreter.ENGINES]
 
 # -----------
 # TestScanner
@@ -110,6 +138,76 @@ class TestScanner(TestCase):
         with self.assertRaises(Exception):
             scanner.next_token()
 
+    def test_scanner_intern_0(self):
+        tokens = Scanner('x = x + 1 + x;').tokenize_all()
+        self.assertIs(tokens[0], tokens[2])
+        self.assertIs(tokens[0], tokens[6])
+        self.assertIs(tokens[3], tokens[5])
+        self.assertIs(tokens[-1], Scanner('').next_token())
+
+    def test_scanner_intern_1(self):
+        scanner = Scanner('y = y * 2')
+        tokens = [scanner.next_token() for _ in range(5)]
+        self.assertIs(tokens[0], tokens[2])
+        self.assertIs(tokens[3], Scanner('*').next_token())
+        self.assertFalse(hasattr(tokens[0], '__dict__'))
+
+    def test_scanner_tokenize_all_0(self):
+        scanner = Scanner('myVar = 2.5; % comment\n x = myVar')
+        types = [token.type for token in scanner.tokenize_all()]
+        self.assertEqual([ID, ASSIGN, FLOAT, SEMI, NEWLINE, ID, ASSIGN, ID, EOF], types)
+
+    def test_scanner_tokenize_all_1(self):
+        scanner = Scanner('x = 1;')
+        scanner.next_token()
+        self.assertEqual('[Token(ASSIGN, =), Token(INTEGER, 1), Token(SEMI, ;), Token(EOF, None)]',
+                         str(scanner.tokenize_all()))
+        self.assertEqual('Token(EOF, None)', str(scanner.next_token()))
+
+    def test_scanner_tokenize_all_2(self):
+        scanner = Scanner('x = 3 ~ 2')
+        with self.assertRaises(Exception):
+            scanner.tokenize_all()
+
+    def test_scanner_tokenize_all_3(self):
+        scanner = Scanner('y = 2.5.0')
+        with self.assertRaises(Exception):
+            scanner.tokenize_all()
+
+    def test_scanner_bytes_0(self):
+        text = 'A = [1, 2.5e1]; % \u00e9t\u00e9\r\nfor i = 1:3\n  x = A .^ i >= 2;\nend'
+        expected = [(token.type, token.value) for token in Scanner(text.replace('\r', '')).tokenize_all()]
+        for buffer in (text.encode('utf-8'), memoryview(text.encode('utf-8'))):
+            self.assertEqual(expected, [(token.type, token.value) for token in Scanner(buffer).tokenize_all()])
+        scanner = Scanner(text.encode('utf-8'))
+        tokens = [scanner.next_token() for _ in range(len(expected))]
+        self.assertEqual(expected, [(token.type, token.value) for token in tokens])
+        self.assertIs(tokens[0], tokens[18])
+        self.assertIs(RESERVED_KEYWORDS['for'], tokens[9])
+
+    def test_scanner_bytes_1(self):
+        for text in (b'x = 3 ~ 2', b'y = 2.5.0', 'z = \u00e9'.encode('utf-8')):
+            with self.assertRaises(Exception):
+                Scanner(text).tokenize_all()
+
+    def test_scanner_map_file(self):
+        with TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'script.m')
+            with open('RunInterpreter.in') as script, open(path, 'w') as copy:
+                copy.write(script.read())
+            expected = StringIO()
+            with open(path) as script:
+                interp_solve(script, expected)
+            for outputs in (None, ['volSphere']):
+                writer = StringIO()
+                mapped = map_file(path)
+                interp_solve(mapped, writer, 'vm', outputs=outputs)
+                mapped.close()
+                self.assertEqual(outputs is None, expected.getvalue() == writer.getvalue())
+                self.assertIn('volSphere=3052.08\n', writer.getvalue())
+            open(path, 'w').close()
+            self.assertEqual(b'', map_file(path))
+
 # ----------
 # TestParser
 # ----------
@@ -202,6 +300,48 @@ class TestParser(TestCase):
         self.assertEqual(get_expr(statements[0]), 'x=3')
         self.assertEqual(get_expr(statements[1]), 'y=x')
 
+    def test_parser_parse_12(self):
+        scanner = Scanner('radius = 1.5      % the radius\n\n% area\narea = radius * 2\n')
+        parser = Parser(scanner)
+        tree = parser.parse()
+        statements = tree.statements
+        self.assertEqual(get_expr(statements[0]), 'radius=1.5')
+        self.assertEqual(get_expr(statements[1]), 'area=radius*2')
+
+    def test_parser_nodes(self):
+        tree = Parser(Scanner('x = -(1 + y)')).parse()
+        assign = tree.statements[0]
+        unary = assign.right
+        for node in (tree, assign, assign.left, unary, unary.right, unary.right.left):
+            self.assertFalse(hasattr(node, '__dict__'))
+        self.assertIsNone(assign.left.left)
+        self.assertIsNone(unary.left)
+        self.assertIsNone(Node().token)
+
+    def test_parser_parse_statements_0(self):
+        lines_read = []
+
+        def reader():
+            for line in ['x = 1;\n', 'y = 2\n', 'z = 3;']:
+                lines_read.append(line)
+                yield line
+
+        parser = Parser(Scanner(reader()))
+        statements = parser.parse_statements()
+        self.assertEqual(get_expr(next(statements)), 'x=1')
+        self.assertEqual(1, len(lines_read))
+        self.assertEqual(get_expr(next(statements)), 'y=2')
+        self.assertEqual(2, len(lines_read))
+        self.assertEqual(get_expr(next(statements)), 'z=3')
+        self.assertEqual(3, len(lines_read))
+
+    def test_parser_parse_statements_1(self):
+        parser = Parser(Scanner(StringIO('x = 1;\ny = 2 2;\n')))
+        statements = parser.parse_statements()
+        self.assertEqual(get_expr(next(statements)), 'x=1')
+        with self.assertRaises(Exception):
+            list(statements)
+
 
 # ---------------
 # TestInterpreter
@@ -363,6 +503,1453 @@ class TestInterpreter(TestCase):
         expected = 'x=3\ny=10\nres=13\n'
         self.assertEqual(len(expected), len(writer.getvalue()))
 
+    def test_interpret_solve_1(self):
+        reader = StringIO("% no semicolons\nx = 3\ny = 10\n\nres = x + y\nx = 4\n")
+        writer = StringIO()
+        interp_solve(reader, writer)
+        self.assertEqual('x=4\ny=10\nres=13\n', writer.getvalue())
+
+    def test_interpret_stream(self):
+        reader = StringIO("x = 3;\ny = 10;\nx = x + y;\n")
+        writer = StringIO()
+        interp_stream(reader, writer)
+        self.assertEqual('x=3\ny=10\nx=13\n', writer.getvalue())
+
+    def test_interpret_stream_cache(self):
+        cache = ScriptCache()
+        text = 'x = 3;\ny = x * 2 + x * 2;\nx = x + y;\n'
+        for engine in Interpreter.ENGINES:
+            for optimize in (False, True):
+                writer = StringIO()
+                interp_stream(StringIO(text), writer, engine, optimize, cache=cache)
+                self.assertEqual('x=3\ny=12\nx=15\n', writer.getvalue())
+        writer = StringIO()
+        interp_stream(text.encode('utf-8'), writer, cache=cache)
+        self.assertEqual('x=3\ny=12\nx=15\n', writer.getvalue())
+        self.assertEqual({'size': 1, 'hits': 6, 'misses': 1, 'evictions': 0, 'disk_hits': 0}, cache.stats())
+
+
+# ------------
+# TestCompiler
+# ------------
+
+
+class TestCompiler(TestCase):
+
+    def test_compile_0(self):
+        tree = Parser(Scanner('res = 8 + 3 * (10 / (12 / (3 + 1) - 1)) * ( 10 * 5) - 5;')).parse()
+        scope = {}
+        Compiler().compile(tree)(scope)
+        self.assertEqual({'res': 753}, scope)
+
+    def test_compile_1(self):
+        tree = Parser(Scanner('a = +-1; x = 5; y = x + 3; z = y / 2; w = y / 3 - -x')).parse()
+        scope = {}
+        Compiler().compile(tree)(scope)
+        self.assertEqual({'a': -1, 'x': 5, 'y': 8, 'z': 4, 'w': 8 / 3 + 5}, scope)
+        self.assertIsInstance(scope['z'], int)
+
+    def test_compile_2(self):
+        code = Compiler().compile(Parser(Scanner('x = x * 2')).parse())
+        scope = {'x': 1}
+        for _ in range(3):
+            code(scope)
+        self.assertEqual({'x': 8}, scope)
+
+    def test_compile_3(self):
+        code = Compiler().compile(Parser(Scanner('x = y + 1')).parse())
+        with self.assertRaises(NameError):
+            code({})
+
+    def test_compile_4(self):
+        with open('RunInterpreter.in') as script:
+            scopes = run_engines(script.read())
+        self.assertEqual(scopes[0], scopes[1])
+        self.assertEqual(3052.08, scopes[1]['volSphere'])
+
+    def test_compile_slots_0(self):
+        code = Compiler().compile(Parser(Scanner('y = x + 1; x = y * 2; z = x')).parse())
+        self.assertEqual(['x', 'y', 'z'], code.names)
+        slots = [5, UNBOUND, UNBOUND]
+        code.body(slots)
+        self.assertEqual([12, 6, 12], slots)
+        self.assertEqual({'y': 6, 'x': 12, 'z': 12}, dict(code.workspace(slots)))
+
+    def test_compile_slots_1(self):
+        code = Compiler().compile(Parser(Scanner('a = 1; b = c; d = 2')).parse())
+        scope = {}
+        with self.assertRaises(NameError):
+            code(scope)
+        self.assertEqual({'a': 1}, scope)
+
+    def test_compile_slots_2(self):
+        view = SlotView(['a', 'b', 'c'], [1, UNBOUND, 3])
+        self.assertEqual(['a', 'c'], list(view))
+        self.assertEqual(2, len(view))
+        self.assertEqual(3, view['c'])
+        with self.assertRaises(KeyError):
+            view['b']
+        writer = StringIO()
+        interp_print(writer, view)
+        self.assertEqual('a=1\nc=3\n', writer.getvalue())
+
+    def test_compile_5(self):
+        with self.assertRaises(ValueError):
+            Interpreter(Parser(Scanner('x = 1')), 'jit')
+
+    def test_compile_6(self):
+        interp = Interpreter(interp_read(StringIO("x=3;\ny=10;\nres=x + y;\n")), 'closure')
+        interp.GLOBAL_SCOPE = {}
+        statements = list(interp.interpret_stream())
+        self.assertEqual('res=x+y', get_expr(statements[2]))
+        self.assertEqual({'x': 3, 'y': 10, 'res': 13}, interp.GLOBAL_SCOPE)
+
+
+# ------------
+# TestBytecode
+# ------------
+
+
+class TestBytecode(TestCase):
+
+    def test_bytecode_run_0(self):
+        code = Bytecode.compile_source('a = +-1; x = 5; y = x + 3; z = y / 2; w = y / 3 - -x')
+        scope = {}
+        code.run(scope)
+        self.assertEqual({'a': -1, 'x': 5, 'y': 8, 'z': 4, 'w': 8 / 3 + 5}, scope)
+        self.assertIsInstance(scope['z'], int)
+
+    def test_bytecode_run_1(self):
+        code = Bytecode.compile_source('x = 2; y = x * 2 + 2 * x')
+        self.assertEqual(['x', 'y'], code.names)
+        self.assertEqual([2], code.constants)
+
+    def test_bytecode_run_2(self):
+        code = Bytecode.compile_source('x = y + 1')
+        with self.assertRaises(NameError):
+            code.run({})
+
+    def test_bytecode_run_3(self):
+        code = Bytecode.compile_source('y = x + 1; x = y * x')
+        self.assertEqual([Bytecode.LOAD_NAME, Bytecode.LOAD_FAST, Bytecode.LOAD_NAME],
+                         [code.code[pc] for pc in range(0, len(code.code), 2)
+                          if code.code[pc] in (Bytecode.LOAD_NAME, Bytecode.LOAD_FAST)])
+        scope = {'x': 3}
+        code.run(scope)
+        self.assertEqual({'x': 12, 'y': 4}, scope)
+
+    def test_bytecode_dump_0(self):
+        source = 'big = 123456789012345678901234567890; neg = -7; f = 2.5 * big; s = neg / 2'
+        buffer = BytesIO()
+        Bytecode.compile_source(source).dump(buffer)
+        code = Bytecode.load(BytesIO(buffer.getvalue()), source)
+        scope = {}
+        code.run(scope)
+        self.assertEqual(123456789012345678901234567890, scope['big'])
+        self.assertEqual(2.5 * 123456789012345678901234567890, scope['f'])
+        self.assertEqual(-3.5, scope['s'])
+
+    def test_bytecode_dump_1(self):
+        buffer = BytesIO()
+        Bytecode.compile_source('x = 1').dump(buffer)
+        with self.assertRaises(ValueError):
+            Bytecode.load(BytesIO(buffer.getvalue()), 'x = 2')
+
+    def test_bytecode_dump_2(self):
+        with self.assertRaises(ValueError):
+            Bytecode.load(BytesIO(b'PK\x03\x04'))
+
+    def test_bytecode_dump_3(self):
+        buffer = BytesIO()
+        Bytecode.compile_source('x = 1').dump(buffer)
+        data = bytearray(buffer.getvalue())
+        data[4] = Bytecode.VERSION + 1
+        with self.assertRaises(ValueError):
+            Bytecode.load(BytesIO(bytes(data)))
+
+    def test_bytecode_engine(self):
+        with open('RunInterpreter.in') as script:
+            interp = Interpreter(Parser(Scanner(script.read())), 'vm')
+        interp.GLOBAL_SCOPE = {}
+        interp.interpret()
+        self.assertEqual(3052.08, interp.GLOBAL_SCOPE['volSphere'])
+        self.assertEqual(9, interp.GLOBAL_SCOPE['r'])
+
+
+# -------------
+# TestOptimizer
+# -------------
+
+
+class TestOptimizer(TestCase):
+
+    def optimize(self, script):
+        optimizer = Optimizer()
+        tree = optimizer.optimize(Parser(Scanner(script)).parse())
+        return [get_expr(statement) for statement in tree.statements], optimizer.report
+
+    def test_optimize_0(self):
+        statements, report = self.optimize('v = 4/3*PI*r')
+        self.assertEqual(['v=1.3333333333333333*PI*r'], statements)
+        self.assertEqual(1, report['constants folded'])
+        self.assertEqual(2, report['nodes eliminated'])
+
+    def test_optimize_1(self):
+        statements, _ = self.optimize('x = 6 / 2 + 1; y = 7 / 2; z = --(+2); w = -(3 - 5)')
+        self.assertEqual(['x=4', 'y=3.5', 'z=2', 'w=2'], statements)
+
+    def test_optimize_2(self):
+        statements, report = self.optimize('a = --(+b); c = -+-b')
+        self.assertEqual(['a=b', 'c=b'], statements)
+        self.assertEqual(6, report['unary operators removed'])
+
+    def test_optimize_3(self):
+        statements, report = self.optimize('a = x * 1 + 0; b = 1 * x - 0; c = 0 + x * (3 - 2)')
+        self.assertEqual(['a=x', 'b=x', 'c=x'], statements)
+        self.assertEqual(6, report['identities applied'])
+
+    def test_optimize_4(self):
+        statements, report = self.optimize('a = x * 1.0; b = x + 0.0; c = x / 1; d = 0 - x')
+        self.assertEqual(['a=x*1.0', 'b=x+0.0', 'c=x/1', 'd=0-x'], statements)
+        self.assertEqual(0, report['nodes eliminated'])
+
+    def test_optimize_5(self):
+        statements, _ = self.optimize('x = 1 / (2 - 2)')
+        self.assertEqual(['x=1/0'], statements)
+
+    def test_optimize_6(self):
+        tree = Parser(Scanner('x = -(1 + y) * 2')).parse()
+        self.assertEqual(9, count_nodes(tree))
+
+    def test_optimize_7(self):
+        statements, report = self.optimize('x = 2 ^ 10 .* 2; y = (0 - 8) ^ (1 / 2)')
+        self.assertEqual(['x=2048', 'y=-8^0.5'], statements)
+        self.assertEqual(4, report['constants folded'])
+
+    def test_optimize_interpret(self):
+        for engine in Interpreter.ENGINES:
+            with open('RunInterpreter.in') as script:
+                interp = Interpreter(Parser(Scanner(script.read())), engine, optimize=True)
+            interp.GLOBAL_SCOPE = {}
+            interp.interpret()
+            self.assertEqual(3052.08, interp.GLOBAL_SCOPE['volSphere'])
+            self.assertEqual(2, interp.optimizer.report['nodes eliminated'])
+
+    def test_optimize_dead_stores_0(self):
+        statements, report = self.optimize('x = 1; y = 2; x = 5; x = y + 1; x(2) = 4; z = x; y = 3')
+        self.assertEqual(['x=1', 'y=2', 'x=y+1', 'x(2)=4', 'z=x', 'y=3'], statements)
+        self.assertEqual(1, report['dead stores eliminated'])
+
+    def test_optimize_dead_stores_order(self):
+        with open('RunInterpreter.in') as script:
+            scripts = ['x = 1; y = 2; x = 3', 'a = 1; for i = 1:2; b = i; end; a = 2; b = 3; c = a + b', script.read()]
+        for text in scripts:
+            expected = StringIO()
+            interp_print(expected, interp_eval(interp_read(text)))
+            for engine in Interpreter.ENGINES:
+                for cache in (None, ScriptCache()):
+                    writer = StringIO()
+                    interp_solve(StringIO(text), writer, engine, True, cache)
+                    self.assertEqual(expected.getvalue(), writer.getvalue())
+
+    def test_optimize_dead_stores_1(self):
+        script = 'n = 3; s = 0; t = 0;\nfor i = 1:n\n  s = s + i;\n  t = t + i;\nend\nu = t * 2; v = u'
+        tree = Optimizer(['s']).optimize(Parser(Scanner(script)).parse())
+        self.assertEqual(['n=3', 's=0', 't=0', 'for i=1:n;s=s+i;t=t+i;end'],
+                         [get_expr(statement) for statement in tree.statements])
+        tree = Optimizer(['n']).optimize(Parser(Scanner(script)).parse())
+        self.assertEqual(['n=3'], [get_expr(statement) for statement in tree.statements])
+        tree = Optimizer().optimize(Parser(Scanner('x = 1; while x < 3\n  y = x;\n  x = x + 1;\nend')).parse())
+        self.assertEqual(2, len(tree.statements))
+
+    def test_optimize_dead_stores_2(self):
+        for engine in Interpreter.ENGINES:
+            with open('RunInterpreter.in') as script:
+                text = script.read()
+            workspace = interp_eval(Parser(Scanner(text)), engine, outputs=['volSphere'])
+            self.assertEqual({'PI': 3.14, 'r': 9, 'volSphere': 3052.08}, workspace)
+            cache = ScriptCache()
+            for outputs in (['areaCircle'], None, ['areaCircle']):
+                workspace = interp_eval(cache.parser(text), engine, True, outputs=outputs)
+                self.assertEqual(19.625, workspace['areaCircle'])
+                self.assertEqual(outputs is None, 'volSphere' in workspace)
+        writer = StringIO()
+        interp_solve(StringIO('x = y; x = 1; z = 2 * x; w = 0'), writer, outputs=['z', 'x'])
+        self.assertEqual('z=2\nx=1\n', writer.getvalue())
+
+    def test_optimize_dead_stores_3(self):
+        for engine in Interpreter.ENGINES:
+            for parser in (Parser(Scanner('x = 1; y = x')), ScriptCache().parser('x = 1; y = x')):
+                interp = Interpreter(parser, engine, outputs=['y', 'q', 'p'])
+                with self.assertRaises(NameError) as error:
+                    interp.interpret()
+                self.assertEqual("Outputs not assigned by the script: 'p', 'q'", str(error.exception))
+                self.assertEqual({}, interp.workspace)
+            workspace = interp_eval(Parser(Scanner('x = 1; y = x')), engine, workspace=Workspace(q=2),
+                                    outputs=['y', 'q'])
+            self.assertEqual({'q': 2, 'x': 1, 'y': 1}, workspace)
+        writer = StringIO()
+        with self.assertRaises(NameError):
+            interp_solve(StringIO('x = 1; for i = 1:0; y = x; end'), writer, outputs=['y'])
+        self.assertEqual('', writer.getvalue())
+
+    def test_optimize_common_0(self):
+        statements, report = self.optimize('a = PI*r*r + 1; b = PI*r*r*2; c = PI*r; r = 3; d = PI*r*r')
+        self.assertEqual(['$2=PI*r', '$1=$2*r', 'a=$1+1', 'b=$1*2', 'c=$2', 'r=3', 'd=PI*r*r'], statements)
+        self.assertEqual(2, report['subexpression evaluations eliminated'])
+
+    def test_optimize_common_1(self):
+        statements, report = self.optimize('y = x(2) * 2;\nfor i = 1:3\n  x(i) = i;\nend\nz = x(2) * 2 + sqrt(x(2) * 2)')
+        self.assertEqual(['y=x(2)*2', 'for i=1:3;x(i)=i;end', '$1=x(2)*2', 'z=$1+sqrt($1)'], statements)
+        self.assertEqual(1, report['subexpression evaluations eliminated'])
+
+    def test_optimize_common_2(self):
+        script = 'x = [1, 2] * 2; y = [1, 2] * 2; y(1) = 5; z = x(1) + x(1) * (a * b); w = a * b'
+        for engine in Interpreter.ENGINES:
+            interp = Interpreter(Parser(Scanner(script)), engine, True, Workspace(a=2, b=3))
+            interp.interpret()
+            workspace = interp.workspace
+            self.assertEqual(['a', 'b', 'x', 'y', 'z', 'w'], list(workspace))
+            numpy.testing.assert_array_equal([[2, 4]], workspace['x'])
+            numpy.testing.assert_array_equal([[5, 4]], workspace['y'])
+            self.assertEqual((14, 6), (workspace['z'], workspace['w']))
+            self.assertEqual(3, interp.optimizer.report['subexpression evaluations eliminated'])
+        scope = {'a': 1, 'b': 1}
+        Bytecode.compile_source(script, optimize=True).run(scope)
+        self.assertEqual(['a', 'b', 'x', 'y', 'z', 'w'], list(scope))
+
+    def test_optimize_common_profile(self):
+        script = 'x = 3; a = x * 2 + 1; b = x * 2 * 3; c = sqrt(x * 2)'
+        for engine in Interpreter.ENGINES:
+            for cache in (None, ScriptCache()):
+                writer = StringIO()
+                interp = interp_solve(StringIO(script), writer, engine, True, cache, True, ['a', 'b'])
+                self.assertEqual('a=7\nb=18\n', writer.getvalue())
+                self.assertEqual(1, interp.optimizer.report['subexpression evaluations eliminated'])
+                self.assertEqual(['x', 'a', 'b'], list(interp.workspace))
+
+
+class TestMatrix(TestCase):
+
+    def test_matrix_scan(self):
+        tokens = Scanner('[1, x; 2]').tokenize_all()
+        self.assertEqual([LBRACKET, INTEGER, COMMA, ID, SEMI, INTEGER, RBRACKET, EOF],
+                         [token.type for token in tokens])
+
+    def test_matrix_scan_spaces(self):
+        for text in ('[1 -2 x (3)]', b'[1 -2 x (3)]'):
+            tokens = Scanner(text).tokenize_all()
+            self.assertEqual([LBRACKET, INTEGER, COMMA, MINUS, INTEGER, COMMA, ID, COMMA, LPAREN, INTEGER, RPAREN,
+                              RBRACKET, EOF], [token.type for token in tokens])
+            scanner = Scanner(text)
+            self.assertEqual([str(token) for token in tokens], [str(scanner.next_token()) for _ in tokens])
+
+    def test_matrix_parse_spaces(self):
+        text = 'A = [1 2 3; 4 5 6]; B = [1 -2]; C = [1 - 2]; D = [x(1) mod(7, 4) +3]; E = [ 1 2 ]'
+        tree = Parser(Scanner(text)).parse()
+        self.assertEqual(['A=[1,2,3;4,5,6]', 'B=[1,-2]', 'C=[1-2]', 'D=[x(1),mod(7,4),+3]', 'E=[1,2]'],
+                         [get_expr(statement) for statement in tree.statements])
+
+    def test_matrix_parse_0(self):
+        tree = Parser(Scanner('A = [1, 2, 3; 4, 5, 6\n 7, 8, 9]; B = [x, -1; [1, 2]]; C = []')).parse()
+        self.assertEqual(['A=[1,2,3;4,5,6;7,8,9]', 'B=[x,-1;[1,2]]', 'C=[]'],
+                         [get_expr(statement) for statement in tree.statements])
+
+    def test_matrix_parse_1(self):
+        for script in ('A = [1 2', 'A = [1,]', 'A = [1, 2', 'A = [1; 2)', 'A = [1 * ]', 'A = [-]', 'A = [1, 2 +\n]'):
+            with self.assertRaises(Exception):
+                Parser(Scanner(script)).parse()
+
+    def test_matrix_make(self):
+        matrix = make_matrix([[1, 2], [3, 4]])
+        self.assertEqual((2, 2), matrix.shape)
+        self.assertEqual(numpy.float64, matrix.dtype)
+        self.assertEqual((1, 1), make_matrix([[5]]).shape)
+        self.assertEqual((0, 0), make_matrix([]).shape)
+        with self.assertRaises(ValueError):
+            make_matrix([[1, 2], [3]])
+
+    def test_matrix_interpret_0(self):
+        for scope in run_engines('A = [1, 2; 3, 4]; B = [0, 1; 1, 0]; C = A * B; D = A + B - 1'):
+            numpy.testing.assert_array_equal([[2, 1], [4, 3]], scope['C'])
+            numpy.testing.assert_array_equal([[0, 2], [3, 3]], scope['D'])
+
+    def test_matrix_interpret_1(self):
+        for scope in run_engines('A = [1, 2; 3, 4]; x = 2; B = x * A / 2; C = -A * [5]; D = [A, [1; 1]]'):
+            numpy.testing.assert_array_equal([[1, 2], [3, 4]], scope['B'])
+            numpy.testing.assert_array_equal([[-5, -10], [-15, -20]], scope['C'])
+            numpy.testing.assert_array_equal([[1, 2, 1], [3, 4, 1]], scope['D'])
+
+    def test_matrix_interpret_2(self):
+        for scope in run_engines('A = [1, 2; 3, 4]; B = [2, 0; 0, 4]; X = A / B; Y = X * B'):
+            numpy.testing.assert_allclose([[0.5, 0.5], [1.5, 1]], scope['X'])
+            numpy.testing.assert_allclose(scope['A'], scope['Y'])
+
+    def test_matrix_interpret_spaces(self):
+        for scope in run_engines('A = [1 2\n3 4]; x = 2; B = [A [x; -x]]; C = [1 -x]; D = [1 - x]'):
+            numpy.testing.assert_array_equal([[1, 2, 2], [3, 4, -2]], scope['B'])
+            numpy.testing.assert_array_equal([[1, -2]], scope['C'])
+            numpy.testing.assert_array_equal([[-1]], scope['D'])
+
+    def test_matrix_interpret_3(self):
+        for engine in Interpreter.ENGINES:
+            interp = Interpreter(Parser(Scanner('A = [1, 2] * [3, 4]')), engine)
+            interp.GLOBAL_SCOPE = {}
+            with self.assertRaises(ValueError):
+                interp.interpret()
+
+    def test_matrix_elementwise_scan(self):
+        tokens = Scanner('2.*x./1.5.^y^2.').tokenize_all()
+        self.assertEqual([INTEGER, DOTMUL, ID, DOTDIV, FLOAT, DOTPOW, ID, POW, FLOAT, EOF],
+                         [token.type for token in tokens])
+
+    def test_matrix_elementwise_parse(self):
+        tree = Parser(Scanner('a = -2^2; b = 2^3^2; c = 2^-1 * 4; d = [1, 2] .^ 2 ./ 2')).parse()
+        for engine_scope in run_engines('a = -2^2; b = 2^3^2; c = 2^-1 * 4'):
+            self.assertEqual({'a': -4, 'b': 64, 'c': 2.0}, engine_scope)
+        self.assertEqual(POW, tree.statements[0].right.right.token.type)
+        self.assertEqual(POW, tree.statements[1].right.left.token.type)
+        self.assertEqual(DOTDIV, tree.statements[3].right.token.type)
+
+    def test_matrix_elementwise_0(self):
+        script = 'A = [1, 2; 3, 4]; B = A .* A; C = A ./ [2, 4]; D = A .^ 2; E = 2 .^ [1; 2]; F = A ^ 2'
+        for scope in run_engines(script):
+            numpy.testing.assert_array_equal([[1, 4], [9, 16]], scope['B'])
+            numpy.testing.assert_array_equal([[0.5, 0.5], [1.5, 1]], scope['C'])
+            numpy.testing.assert_array_equal([[1, 4], [9, 16]], scope['D'])
+            numpy.testing.assert_array_equal([[2], [4]], scope['E'])
+            numpy.testing.assert_array_equal([[7, 10], [15, 22]], scope['F'])
+
+    def test_matrix_elementwise_1(self):
+        for scope in run_engines('x = 6 ./ 2; y = 3 .* 2.5; z = 2 .^ 10'):
+            self.assertEqual({'x': 3, 'y': 7.5, 'z': 1024}, scope)
+            self.assertIsInstance(scope['x'], int)
+
+    def test_matrix_elementwise_2(self):
+        for script in ('A = [1, 2] ^ 2', 'A = [1, 2; 3, 4] ^ 0.5', 'A = 2 ^ [1, 2]'):
+            with self.assertRaises(ValueError):
+                Interpreter(Parser(Scanner(script)), 'vm').interpret()
+
+    def test_matrix_optimize(self):
+        optimizer = Optimizer()
+        tree = optimizer.optimize(Parser(Scanner('A = [1 + 1, x * 1; -(-y), 2]')).parse())
+        self.assertEqual('A=[2,x;y,2]', get_expr(tree.statements[0]))
+        self.assertEqual(6, optimizer.report['nodes eliminated'])
+
+    def test_matrix_bytecode(self):
+        buffer = BytesIO()
+        Bytecode.compile_source('A = [1, 2; 3, 4]; B = A * A').dump(buffer)
+        buffer.seek(0)
+        scope = {}
+        Bytecode.load(buffer).run(scope)
+        numpy.testing.assert_array_equal([[7, 10], [15, 22]], scope['B'])
+
+
+class TestBuiltins(TestCase):
+
+    def test_builtins_parse_0(self):
+        tree = Parser(Scanner('x = cos(2 * y) + mod(a, -3)')).parse()
+        call = tree.statements[0].right.left
+        self.assertIsInstance(call, Call)
+        self.assertIs(BUILTINS['cos'].function, call.function)
+        self.assertEqual('x=cos(2*y)+mod(a,-3)', get_expr(tree.statements[0]))
+
+    def test_builtins_parse_1(self):
+        for script in ('x = cos()', 'x = cos(1, 2)', 'x = mod(1)', 'x = cos(1,)'):
+            with self.assertRaises(Exception):
+                Parser(Scanner(script)).parse()
+
+    def test_builtins_parse_2(self):
+        call = Parser(Scanner('x = sqrt(2)')).parse().statements[0].right
+        copy = pickle.loads(pickle.dumps(call))
+        self.assertIs(call.function, copy.function)
+        self.assertEqual(2, copy.args[0].token.value)
+
+    def test_builtins_interpret_0(self):
+        script = 'a = abs(-4); b = floor(-2.5); c = round(2.5); d = round(-2.5); e = mod(-7, 3); f = mod(5.5, 0)'
+        for scope in run_engines(script):
+            self.assertEqual({'a': 4, 'b': -3, 'c': 3, 'd': -3, 'e': 2, 'f': 5.5}, scope)
+            self.assertIsInstance(scope['b'], int)
+
+    def test_builtins_interpret_1(self):
+        for scope in run_engines('x = cos(0) + sin(0) * tan(1); y = exp(log(2)); z = sqrt(16) + power(2, -1)'):
+            self.assertEqual(1.0, scope['x'])
+            self.assertAlmostEqual(2, scope['y'])
+            self.assertEqual(4.5, scope['z'])
+            self.assertIs(float, type(scope['x']))
+
+    def test_builtins_interpret_2(self):
+        for scope in run_engines('A = [1, 4; 9, 16]; B = sqrt(A); C = mod(A, [2, 3]); D = power(A, 0.5)'):
+            numpy.testing.assert_array_equal([[1, 2], [3, 4]], scope['B'])
+            numpy.testing.assert_array_equal([[1, 1], [1, 1]], scope['C'])
+            numpy.testing.assert_array_equal(scope['B'], scope['D'])
+
+    def test_builtins_bytecode(self):
+        buffer = BytesIO()
+        Bytecode.compile_source('x = 2; y = mod(x * 5, 3) + cos(0)').dump(buffer)
+        buffer.seek(0)
+        scope = {}
+        Bytecode.load(buffer).run(scope)
+        self.assertEqual({'x': 2, 'y': 2.0}, scope)
+
+    def test_builtins_optimize(self):
+        optimizer = Optimizer()
+        tree = optimizer.optimize(Parser(Scanner('x = sqrt(4) * y + cos(y) + log(0)')).parse())
+        self.assertEqual('x=2.0*y+cos(y)+log(0)', get_expr(tree.statements[0]))
+        self.assertEqual(1, optimizer.report['constants folded'])
+
+
+class TestRange(TestCase):
+
+    def test_range_scan(self):
+        tokens = Scanner('0:0.001:1e6').tokenize_all()
+        self.assertEqual([INTEGER, COLON, FLOAT, COLON, FLOAT, EOF], [token.type for token in tokens])
+        self.assertEqual(1e6, tokens[4].value)
+
+    def test_range_parse(self):
+        tree = Parser(Scanner('a = 1:n+1; b = 0:0.5:2*y; c = [1:3, 5]')).parse()
+        self.assertEqual(['a=1:n+1', 'b=0:0.5:2*y', 'c=[1:3,5]'],
+                         [get_expr(statement) for statement in tree.statements])
+        self.assertIsInstance(tree.statements[0].right, Colon)
+        self.assertIsNone(tree.statements[0].right.step)
+
+    def test_range_0(self):
+        values = Range(1, 1, 5)
+        self.assertEqual(5, len(values))
+        self.assertEqual([1, 2, 3, 4, 5], list(values))
+        self.assertEqual(3, values[2])
+        self.assertEqual(5, values[-1])
+        self.assertEqual(15, values.sum())
+        with self.assertRaises(IndexError):
+            values[5]
+
+    def test_range_1(self):
+        self.assertEqual(0, len(Range(5, 1, 1)))
+        self.assertEqual(0, len(Range(1, 0, 5)))
+        self.assertEqual([5, 3, 1], list(Range(5, -2, 0)))
+        self.assertEqual(11, len(Range(0, 0.1, 1)))
+        self.assertEqual((1, 0), Range(5, 1, 1).array().shape)
+
+    def test_range_2(self):
+        values = Range(0, 0.001, 1e6)
+        self.assertEqual(1000000001, len(values))
+        self.assertEqual(1e6, values.max())
+        self.assertEqual(0, values.min())
+        self.assertAlmostEqual(500000000500000.0, values.sum())
+        self.assertEqual('[[0.00000000e+00 1.00000000e-03 2.00000000e-03 ... 9.99999998e+05\n'
+                         '  9.99999999e+05 1.00000000e+06]]', str(values))
+        for values in (Range(1, 1, 5), Range(-5, -0.5, -1e4), Range(1, 1, 1000), Range(1, 1, 1001)):
+            self.assertEqual(str(values.array()), str(values))
+
+    def test_range_3(self):
+        numpy.testing.assert_array_equal([[2, 4, 6]], Range(1, 1, 3) * 2)
+        numpy.testing.assert_array_equal([[0, -1, -2]], 1 - Range(1, 1, 3))
+        numpy.testing.assert_array_equal([[2, 3, 4]], make_matrix([[1, 1, 1]]) + Range(1, 1, 3))
+        numpy.testing.assert_array_equal([[1, 4, 9]], Range(1, 1, 3) ** 2)
+        self.assertEqual(14, multiply(Range(1, 1, 3), make_matrix([[1], [2], [3]])).item())
+
+    def test_range_interpret_0(self):
+        script = 'r = 1:4; n = length(r); s = sum(r); a = min(5:-1:2); b = max(r); c = numel(1:0); d = sum(1:0)'
+        for scope in run_engines(script):
+            self.assertIsInstance(scope['r'], Range)
+            self.assertEqual([1, 2, 3, 4], list(scope['r']))
+            self.assertEqual((4, 10, 2, 4, 0, 0),
+                             (scope['n'], scope['s'], scope['a'], scope['b'], scope['c'], scope['d']))
+
+    def test_range_interpret_1(self):
+        for scope in run_engines('x = (1:3) .* 2 + 1; y = [0:2; 3:5]; z = sqrt((0:2:4) .^ 2); w = (1:3) * [1; 1; 1]'):
+            numpy.testing.assert_array_equal([[3, 5, 7]], scope['x'])
+            numpy.testing.assert_array_equal([[0, 1, 2], [3, 4, 5]], scope['y'])
+            numpy.testing.assert_array_equal([[0, 2, 4]], scope['z'])
+            self.assertEqual([[6]], scope['w'].tolist())
+
+    def test_range_interpret_2(self):
+        for scope in run_engines('y = sum([1, 2; 3, 4]); m = max([1, 5; 7, 2]); v = sum([1, 2, 3])'):
+            numpy.testing.assert_array_equal([[4, 6]], scope['y'])
+            numpy.testing.assert_array_equal([[7, 5]], scope['m'])
+            self.assertEqual(6, scope['v'])
+
+    def test_range_interpret_3(self):
+        interp = Interpreter(Parser(Scanner('x = [1, 2]:3')), 'closure')
+        with self.assertRaises(ValueError):
+            interp.interpret()
+
+
+class TestLoops(TestCase):
+
+    def test_loops_scan(self):
+        tokens = Scanner('for i = 1:3 while x <= 2 == y ~= z >= 1 < 2 > 0 end').tokenize_all()
+        self.assertEqual([FOR, ID, ASSIGN, INTEGER, COLON, INTEGER, WHILE, ID, LE, INTEGER, EQ, ID, NE, ID,
+                          GE, INTEGER, LT, INTEGER, GT, INTEGER, END, EOF], [token.type for token in tokens])
+
+    def test_loops_parse_0(self):
+        tree = Parser(Scanner('for i = 1:3, x = x + i; end\nwhile x > 1\n  x = x / 2\nend\n')).parse()
+        self.assertEqual(['for i=1:3;x=x+i;end', 'while x>1;x=x/2;end'],
+                         [get_expr(statement) for statement in tree.statements[:2]])
+        self.assertIsInstance(tree.statements[0], For)
+        self.assertIsInstance(tree.statements[1], While)
+
+    def test_loops_parse_1(self):
+        for script in ('for i = 1:3 x = 1', 'end', 'for = 3', 'end = 1', 'x = 1 for i = 1:2 end', 'while end'):
+            with self.assertRaises(Exception):
+                Parser(Scanner(script)).parse()
+
+    def test_loops_interpret_0(self):
+        script = 'total = 0; for i = 1:10; total = total + i * i; end; n = 0; x = 100; while x > 1; x = x / 2; n = n + 1; end'
+        for scope in run_engines(script):
+            self.assertEqual({'total': 385, 'i': 10, 'n': 7, 'x': 0.78125}, scope)
+
+    def test_loops_interpret_1(self):
+        script = 'f = 1; k = 5; while k >= 1, f = f * k; k = k - 1; end; for j = 1:3, for k = 1:j, f = f + 1; end, end'
+        for scope in run_engines(script):
+            self.assertEqual({'f': 126, 'k': 3, 'j': 3}, scope)
+
+    def test_loops_interpret_2(self):
+        for scope in run_engines('s = 0; for c = [1, 2; 3, 4]; s = s + c; end; t = 0; for v = [5, 6]; t = t + v; end'):
+            numpy.testing.assert_array_equal([[3], [7]], scope['s'])
+            self.assertEqual(11, scope['t'])
+
+    def test_loops_interpret_3(self):
+        for engine in Interpreter.ENGINES:
+            interp = Interpreter(Parser(Scanner('for k = 1:0, never = 1; end; y = never')), engine)
+            interp.GLOBAL_SCOPE = {}
+            with self.assertRaises(NameError):
+                interp.interpret()
+            self.assertNotIn('k', interp.GLOBAL_SCOPE)
+
+    def test_loops_interpret_4(self):
+        script = 'a = 1 < 2; b = 2 == 3; c = [1, 2, 3] >= 2; n = 0; while [1, 1] ~= [n, 0]; n = n + 1; end'
+        for scope in run_engines(script):
+            self.assertEqual((1, 0, 1), (scope['a'], scope['b'], scope['n']))
+            numpy.testing.assert_array_equal([[0, 1, 1]], scope['c'])
+
+    def test_loops_bytecode(self):
+        buffer = BytesIO()
+        Bytecode.compile_source('x = 0; for i = 1:4; x = x + i; end; while x < 100; x = x * 2; end').dump(buffer)
+        buffer.seek(0)
+        scope = {}
+        Bytecode.load(buffer).run(scope)
+        self.assertEqual({'x': 160, 'i': 4}, scope)
+
+    def test_loops_optimize(self):
+        optimizer = Optimizer()
+        tree = optimizer.optimize(Parser(Scanner('for i = 1:2 * 3; x = i * 1; end; while 1 < 0; end')).parse())
+        self.assertEqual(['for i=1:6;x=i;end', 'while 0;end'],
+                         [get_expr(statement) for statement in tree.statements[:2]])
+        self.assertEqual(6, optimizer.report['nodes eliminated'])
+
+
+class TestCache(TestCase):
+
+    def run_cached(self, cache, script, engine='tree', optimize=False):
+        interp = Interpreter(interp_read(script, cache), engine, optimize)
+        interp.GLOBAL_SCOPE = {}
+        interp.interpret()
+        return interp
+
+    def test_cache_0(self):
+        cache = ScriptCache()
+        first = cache.lookup('x = 1')
+        self.assertIs(first, cache.lookup('x = 1'))
+        self.assertIsNot(first, cache.lookup('x = 2'))
+        self.assertEqual({'size': 2, 'hits': 1, 'misses': 2, 'evictions': 0, 'disk_hits': 0},
+                         cache.stats())
+
+    def test_cache_1(self):
+        cache = ScriptCache(size=2)
+        cache.lookup('a = 1')
+        cache.lookup('b = 2')
+        cache.lookup('a = 1')
+        cache.lookup('c = 3')
+        self.assertEqual(2, len(cache))
+        self.assertEqual(1, cache.evictions)
+        cache.lookup('a = 1')
+        self.assertEqual(2, cache.hits)
+        cache.lookup('b = 2')
+        self.assertEqual(4, cache.misses)
+
+    def test_cache_2(self):
+        with self.assertRaises(Exception):
+            ScriptCache().lookup('x = 1 +')
+        with self.assertRaises(ValueError):
+            ScriptCache(size=0)
+
+    def test_cache_3(self):
+        cache = ScriptCache()
+        with open('RunInterpreter.in') as script:
+            text = script.read()
+        for engine in Interpreter.ENGINES:
+            for _ in range(2):
+                interp = self.run_cached(cache, text, engine)
+                self.assertEqual(3052.08, interp.GLOBAL_SCOPE['volSphere'])
+        self.assertEqual(1, cache.misses)
+        self.assertEqual(5, cache.hits)
+
+    def test_cache_4(self):
+        cache = ScriptCache()
+        script = cache.lookup('x = 2; y = x * 3')
+        compiled = script.compiled('closure', False, Interpreter(None, 'closure').compile)
+        self.assertIs(compiled, script.compiled('closure', False, None))
+        interp = self.run_cached(cache, 'x = 2; y = x * 3', 'closure')
+        self.assertEqual({'x': 2, 'y': 6}, interp.GLOBAL_SCOPE)
+
+    def test_cache_5(self):
+        cache = ScriptCache()
+        for _ in range(2):
+            interp = self.run_cached(cache, 'x = 2 * 3 + 0', 'vm', optimize=True)
+            self.assertEqual({'x': 6}, interp.GLOBAL_SCOPE)
+            self.assertEqual(2, interp.optimizer.report['constants folded'])
+        self.assertEqual(['x=2*3+0'], [get_expr(s) for s in cache.lookup('x = 2 * 3 + 0').tree().statements])
+
+    def test_cache_6(self):
+        with TemporaryDirectory() as directory:
+            ScriptCache(directory=directory).lookup('x = 4 / 2')
+            self.assertEqual(1, len(os.listdir(directory)))
+            cache = ScriptCache(directory=directory)
+            interp = self.run_cached(cache, 'x = 4 / 2')
+            self.assertEqual({'x': 2}, interp.GLOBAL_SCOPE)
+            self.assertEqual(1, cache.disk_hits)
+
+    def test_cache_stale(self):
+        with TemporaryDirectory() as directory:
+            ScriptCache(directory=directory).lookup('x = 4 / 2')
+            path = os.path.join(directory, os.listdir(directory)[0])
+            self.assertTrue(path.endswith('.v{}.ast'.format(Cache.FORMAT_VERSION)))
+            for stale in (b'', b'not a pickle', b'cParser\nNoSuchNode\n.', b'cNoSuchModule\nNode\n.',
+                          pickle.dumps([1, 2]), pickle.dumps(Compound())[:-3]):
+                with open(path, 'wb') as stale_file:
+                    stale_file.write(stale)
+                cache = ScriptCache(directory=directory)
+                self.assertEqual({'x': 2}, self.run_cached(cache, 'x = 4 / 2').GLOBAL_SCOPE)
+                self.assertEqual(0, cache.disk_hits)
+                cache = ScriptCache(directory=directory)
+                self.assertEqual({'x': 2}, self.run_cached(cache, 'x = 4 / 2').GLOBAL_SCOPE)
+                self.assertEqual(1, cache.disk_hits)
+
+    def test_cache_reports(self):
+        cache = ScriptCache()
+        text = 'x = 1; y = x * 2; z = 3'
+        reports = {}
+        for outputs in (['y'], None, ['y'], None):
+            interp = Interpreter(cache.parser(text), 'vm', True, outputs=outputs)
+            interp.interpret()
+            reports.setdefault(str(outputs), []).append(dict(interp.optimizer.report))
+        self.assertEqual(1, reports["['y']"][0]['dead stores eliminated'])
+        self.assertEqual(0, reports['None'][0]['dead stores eliminated'])
+        for variant in reports.values():
+            self.assertEqual(variant[0], variant[1])
+
+    def test_cache_concurrent(self):
+        loading, loaded = Event(), Event()
+
+        class SlowCache(ScriptCache):
+            def _load(self, digest):
+                loading.set()
+                loaded.wait(5)
+                return None
+
+        cache = SlowCache()
+        loaded.set()
+        cached = cache.lookup('y = 2')
+        loading.clear()
+        loaded.clear()
+        with ThreadPoolExecutor(4) as executor:
+            futures = [executor.submit(cache.lookup, 'x = 1')]
+            self.assertTrue(loading.wait(5))
+            futures.extend(executor.submit(cache.lookup, 'x = 1') for _ in range(3))
+            # the slow miss does not keep other scripts waiting
+            self.assertIs(cached, cache.lookup('y = 2'))
+            self.assertFalse(any(future.done() for future in futures))
+            loaded.set()
+            scripts = [future.result(5) for future in futures]
+        self.assertTrue(all(script is scripts[0] for script in scripts))
+        self.assertEqual(2, cache.misses)
+        self.assertEqual(4, cache.hits)
+
+    def test_cache_concurrent_error(self):
+        cache = ScriptCache()
+        with ThreadPoolExecutor(4) as executor:
+            futures = [executor.submit(cache.lookup, 'x = 1 +') for _ in range(4)]
+            for future in futures:
+                with self.assertRaises(Exception):
+                    future.result(5)
+        self.assertEqual(0, len(cache))
+        self.assertEqual({'x': 1}, self.run_cached(cache, 'x = 1').GLOBAL_SCOPE)
+
+    def test_cache_solve(self):
+        cache = ScriptCache()
+        writer = StringIO()
+        interp_solve(StringIO('a = 1\nb = a + 1\n'), writer, 'closure', cache=cache)
+        self.assertEqual('a=1\nb=2\n', writer.getvalue())
+        self.assertEqual(1, cache.misses)
+
+# ------------
+# TestIndexing
+# ------------
+
+
+class TestIndexing(TestCase):
+
+    def test_indexing_parse_0(self):
+        tree = Parser(Scanner('x(2) = y(1, k + 1); sum = 2; s = sum(1); c = cos(x(2))')).parse()
+        self.assertEqual(['x(2)=y(1,k+1)', 'sum=2', 's=sum(1)', 'c=cos(x(2))'],
+                         [get_expr(statement) for statement in tree.statements])
+        self.assertIsInstance(tree.statements[0].left, Index)
+        self.assertIsInstance(tree.statements[2].right, Index)
+        self.assertIsInstance(tree.statements[3].right, Call)
+
+    def test_indexing_parse_1(self):
+        for script in ('x(1 = 2', 'x(1)(2) = 3', 'x = y(1,)'):
+            with self.assertRaises(Exception):
+                Parser(Scanner(script)).parse()
+
+    def test_indexing_interpret_0(self):
+        script = 'A = [1, 2, 3; 4, 5, 6]; a = A(2, 3); b = A(4); c = A(2, 2:3); d = A(1:2:5); r = 2:2:10; e = r(3)'
+        for scope in run_engines(script):
+            self.assertEqual((6, 5, 6), (scope['a'], scope['b'], scope['e']))
+            numpy.testing.assert_array_equal([[5, 6]], scope['c'])
+            numpy.testing.assert_array_equal([[1, 2, 3]], scope['d'])
+
+    def test_indexing_interpret_1(self):
+        script = 'x(3) = 1; A = zeros(2); A(2, 3) = 7; c = ones(2, 1); c(4) = 2; r = 1:3; r(2) = 0'
+        for scope in run_engines(script):
+            numpy.testing.assert_array_equal([[0, 0, 1]], scope['x'])
+            numpy.testing.assert_array_equal([[0, 0, 0], [0, 0, 7]], scope['A'])
+            numpy.testing.assert_array_equal([[1], [1], [0], [2]], scope['c'])
+            numpy.testing.assert_array_equal([[1, 0, 3]], scope['r'])
+
+    def test_indexing_interpret_2(self):
+        for scope in run_engines('x = [1, 2]; y = x; y(1) = 5; z = +y; z(2) = 6'):
+            numpy.testing.assert_array_equal([[1, 2]], scope['x'])
+            numpy.testing.assert_array_equal([[5, 2]], scope['y'])
+            numpy.testing.assert_array_equal([[5, 6]], scope['z'])
+
+    def test_indexing_interpret_3(self):
+        for script, error in (('x = [1, 2]; y = x(3)', IndexError), ('x = [1, 2]; y = x(0)', IndexError),
+                              ('x = [1, 2]; y = x(1.5)', IndexError), ('A = zeros(2); A(5) = 1', IndexError),
+                              ('x = [1, 2]; x(1) = [3, 4]', ValueError), ('y = foo(1)', NameError)):
+            for engine in Interpreter.ENGINES:
+                interp = Interpreter(Parser(Scanner(script)), engine)
+                interp.GLOBAL_SCOPE = {}
+                with self.assertRaises(error):
+                    interp.interpret()
+
+    def test_indexing_grow(self):
+        for scope in run_engines('for i = 1:100; x(i) = i; end; y = x; y(101) = 0'):
+            self.assertEqual((1, 100), scope['x'].shape)
+            self.assertEqual(5050, scope['x'].sum())
+            self.assertEqual((1, 101), scope['y'].shape)
+
+    def test_indexing_bytecode(self):
+        buffer = BytesIO()
+        Bytecode.compile_source('x = [1, 2]; y = x; y(2) = 3; z = y(2) + x(2)').dump(buffer)
+        buffer.seek(0)
+        scope = {}
+        Bytecode.load(buffer).run(scope)
+        numpy.testing.assert_array_equal([[1, 3]], scope['y'])
+        self.assertEqual(5, scope['z'])
+
+# --------------
+# TestVectorizer
+# --------------
+
+
+class TestVectorizer(TestCase):
+
+    def optimize(self, script):
+        optimizer = Optimizer()
+        tree = optimizer.optimize(Parser(Scanner(script)).parse())
+        return tree, optimizer
+
+    def assert_scopes_equal(self, scopes):
+        for scope in scopes[1:]:
+            self.assertEqual(sorted(scopes[0]), sorted(scope))
+            for name in scope:
+                numpy.testing.assert_array_equal(scopes[0][name], scope[name])
+
+    def test_vectorizer_0(self):
+        tree, optimizer = self.optimize('for i = 1:n; y(i) = a * x(i) + b; z(i) = y(i) ^ 2 / i; end')
+        self.assertIsInstance(tree.statements[0], Vectorized)
+        self.assertEqual('for i=1:n;y(i)=a*x(i)+b;z(i)=y(i)^2/i;end', get_expr(tree.statements[0]))
+        self.assertEqual(1, optimizer.report['loops vectorized'])
+        self.assertEqual(['for i=1:n: vectorized'], optimizer.loops)
+
+    def test_vectorizer_1(self):
+        script = ('for i = 2:n; y(i) = y(i - 1); end\n'
+                  'for i = 1:n; y(i) = sum(y); end\n'
+                  'for i = 1:n; t = t + i; end\n'
+                  'for i = 1:n; y(2) = i; end\n'
+                  'for i = 1:n; y(i) = sum(x(i)); end\n'
+                  'for i = 1:length(y); y(i) = 1; end\n'
+                  'for i = x; y(i) = 1; end')
+        tree, optimizer = self.optimize(script)
+        self.assertNotIn(Vectorized, [type(statement) for statement in tree.statements])
+        self.assertEqual(['for i=2:n: not vectorized, y(i-1) reads another iteration',
+                          'for i=1:n: not vectorized, y is read as a whole',
+                          'for i=1:n: not vectorized, t=t+i is not an indexed assignment',
+                          'for i=1:n: not vectorized, y(2) is not the element at i',
+                          'for i=1:n: not vectorized, sum(x(i)) is not element-wise',
+                          'for i=1:length(y): not vectorized, its range depends on its body',
+                          'for i=x: not vectorized, it does not iterate over a colon expression'],
+                         optimizer.loops)
+
+    def test_vectorizer_interpret_0(self):
+        script = ('n = 50; a = 2; b = -1; x = 1:n; y = zeros(1, 3);\n'
+                  'for i = 1:n\n  y(i) = a * x(i) + b;\n  z(i) = mod(y(i), 7) > 3;\nend\n'
+                  'for k = 1:2:9; w(k) = sqrt(k) ./ (k + 1); end')
+        scopes = run_engines(script, (False, True))
+        self.assert_scopes_equal(scopes)
+        numpy.testing.assert_array_equal(2 * numpy.arange(1, 51) - 1, scopes[-1]['y'][0])
+        self.assertEqual(9, scopes[-1]['k'])
+
+    def test_vectorizer_interpret_1(self):
+        # the array expressions fail or differ from the loop: the loop runs instead
+        scopes = run_engines('x = [1; 2; 3]; for i = 1:3; y(i) = x(i) + i; end', (False, True))
+        self.assert_scopes_equal(scopes)
+        numpy.testing.assert_array_equal([[2, 4, 6]], scopes[-1]['y'])
+        for script, error, last in (('x = [1, 0]; for i = 1:2; y(i) = 1 / x(i); end', ZeroDivisionError, 2),
+                                    ('a = [1, 2, 3]; for i = 1:3; y(i) = a * i; end', ValueError, 1)):
+            for optimize in (False, True):
+                interp = Interpreter(Parser(Scanner(script)), 'tree', optimize)
+                interp.GLOBAL_SCOPE = {}
+                with self.assertRaises(error):
+                    interp.interpret()
+                self.assertEqual(last, interp.GLOBAL_SCOPE['i'])
+
+# ---------
+# TestBatch
+# ---------
+
+
+class TestBatch(TestCase):
+
+    def run_rows(self, script, columns):
+        rows = []
+        for values in zip(*columns.values()):
+            interp = Interpreter(Parser(Scanner(script)))
+            interp.GLOBAL_SCOPE = dict(zip(columns, values))
+            interp.interpret()
+            rows.append(interp.GLOBAL_SCOPE)
+        return rows
+
+    def test_batch_0(self):
+        script = 'PI = 3.14; area = PI * r ^ 2; v = 4/3*PI*r*r*h - mod(h, 3) / r; c = cos(r) > 0'
+        columns = {'r': [0.5, 2, 9, 1e3], 'h': [1, 2.5, 7, -3]}
+        table = interp_eval_batch(script, columns)
+        self.assertEqual(['r', 'h', 'PI', 'area', 'v', 'c'], list(table))
+        for index, row in enumerate(self.run_rows(script, columns)):
+            for name, value in row.items():
+                self.assertAlmostEqual(value, table[name][index])
+
+    def test_batch_1(self):
+        with open('RunInterpreter.in') as script_file:
+            table = interp_eval_batch(script_file.read(), {'r': [2.5, 9], 's': [4, 3], 'h': [10, 1]})
+        numpy.testing.assert_array_equal([16, 9], table['areaSquare'])
+        numpy.testing.assert_array_equal([25, 2.5], table['areaRect'])
+        numpy.testing.assert_array_almost_equal([4 / 3 * 3.14 * 2.5 ** 3, 4 / 3 * 3.14 * 9 ** 3], table['volSphere'])
+        numpy.testing.assert_array_equal([15.625, 15.625], table['volCube'])
+
+    def test_batch_2(self):
+        table = interp_eval_batch('y = 1 / x; z = sqrt(x - 1)', {'x': [0, 2]})
+        numpy.testing.assert_array_equal([numpy.inf, 0.5], table['y'])
+        self.assertTrue(numpy.isnan(table['z'][0]))
+
+    def test_batch_3(self):
+        for script, columns in (('y = x', {'x': [1, 2], 'z': [1]}), ('y = x', {'x': [[1, 2]]}),
+                                ('y = [x, 1]', {'x': [1]}), ('y = sum(x)', {'x': [1]}),
+                                ('for i = 1:2; y = x; end', {'x': [1]}), ('y = x(1)', {'x': [1]}),
+                                ('y = z', {'x': [1]})):
+            with self.assertRaises(Exception):
+                interp_eval_batch(script, columns)
+
+# -------------------
+# TestDeepExpressions
+# -------------------
+
+
+class TestDeepExpressions(TestCase):
+
+    def run_deep(self, script, expected):
+        for engine in Interpreter.ENGINES:
+            for optimize in (False, True):
+                self.assertEqual(expected, interp_eval(Parser(Scanner(script)), engine, optimize)['x'])
+
+    def test_deep_parentheses(self):
+        self.run_deep('a = 1;\nx = {}a{};'.format('(' * 10000, ' + 1)' * 10000), 10001)
+        self.run_deep('x = {}2{};'.format('(' * 10000, ')' * 10000), 2)
+
+    def test_deep_chain(self):
+        self.run_deep('a = 2; b = 1;\nx = {};'.format(' + '.join(['a - b'] * 10000)), 10000)
+        self.run_deep('x = 1{}'.format(' * 1' * 10000), 1)
+
+    def test_deep_loop(self):
+        self.run_deep('x = 0;\nfor i = 1:3; x = x{}; end'.format(' + i' * 20000), 120000)
+        self.run_deep('x = 0;\nwhile x < 3; x = x{}; end'.format(' + 1 - 1' * 10000 + ' + 1'), 3)
+        self.run_deep('for i = 1:3; y(i) = i{}; end\nx = y(3);'.format(' + i' * 20000), 60003)
+
+    def test_deep_cache(self):
+        script = 'a = 1;\nx = a{};'.format(' + a' * 20000)
+        with TemporaryDirectory() as directory:
+            ScriptCache(directory=directory).lookup(script)
+            cache = ScriptCache(directory=directory)
+            for engine in Interpreter.ENGINES:
+                self.assertEqual(20001, interp_eval(cache.parser(script), engine)['x'])
+            self.assertEqual(1, cache.disk_hits)
+
+    def test_deep_nested(self):
+        self.run_deep('x = {}1{}'.format('1 + (' * 10000, ')' * 10000), 10001)
+        self.run_deep('x = {}2'.format('-' * 10001), -2)
+        self.run_deep('x = {}1{}'.format('mod(7, ' * 100, ')' * 100), 7)
+        tree = Parser(Scanner('x = [{}1{}]'.format('mod(7, [' * 10000, '])' * 10000))).parse()
+        self.assertEqual(10000, get_expr(tree.statements[0]).count('('))
+
+    def test_deep_calls(self):
+        self.run_deep('a = -1;\nx = {}a{};'.format('abs(' * 3000, ')' * 3000), 1)
+        self.run_deep('x = {}1{} + 1;'.format('mod(7, ' * 3000, ')' * 3000), 8)
+        self.run_deep('a = 1;\nx = {}a{};'.format('max([1, ' * 3000, '])' * 3000), 1)
+        self.run_deep('y = [1, 2];\nx = {}1{};'.format('y(' * 3000, ')' * 3000), 1)
+        self.run_deep('y = [1, 2];\nx = sum({}1{});'.format('[' * 3000, ']' * 3000), 1)
+        self.run_deep('for i = 1:3; y(i) = {}i{}; end\nx = y(3);'.format('abs(-' * 3000, ')' * 3000), 3)
+        self.run_deep('y = 0;\nfor i = 1:3; y = y + {}i{}; end\nx = y;'.format('sqrt(' * 3000, ' ^ 2)' * 3000), 6)
+
+    def test_deep_get_expr(self):
+        tree = Parser(Scanner('x = {}1{}'.format('(2 * ' * 10000, ')' * 10000))).parse()
+        self.assertEqual('x=' + '2*' * 10000 + '1', get_expr(tree.statements[0]))
+
+    def test_deep_precedence(self):
+        for script, expected in (('x = 2^-3^2', (2 ** -3) ** 2), ('x = -2^2', -4), ('x = 2^(-1^2)', 0.5),
+                                 ('x = 2 * -3 ^ 2', -18), ('x = 1 - 2 - 3', -4), ('x = 2 ^ 3 ^ 2', 64),
+                                 ('x = sum(1:2:7 > 4)', 2), ('x = sum(-1:2)', 2), ('x = 1:2 < 3', None)):
+            workspace = interp_eval(Parser(Scanner(script)))
+            if expected is not None:
+                self.assertEqual(expected, workspace['x'])
+        for script in ('x = (1', 'x = [1, 2', 'x = 1:2:3:4', 'x = y(1,', 'x = (1, 2)', 'x = [1,,2]', 'x = -',
+                       'x = sum(1, 2)', 'x = 1 2'):
+            with self.assertRaises(Exception):
+                Parser(Scanner(script)).parse()
+
+# -------------
+# TestWorkspace
+# -------------
+
+
+class TestWorkspace(TestCase):
+
+    def test_workspace_0(self):
+        first = Interpreter(Parser(Scanner('x = 1')))
+        second = Interpreter(Parser(Scanner('y = 2')))
+        first.interpret()
+        second.interpret()
+        self.assertEqual({'x': 1}, first.workspace)
+        self.assertEqual({'y': 2}, second.workspace)
+        self.assertIs(first.workspace, first.GLOBAL_SCOPE)
+        self.assertIsNot(interp_eval(Parser(Scanner('x = 1'))), interp_eval(Parser(Scanner('x = 1'))))
+
+    def test_workspace_1(self):
+        workspace = Workspace()
+        for engine in Interpreter.ENGINES:
+            interp_eval(Parser(Scanner('x = 2')), engine, workspace=workspace)
+            interp_eval(Parser(Scanner('x = x * 3')), engine, workspace=workspace)
+        self.assertEqual({'x': 6}, workspace)
+
+    def test_workspace_shadowed(self):
+        for engine in Interpreter.ENGINES:
+            workspace = Workspace()
+            interp_eval(Parser(Scanner('max = [5, 7];')), engine, workspace=workspace)
+            self.assertEqual(7, interp_eval(Parser(Scanner('y = max(2);')), engine, workspace=workspace)['y'])
+        cache = ScriptCache()
+        self.assertEqual(2, interp_eval(interp_read('y = max(2);', cache))['y'])
+        workspace = Workspace(max=numpy.array([[5, 7]]), x=1)
+        for optimize in (False, True):
+            parser = interp_read('y = max(2);', cache, workspace)
+            self.assertEqual(7, interp_eval(parser, optimize=optimize, workspace=workspace)['y'])
+        self.assertEqual(2, interp_eval(interp_read('y = max(2);', cache, {'x': 1}))['y'])
+        self.assertEqual((2, 2), (cache.misses, cache.hits))
+
+    def test_workspace_many_0(self):
+        scripts = ['x = {0}; y = x * 2; z = 0;\nfor i = 1:x\n  z = z + i;\nend'.format(index)
+                   for index in range(200)]
+        for engine in Interpreter.ENGINES:
+            cache = ScriptCache(size=256)
+            workspaces = interp_eval_many(scripts + scripts, engine, optimize=True, workers=8, cache=cache)
+            self.assertEqual(400, len(workspaces))
+            for index, workspace in enumerate(workspaces):
+                index %= 200
+                self.assertEqual(index * 2, workspace['y'])
+                self.assertEqual(index * (index + 1) // 2, workspace['z'])
+            self.assertEqual(200, cache.misses)
+            self.assertEqual(200, cache.hits)
+
+    def test_workspace_many_1(self):
+        with self.assertRaises(NameError):
+            interp_eval_many(['x = 1', 'y = z'], workers=2)
+
+    def test_workspace_threads(self):
+        cache = ScriptCache()
+        script = 'for i = 1:n\n  y(i) = i * 2 + n;\nend'
+
+        def run(n):
+            workspace = Workspace(n=n)
+            Interpreter(cache.parser(script), 'closure', True, workspace).interpret()
+            return workspace
+
+        interval = sys.getswitchinterval()
+        sys.setswitchinterval(1e-6)
+        try:
+            with ThreadPoolExecutor(8) as executor:
+                workspaces = list(executor.map(run, [100 + index % 50 for index in range(400)]))
+        finally:
+            sys.setswitchinterval(interval)
+        for workspace in workspaces:
+            n = workspace['n']
+            numpy.testing.assert_array_equal([2 * i + n for i in range(1, n + 1)], workspace['y'].ravel())
+            self.assertEqual(n, workspace['i'])
+        self.assertEqual(1, len(cache.lookup(script).optimized(True)[2]))
+
+# ------------
+# TestProfiler
+# ------------
+
+
+class TestProfiler(TestCase):
+
+    def test_profiler_0(self):
+        interp = Interpreter(Parser(Scanner('x = 1; y = x + x * 2')), profile=True)
+        interp.interpret()
+        self.assertEqual({'x': 1, 'y': 3}, interp.workspace)
+        profile = interp.profiler.to_json()
+        calls = {entry['type']: entry['calls'] for entry in profile['nodes']}
+        self.assertEqual({'Assign': 2, 'BinaryOp': 1, 'Var': 2, 'Num': 2}, calls)
+        self.assertEqual(['#1 x=1', '#2 y=x+x*2'], sorted(entry['statement'] for entry in profile['statements']))
+        variables = {entry['variable']: (entry['reads'], entry['writes']) for entry in profile['variables']}
+        self.assertEqual({'x': (2, 1), 'y': (0, 1)}, variables)
+
+    def test_profiler_1(self):
+        script = 'x = 0;\nfor i = 1:10\n  x = x + i;\nend\ny = x * 2'
+        for engine in Interpreter.ENGINES:
+            interp = Interpreter(Parser(Scanner(script)), engine, True, profile=True)
+            interp.interpret()
+            self.assertEqual({'x': 55, 'i': 10, 'y': 110}, interp.workspace)
+            statements = interp.profiler.to_json()['statements']
+            self.assertEqual(3, len(statements))
+            self.assertIn('for i=1:10;x=x+i;end', [entry['statement'][3:] for entry in statements])
+            self.assertEqual(engine == 'tree', bool(interp.profiler.nodes))
+
+    def test_profiler_2(self):
+        interp = Interpreter(Parser(Scanner('x = 1')))
+        self.assertIsNone(interp.profiler)
+        self.assertNotIn('visit', vars(interp))
+
+    def test_profiler_cache(self):
+        cache = ScriptCache()
+        for _ in range(2):
+            interp = Interpreter(cache.parser('x = 2; y = +x * 1'), 'closure', True, profile=True)
+            interp.interpret()
+            self.assertEqual({'x': 2, 'y': 2}, interp.workspace)
+            self.assertEqual(['#1 x=2', '#2 y=x'], [entry[0] for entry in interp.profiler.statements])
+        self.assertEqual('y=+x*1', get_expr(cache.lookup('x = 2; y = +x * 1').tree().statements[1]))
+
+    def test_profiler_temporaries(self):
+        interp = Interpreter(Parser(Scanner('r = 2; a = r * r + 1; b = r * r * 2')), 'tree', True, profile=True)
+        interp.interpret()
+        self.assertEqual({'r': 2, 'a': 5, 'b': 8}, interp.workspace)
+        self.assertEqual(1, interp.optimizer.report['subexpression evaluations eliminated'])
+        profile = interp.profiler.to_json()
+        variables = {entry['variable']: (entry['reads'], entry['writes']) for entry in profile['variables']}
+        self.assertEqual({'r': (2, 1), 'a': (0, 1), 'b': (0, 1)}, variables)
+
+    def test_profiler_report(self):
+        writer = StringIO()
+        interp = interp_solve(StringIO('a = 1\nb = a + 1\n'), writer, 'vm', profile=True)
+        self.assertEqual('a=1\nb=2\n', writer.getvalue())
+        report = interp.profiler.report()
+        self.assertIn('#2 b=a+1', report)
+        self.assertNotIn(' node', report)
+
+# ---------------
+# TestBatchRunner
+# ---------------
+
+
+class TestBatchRunner(TestCase):
+
+    def write(self, path, text):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as script_file:
+            script_file.write(text)
+
+    def read(self, path):
+        with open(path) as out_file:
+            return out_file.read()
+
+    def test_batch_runner_0(self):
+        with TemporaryDirectory() as directory:
+            scripts = os.path.join(directory, 'scripts')
+            for index in range(6):
+                self.write(os.path.join(scripts, 'script{}.m'.format(index)), 'x = {0}; y = x * {0}'.format(index))
+            self.write(os.path.join(scripts, 'notes.txt'), 'x = 1')
+            out_dir = os.path.join(directory, 'out')
+            report = run_batch(scripts, out_dir, workers=2)
+            self.assertEqual(6, len(report.results))
+            self.assertEqual([], report.failures)
+            for index in range(6):
+                interp = Interpreter(Parser(Scanner('x = {0}; y = x * {0}'.format(index))))
+                interp.GLOBAL_SCOPE = {}
+                interp.interpret()
+                writer = StringIO()
+                interp_print(writer, interp.GLOBAL_SCOPE)
+                self.assertEqual(writer.getvalue(), self.read(os.path.join(out_dir, 'script{}.out'.format(index))))
+            self.assertFalse(os.path.exists(os.path.join(out_dir, 'notes.out')))
+            self.assertIn('ran 6 scripts (0 failed, 0 cached)', report.summary())
+
+    def test_batch_runner_1(self):
+        with TemporaryDirectory() as directory:
+            self.write(os.path.join(directory, 'a', 'ok.m'), 'x = 1:3; y = sum(x)')
+            self.write(os.path.join(directory, 'b', 'bad.m'), 'x = 1; y = z')
+            manifest = os.path.join(directory, 'manifest.txt')
+            self.write(manifest, '# scripts\na/ok.m\n\nb/bad.m\na/ok.m\n')
+            self.assertEqual([os.path.join(directory, 'a', 'ok.m'), os.path.join(directory, 'b', 'bad.m'),
+                              os.path.join(directory, 'a', 'ok.m')], find_scripts(manifest))
+            out_dir = os.path.join(directory, 'out')
+            report = run_batch(manifest, out_dir, workers=1, engine='vm', optimize=True)
+            self.assertEqual('x=[[1. 2. 3.]]\ny=6\n', self.read(os.path.join(out_dir, 'a', 'ok.out')))
+            self.assertFalse(os.path.exists(os.path.join(out_dir, 'b', 'bad.out')))
+            self.assertEqual([os.path.join(directory, 'b', 'bad.m')], [script for script, _ in report.failures])
+            self.assertIn('ran 3 scripts (1 failed, 1 cached)', report.summary())
+
+    def test_batch_runner_collisions(self):
+        with TemporaryDirectory() as directory:
+            self.write(os.path.join(directory, 'a', 'run.m'), 'x = 1')
+            self.write(os.path.join(directory, 'b', 'run.m'), 'x = 2')
+            self.write(os.path.join(directory, 'manifests', 'run.m'), 'x = 3')
+            out_dir = os.path.join(directory, 'out')
+            manifest = os.path.join(directory, 'manifest.txt')
+            self.write(manifest, 'a/run.m\nb/run.m\n')
+            run_batch(manifest, out_dir, workers=1)
+            self.assertEqual('x=1\n', self.read(os.path.join(out_dir, 'a', 'run.out')))
+            self.assertEqual('x=2\n', self.read(os.path.join(out_dir, 'b', 'run.out')))
+            # outside of the directory of the manifest, only the names are kept
+            for scripts in ('../a/run.m\n../b/run.m\n', 'run.m\n../a/run.m\n'):
+                manifest = os.path.join(directory, 'manifests', 'manifest.txt')
+                self.write(manifest, scripts)
+                with self.assertRaises(ValueError):
+                    run_batch(manifest, os.path.join(directory, 'other'), workers=1)
+                self.assertFalse(os.path.exists(os.path.join(directory, 'other')))
+
+# ----------
+# TestServer
+# ----------
+
+
+class TestServer(TestCase):
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+
+    def tearDown(self):
+        self.loop.close()
+        asyncio.set_event_loop(None)
+
+    def serve(self, server, client, path=None):
+        async def run():
+            listener = await server.serve(path=path)
+            if path is not None:
+                connect = lambda: asyncio.open_unix_connection(path)
+            else:
+                connect = lambda: asyncio.open_connection(*listener.sockets[0].getsockname()[:2])
+            try:
+                return await client(connect)
+            finally:
+                while server.sessions:
+                    await asyncio.sleep(0.01)
+                listener.close()
+                server.close()
+        return self.loop.run_until_complete(run())
+
+    @staticmethod
+    async def request(reader, writer, script):
+        writer.write((script + '\n%%\n').encode('utf-8'))
+        lines = []
+        while not lines or not lines[-1].startswith('%% '):
+            lines.append((await reader.readline()).decode('utf-8').rstrip('\n'))
+        return lines
+
+    def test_server_0(self):
+        async def client(connect):
+            reader, writer = await connect()
+            first = await self.request(reader, writer, 'x = 2;\ny = x ^ 2')
+            second = await self.request(reader, writer, 'z = y + x')
+            third = await self.request(reader, writer, 'w = q')
+            fourth = await self.request(reader, writer, 'w = (x')
+            writer.close()
+            return first, second, third, fourth
+        first, second, third, fourth = self.serve(Server(), client)
+        self.assertEqual(['x=2', 'y=4'], first[:-1])
+        self.assertTrue(first[-1].startswith('%% ok '))
+        self.assertEqual(['z=6'], second[:-1])
+        self.assertEqual([], third[:-1])
+        self.assertTrue(third[-1].startswith('%% error NameError'))
+        self.assertEqual([], fourth[:-1])
+        self.assertTrue(fourth[-1].startswith('%% error Exception: Invalid syntax'))
+
+    def test_server_1(self):
+        script = 'x = 0;\nfor i = 1:100\n  x = x + i;\nend'
+
+        async def session(connect, index):
+            reader, writer = await connect()
+            await self.request(reader, writer, 'y = {}'.format(index))
+            response = await self.request(reader, writer, script)
+            writer.close()
+            return response
+
+        async def client(connect):
+            responses = await asyncio.gather(*[session(connect, index) for index in range(8)])
+            reader, writer = await connect()
+            writer.write(b'%% stats\n')
+            stats = []
+            while not stats or stats[-1] != '%% ok':
+                stats.append((await reader.readline()).decode('utf-8').rstrip('\n'))
+            writer.close()
+            return responses, dict(line.split('=') for line in stats[:-1])
+
+        responses, stats = self.serve(Server('vm', optimize=True, limit=2), client)
+        for index, response in enumerate(responses):
+            self.assertEqual(['x=0', 'x=5050', 'i=100'], response[:-1])
+        self.assertEqual('16', stats['requests'])
+        self.assertEqual('0', stats['errors'])
+        self.assertEqual('7', stats['cache_hits'])
+        self.assertIn('p95_ms', stats)
+
+    def test_server_2(self):
+        async def client(connect):
+            reader, writer = await connect()
+            response = await self.request(reader, writer, 'x = [1, 2, 3];\ny = x(2)')
+            writer.close()
+            return response
+        with TemporaryDirectory() as directory:
+            response = self.serve(Server('closure'), client, os.path.join(directory, 'socket'))
+        self.assertEqual(['x=[[1. 2. 3.]]', 'y=2.0'], response[:-1])
+
+    def test_server_stream(self):
+        received = Event()
+
+        class WaitingServer(Server):
+            def run(self, text, workspace, emit):
+                def wait_emit(line):
+                    emit(line)
+                    # the client only gets here once it has read the line
+                    waited.append(received.wait(5))
+                super().run(text, workspace, wait_emit)
+
+        waited = []
+
+        async def client(connect):
+            reader, writer = await connect()
+            writer.write(b'x = 1;\ny = x + 1;\nz = q\n%%\n')
+            first = (await reader.readline()).decode('utf-8').rstrip('\n')
+            received.set()
+            response = [first]
+            while not response[-1].startswith('%% '):
+                response.append((await reader.readline()).decode('utf-8').rstrip('\n'))
+            writer.close()
+            return response
+
+        response = self.serve(WaitingServer('closure'), client)
+        self.assertEqual(['x=1', 'y=2'], response[:-1])
+        self.assertTrue(response[-1].startswith('%% error NameError'))
+        self.assertEqual([True, True], waited)
+
+    def test_server_shadowed(self):
+        async def client(connect):
+            reader, writer = await connect()
+            await self.request(reader, writer, 'max = [5, 7];')
+            first = await self.request(reader, writer, 'y = max(2);')
+            writer.close()
+            reader, writer = await connect()
+            second = await self.request(reader, writer, 'y = max(2);')
+            writer.close()
+            return first, second
+        first, second = self.serve(Server(), client)
+        self.assertEqual(['y=7.0'], first[:-1])
+        self.assertEqual(['y=2'], second[:-1])
+
+# ---------------
+# TestIncremental
+# ---------------
+
+
+class TestIncremental(TestCase):
+
+    SCRIPT = 'a = r * 2\nb = 5\nc = a + 1\nd = b + 1\nx = [1, 2, 3];\nx(2) = a;\nfor i = 1:3\n  t = i + c;\nend'
+
+    def test_incremental_0(self):
+        script = IncrementalScript(self.SCRIPT, {'r': 3})
+        self.assertEqual(10, script.run()['t'])
+        self.assertEqual([0, 1, 2, 3, 4, 5, 6], script.recomputed)
+        self.assertEqual([set(), set(), {0}, {1}, set(), {0, 4}, {2}], script.dependencies())
+
+    def test_incremental_1(self):
+        for engine in Interpreter.ENGINES:
+            script = IncrementalScript(self.SCRIPT, {'r': 3}, engine)
+            script.run()
+            self.assertEqual(['r', 'a', 'c', 'x', 't'], script.update_inputs({'r': 9}))
+            self.assertEqual([0, 2, 5, 6], script.recomputed)
+            workspace = script.workspace()
+            self.assertEqual(22, workspace['t'])
+            numpy.testing.assert_array_equal([[1, 18, 3]], workspace['x'])
+            expected = interp_eval(Parser(Scanner(self.SCRIPT)), engine, workspace=Workspace(r=9))
+            self.assertEqual(sorted(expected), sorted(workspace))
+            self.assertEqual(expected['c'], workspace['c'])
+            self.assertEqual([], script.update_inputs({'r': 9}))
+            self.assertEqual([], script.recomputed)
+
+    def test_incremental_2(self):
+        script = IncrementalScript(self.SCRIPT, {'r': 3})
+        script.run()
+        self.assertEqual(['b', 'd'], script.update_statement(1, 'b = 6'))
+        self.assertEqual([1, 3], script.recomputed)
+        self.assertEqual([], script.update_statement(3, 'd = 2 + 5'))
+        self.assertEqual([3], script.recomputed)
+        self.assertEqual(['z', 'b'], script.update_statement(1, 'z = 1'))
+        self.assertEqual([1], script.recomputed)
+        self.assertNotIn('b', script.workspace())
+
+    def test_incremental_3(self):
+        script = IncrementalScript('y = 1\nz = x(2) + y', {'x': numpy.array([[1.0, 2.0]])})
+        self.assertEqual(3, script.run()['z'])
+        self.assertEqual(['y', 'z'], script.update_statement(0, 'y = 2'))
+        self.assertEqual(4, script.workspace()['z'])
+        with self.assertRaises(NameError):
+            script.update_statement(0, 'y = w')
+        with self.assertRaises(Exception):
+            script.update_statement(0, 'y = 1; y = 2')
+        self.assertEqual(4, script.workspace()['z'])
+        self.assertEqual([], script.update_statement(0, 'y = 2'))
+
+    def test_incremental_session(self):
+        script = IncrementalScript('', engine='vm')
+        self.assertEqual(['r'], script.enter('r = 3'))
+        self.assertEqual(['a', 'c'], script.enter('a = r * 2; c = a + 1'))
+        self.assertEqual(['x'], script.enter('x = [1 2]'))
+        self.assertEqual(['x'], script.enter('x(2) = c'))
+        self.assertEqual(['r', 'a', 'c', 'x'], script.enter('r = 4'))
+        self.assertEqual([0, 1, 2, 4], script.recomputed)
+        numpy.testing.assert_array_equal([[1, 9]], script.workspace()['x'])
+        # an assignment reading its variable, or to part of it, is appended
+        self.assertEqual(['r'], script.enter('r = r + 1'))
+        self.assertEqual(['x'], script.enter('x(1) = 0'))
+        self.assertEqual(7, len(script.statements))
+        with self.assertRaises(NameError):
+            script.enter('b = q')
+        with self.assertRaises(NameError):
+            script.enter('a = q')
+        with self.assertRaises(Exception):
+            script.enter('b = (1')
+        self.assertEqual(7, len(script.statements))
+        self.assertEqual({'r': 5, 'a': 8, 'c': 9}, {name: script.workspace()[name] for name in 'rac'})
+        self.assertEqual([], script.enter('% nothing'))
+
 # ----
 # main
 # ----
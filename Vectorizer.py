@@ -0,0 +1,244 @@
+# pylint: disable = unused-wildcard-import
+# pylint: disable = invalid-name
+
+"""
+Filename: Vectorizer.py
+Description: Rewrites for loops whose iterations are independent
+             element-wise computations into array expressions, which
+             NumPy evaluates for every iteration at once
+Author:    Juan Trejo
+Github:    https://github.com/jtrejo13
+"""
+
+# -------
+# imports
+# -------
+
+from typing import List, Set
+from Scanner import *
+from Parser import Node, Compound, BinaryOp, UnaryOp, Assign, Var, Num, Call, Index, Vectorized, LoopRange, \
+    Colon, EXPRESSIONS, get_expr, operands_of
+from Builtins import BUILTINS
+
+
+"""
+Element-wise Operators
+
+An iteration of a vectorizable loop computes numbers, for which the
+matrix operators are the element-wise ones. The array expressions must
+use the element-wise operators explicitly
+"""
+ELEMENTWISE_TOKENS = {
+    MUL: Token(DOTMUL, '.*'),
+    DIV: Token(DOTDIV, './'),
+    POW: Token(DOTPOW, '.^'),
+}
+
+
+class NotVectorizable(Exception):
+    """Raised with the reason a loop cannot be vectorized"""
+
+
+class Vectorizer(object):
+    """
+    Rewrites a for loop into a Vectorized node. A loop is vectorized if:
+
+        it iterates over a colon expression, like for i = 1:n,
+        every statement of its body is an assignment x(i) = expr to the
+        element at the loop variable, and
+        every expr only reads the loop variable, the element at the loop
+        variable of the arrays the loop assigns (x(i)), and any element
+        of other variables, through arithmetic, relational operators and
+        element-wise built-in functions.
+
+    The iterations are then independent, and each assignment becomes
+    x(1:n) = expr, with the loop variable replaced by the whole range
+    (a LoopRange node), x(i) by x(1:n) and the matrix operators by the
+    element-wise ones. Reading an array the loop assigns at any other
+    element, like x(i - 1), or as a whole, like sum(x), is a dependency
+    between iterations, and the loop is left unchanged.
+
+    The loop-invariant operands of the array expressions must be numbers,
+    which is only known when the loop runs: the Vectorized node falls back
+    to the loop when they are not (see Compiler.visit_Vectorized)
+
+    Args:
+        loop(For): The loop to rewrite
+
+    Attributes:
+        loop(For): The loop to rewrite
+        var_name(str): The name of the loop variable
+        targets(set of str): The variables the loop assigns
+        scalars(list of Node): The loop-invariant operands found so far
+    """
+
+    def __init__(self, loop):
+        self.loop = loop
+        self.var_name = loop.left.token.value
+        self.targets = set()  # type: Set[str]
+        self.scalars = []  # type: List[Node]
+
+    def vectorize(self):
+        """
+        Returns:
+            Vectorized: The rewritten loop
+
+        Raises:
+            NotVectorizable: With the reason the loop cannot be vectorized
+        """
+        loop = self.loop
+        if not isinstance(loop.right, Colon):
+            raise NotVectorizable('it does not iterate over a colon expression')
+        statements = [statement for statement in loop.body.statements if type(statement) is not Node]
+        if not statements:
+            raise NotVectorizable('its body is empty')
+
+        for statement in statements:
+            if not isinstance(statement, Assign) or not isinstance(statement.left, Index):
+                raise NotVectorizable('{} is not an indexed assignment'.format(get_expr(statement)))
+            target = statement.left
+            if target.token.value == self.var_name or not self.is_loop_var(target.args):
+                raise NotVectorizable('{} is not the element at {}'.format(get_expr(target), self.var_name))
+            self.targets.add(target.token.value)
+
+        for bound in (loop.right.start, loop.right.step, loop.right.stop):
+            try:
+                if bound is not None:
+                    self.rewrite(bound)
+            except NotVectorizable:
+                raise NotVectorizable('its range depends on its body')
+        del self.scalars[:]
+
+        body = Compound()
+        for statement in statements:
+            value = self.rewrite(statement.right)[0]
+            target = Index(statement.left.token, [LoopRange()])
+            body.statements.append(Assign(target, statement.token, value))
+        return Vectorized(loop.left, loop.right, body, loop, self.scalars)
+
+    def is_loop_var(self, args):
+        """
+        Returns:
+            bool: Whether a list of indices is the loop variable alone
+        """
+        return len(args) == 1 and isinstance(args[0], Var) and args[0].token.value == self.var_name
+
+    def rewrite(self, root):
+        """
+        Rewrites an expression of the body into an array expression. The
+        expression is rewritten in post-order, with an explicit stack
+        instead of a recursive rewrite per node, so that arbitrarily deep
+        expressions do not exhaust Python's recursion limit
+
+        Returns:
+            tuple: The array expression, and whether it depends on the
+            loop variable
+
+        Raises:
+            NotVectorizable: If the expression reads another iteration,
+            or is not element-wise
+        """
+        results = []
+        stack = [(root, None)]
+        while stack:
+            node, scalars = stack.pop()
+            if scalars is not None:
+                first = len(results) - len(operands_of(node))
+                rewritten = results[first:]
+                del results[first:]
+                results.append(self.combine(node, rewritten, scalars))
+                continue
+            if isinstance(node, Num):
+                results.append((node, False))
+            elif isinstance(node, Var):
+                name = node.token.value
+                if name == self.var_name:
+                    results.append((LoopRange(), True))
+                elif name in self.targets:
+                    raise NotVectorizable('{} is read as a whole'.format(name))
+                else:
+                    results.append((node, False))
+            elif isinstance(node, Index) and self.is_loop_var(node.args):
+                results.append((Index(node.token, [LoopRange()]), True))
+            elif isinstance(node, Index) and node.token.value in self.targets:
+                raise NotVectorizable('{} reads another iteration'.format(get_expr(node)))
+            elif isinstance(node, EXPRESSIONS):
+                # the scalars found before the operands, kept by combine
+                stack.append((node, len(self.scalars)))
+                stack.extend((operand, None) for operand in reversed(operands_of(node)))
+            else:
+                raise NotVectorizable('{} is not element-wise'.format(get_expr(node)))
+        return results[0]
+
+    def combine(self, node, rewritten, scalars):
+        """
+        Rewrites an expression node from its rewritten operands
+
+        Args:
+            rewritten(list of tuple): The rewritten operands, and whether
+            each depends on the loop variable
+            scalars(int): The number of scalars found before the operands
+
+        Returns:
+            tuple: The array expression, and whether it depends on the
+            loop variable
+
+        Raises:
+            NotVectorizable: If the node is not element-wise, and one of
+            its operands depends on the loop variable
+        """
+        if isinstance(node, Index):
+            args, varies = self.collect_scalars(rewritten)
+            return Index(node.token, args), varies
+        if isinstance(node, BinaryOp):
+            (left, right), varies = self.collect_scalars(rewritten)
+            token = ELEMENTWISE_TOKENS.get(node.token.type, node.token) if varies else node.token
+            return BinaryOp(left, token, right), varies
+        if isinstance(node, UnaryOp):
+            (operand,), varies = self.collect_scalars(rewritten)
+            return UnaryOp(node.token, operand), varies
+        if isinstance(node, Call) and BUILTINS[node.token.value].is_elementwise:
+            args, varies = self.collect_scalars(rewritten)
+            return Call(node.token, args), varies
+        # not element-wise: only allowed if no operand depends on the loop variable
+        if any(varies for _, varies in rewritten):
+            raise NotVectorizable('{} is not element-wise'.format(get_expr(node)))
+        del self.scalars[scalars:]
+        if isinstance(node, Call):
+            return Call(node.token, [operand for operand, _ in rewritten]), False
+        return node, False
+
+    def collect_scalars(self, rewritten):
+        """
+        Adds the rewritten operands of an element-wise operation that do
+        not depend on the loop variable to the scalars, which must be
+        numbers when the loop runs, if any other operand depends on it
+
+        Args:
+            rewritten(list of tuple): The rewritten operands, and whether
+            each depends on the loop variable
+
+        Returns:
+            tuple: The rewritten operands, and whether any of them depends
+            on the loop variable
+        """
+        varies = any(operand_varies for _, operand_varies in rewritten)
+        if varies:
+            self.scalars.extend(operand for operand, operand_varies in rewritten
+                                if not operand_varies and not isinstance(operand, Num))
+        return [operand for operand, _ in rewritten], varies
+
+
+def vectorize(loop):
+    """
+    Rewrites a for loop into a Vectorized node, if its iterations are
+    independent element-wise computations (see Vectorizer)
+
+    Returns:
+        tuple: The Vectorized node and None, or None and the reason the
+        loop cannot be vectorized
+    """
+    try:
+        return Vectorizer(loop).vectorize(), None
+    except NotVectorizable as error:
+        return None, str(error)
@@ -11,7 +11,11 @@ Github:      https://github.com/jtrejo13
 
 import sys
 import traceback
+from argparse import ArgumentParser
+from collections import OrderedDict
+from functools import partial
 import Interpreter
+from Incremental import IncrementalScript
 import wx
 import wx.py
 
@@ -36,18 +40,25 @@ class MyInteractiveInterpreter(object):
     input file naming (the filename is always passed in explicitly).
     """
 
-    def __init__(self, locals=locals):
+    def __init__(self, locals=locals, incremental=False):
         """Constructor.
 
         The optional 'locals' argument specifies the dictionary in
         which code will be executed; it defaults to a newly created
         dictionary with key "__name__" set to "__console__" and key
         "__doc__" set to None.
+
+        If 'incremental' is set, the commands of the session make up an
+        IncrementalScript: redefining a variable runs again only the
+        commands depending on it, and the variables that changed are
+        displayed.
         """
 
         if locals is None:
             locals = {"__name__": "__console__", "__doc__": None}
         self.locals = locals
+        self.workspace = Interpreter.Workspace()
+        self.script = IncrementalScript('') if incremental else None
 
     def runsource(self, source, filename="<stdin>", symbol="single"):
         """Compile and run some source in the interpreter.
@@ -69,7 +80,13 @@ class MyInteractiveInterpreter(object):
         an exception is raised).  The return value can be used to
         decide whether to use sys.ps1 or sys.ps2 to prompt the next
         line.
+
+        In incremental mode, the source is run by self.runincremental().
         """
+        if self.script is not None:
+            self.runincremental(source.strip())
+            return False
+
         try:
             parser = Interpreter.interp_read(source.strip())
         except (OverflowError, SyntaxError, ValueError):
@@ -97,7 +114,7 @@ class MyInteractiveInterpreter(object):
         caller should be prepared to deal with it.
         """
         try:
-            result = Interpreter.interp_eval(parser)
+            result = Interpreter.interp_eval(parser, workspace=self.workspace)
             Interpreter.interp_print(sys.stdout, result)
         except SystemExit:
             print('SystemExit')
@@ -105,6 +122,26 @@ class MyInteractiveInterpreter(object):
         except:
             self.showtraceback()
 
+    def runincremental(self, source):
+        """Run source as a command of the session's incremental script.
+
+        Only the variables whose values changed, including the ones of
+        the commands that ran again, are displayed. When an exception
+        occurs, the script is left as it was and self.showtraceback()
+        is called to display a traceback.
+        """
+        try:
+            changed = self.script.enter(source)
+            self.workspace = self.script.workspace()
+            if changed:
+                Interpreter.interp_print(sys.stdout, OrderedDict(
+                    (name, self.workspace[name]) for name in changed if name in self.workspace))
+        except SystemExit:
+            print('SystemExit')
+            raise
+        except:
+            self.showtraceback()
+
     def showsyntaxerror(self, filename=None):
         """
         Display the syntax error that just occurred.
@@ -195,10 +232,11 @@ class MyInteractiveInterpreter(object):
 class MyInterpreter(MyInteractiveInterpreter):
     """MyInterpreter based on MyInteractiveInterpreter."""
 
-    def __init__(self, locals=None, rawin=None, stdin=sys.stdin, stdout=sys.stdout, stderr=sys.stderr, showInterpIntro=True):
+    def __init__(self, locals=None, rawin=None, stdin=sys.stdin, stdout=sys.stdout, stderr=sys.stderr, showInterpIntro=True,
+                 incremental=False):
 
         """Create an interactive interpreter object."""
-        MyInteractiveInterpreter.__init__(self, locals=locals)
+        MyInteractiveInterpreter.__init__(self, locals=locals, incremental=incremental)
         self.stdin = stdin
         self.stdout = stdout
         self.stderr = stderr
@@ -307,10 +345,11 @@ class MyFrame(wx.py.shell.ShellFrame):
     """
     Customized version of shell.ShellFrame
     """
-    def __init__(self):
+    def __init__(self, incremental=False):
         wx.py.shell.ShellFrame.__init__(self, title='MATLAB Interpreter')
 
-        self.shell = wx.py.shell.Shell(parent=self, id=-1, introText=None, locals=None, InterpClass=MyInterpreter, startupScript=self.startupScript, execStartupScript=self.execStartupScript)
+        interp_class = partial(MyInterpreter, incremental=incremental)
+        self.shell = wx.py.shell.Shell(parent=self, id=-1, introText=None, locals=None, InterpClass=interp_class, startupScript=self.startupScript, execStartupScript=self.execStartupScript)
 
         self.shell.SetSize((750, 525))
 
@@ -349,24 +388,31 @@ def query_yes_no(question, default="yes"):
                              "(or 'y' or 'n').\n")
 
 
-def main(shouldDisplayGUI=True):
+def main(shouldDisplayGUI=True, incremental=False):
     """
     Main function
 
     shouldDisplayGUI indicates whether to display the MATLAB interpreter in
     a user interface or the console. shouldDisplayGUI is set to True by default
+    incremental indicates whether the session runs as an incremental script
+    (see MyInteractiveInterpreter). incremental is set to False by default
     """
     if shouldDisplayGUI:
         app = wx.App()
-        frame = MyFrame()
+        frame = MyFrame(incremental)
         frame.Show()
         app.SetTopWindow(frame)
         app.MainLoop()
     else:
-        shell = MyInterpreter()
+        shell = MyInterpreter(incremental=incremental)
         shell.interact()
 
 
 if __name__ == '__main__':
+    arg_parser = ArgumentParser(description='An interactive shell for the MATLAB Interpreter')
+    arg_parser.add_argument('--incremental', action='store_true',
+                            help='redefining a variable runs again only the commands '
+                            'depending on it, and displays the variables that changed')
+    args = arg_parser.parse_args()
     answer = query_yes_no("Would you like to launch a GUI?\n('n' launches the interpreter in the console)")
-    main(answer)
+    main(answer, args.incremental)